@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .authentication import invalidate_saved_user
+        from .models import User, UserProfile
+
+        # Drop cached users (accounts.authentication) when they change,
+        # e.g. on deactivation or a password change
+        for model in (User, UserProfile):
+            post_save.connect(invalidate_saved_user, sender=model, dispatch_uid='accounts.invalidate_saved_user')
+            post_delete.connect(invalidate_saved_user, sender=model, dispatch_uid='accounts.invalidate_saved_user')
@@ -0,0 +1,182 @@
+"""
+JWT authentication without per-request database queries.
+
+Verified access tokens are kept in a bounded per-process LRU until they
+expire, so a token's signature is checked once per process. The user a
+token names is kept in the cache for USER_TIMEOUT seconds with its
+profile, and dropped whenever the user or its profile is saved or
+deleted (see AccountsConfig.ready). With a cache shared by all workers
+that is immediate; with a per-process cache, other processes see the
+change within USER_TIMEOUT.
+
+Requests with an unsafe method load the user from the database, so a
+view saving ``request.user`` never writes back a stale cached copy.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.metrics import Counter
+
+DEFAULTS = {
+    'MAX_TOKENS': 10000,   # verified tokens kept per process
+    'USER_TIMEOUT': 60,    # seconds a cached user is trusted
+    'CACHE': 'default',
+    'KEY_PREFIX': 'auth_user',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+AUTH_CACHE_LOOKUPS = Counter(
+    'auth_cache_lookups_total', 'Token and user lookups of the JWT authentication cache',
+    ['cache', 'result'],
+)
+
+_config = None
+
+
+def get_auth_cache_settings():
+    """
+    AUTH_CACHE settings merged over the defaults, computed once and reset
+    on setting changes (read for every authenticated request)
+    """
+    global _config
+    if _config is None:
+        config = DEFAULTS.copy()
+        config.update(getattr(settings, 'AUTH_CACHE', {}))
+        _config = config
+    return _config
+
+
+class TokenCache:
+    """
+    Least recently used verified tokens, each until its ``exp`` claim
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = OrderedDict()
+
+    def get(self, raw_token, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.tokens.get(raw_token)
+            if entry is None:
+                return None
+            token, expires = entry
+            if expires <= now:
+                del self.tokens[raw_token]
+                return None
+            self.tokens.move_to_end(raw_token)
+            return token
+
+    def set(self, raw_token, token):
+        expires = token.get('exp')
+        if expires is None:
+            return
+        with self.lock:
+            self.tokens[raw_token] = (token, expires)
+            self.tokens.move_to_end(raw_token)
+            while len(self.tokens) > get_auth_cache_settings()['MAX_TOKENS']:
+                self.tokens.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+
+
+tokens = TokenCache()
+
+
+@receiver(setting_changed)
+def _reset_config(setting, **kwargs):
+    global _config
+    if setting in ('AUTH_CACHE', 'CACHES', 'SIMPLE_JWT'):
+        _config = None
+        tokens.clear()
+
+
+def _user_key(user_id):
+    return f"{get_auth_cache_settings()['KEY_PREFIX']}:{user_id}"
+
+
+def invalidate_user(user_id):
+    config = get_auth_cache_settings()
+    caches[config['CACHE']].delete(_user_key(user_id))
+
+
+def invalidate_saved_user(sender, instance, **kwargs):
+    """
+    post_save/post_delete of users and profiles
+    """
+    invalidate_user(getattr(instance, 'user_id', instance.pk))
+
+
+def validated_token(raw_token):
+    """
+    The verified access token for ``raw_token``, from the LRU when it was
+    seen before; raises InvalidToken
+    """
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    token = tokens.get(raw_token)
+    AUTH_CACHE_LOOKUPS.inc(cache='token', result='hit' if token is not None else 'miss')
+    if token is None:
+        token = CachedJWTAuthentication().verify_token(raw_token)
+        tokens.set(raw_token, token)
+    return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication with verified tokens and users cached (see above)
+    """
+    def authenticate(self, request):
+        self.request = request
+        return super().authenticate(request)
+
+    def verify_token(self, raw_token):
+        return super().get_validated_token(raw_token)
+
+    def get_validated_token(self, raw_token):
+        return validated_token(raw_token)
+
+    def load_user(self, user_id):
+        try:
+            user = self.user_model.objects.select_related('userprofile').get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        config = get_auth_cache_settings()
+        caches[config['CACHE']].set(_user_key(user_id), user, config['USER_TIMEOUT'])
+        return user
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = None
+        request = getattr(self, 'request', None)
+        if request is None or request.method in SAFE_METHODS:
+            user = caches[get_auth_cache_settings()['CACHE']].get(_user_key(user_id))
+            AUTH_CACHE_LOOKUPS.inc(cache='user', result='hit' if user is not None else 'miss')
+        if user is None:
+            user = self.load_user(user_id)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
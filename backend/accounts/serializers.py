@@ -1,7 +1,11 @@
 from rest_framework import serializers
+from core.mixins import InstrumentedSerializerMixin
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.db.models import Count
+from orders.models import Order
+from orders.sharding import shard_for_user
 from .models import User, UserProfile
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -42,12 +46,12 @@ class UserLoginSerializer(serializers.Serializer):
         else:
             raise serializers.ValidationError('Must include email and password')
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['avatar', 'bio', 'created_at', 'updated_at']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(source='userprofile', read_only=True)
     full_name = serializers.SerializerMethodField()
     
@@ -63,7 +67,22 @@ class UserSerializer(serializers.ModelSerializer):
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}".strip()
 
-class UserListSerializer(serializers.ModelSerializer):
+def order_counts(users):
+    """
+    Number of live orders of each of ``users``, one grouped query per shard
+    """
+    by_shard = {}
+    for user in users:
+        by_shard.setdefault(shard_for_user(user.pk), []).append(user.pk)
+    counts = {}
+    for shard, user_ids in by_shard.items():
+        counts.update(
+            Order.objects.using(shard).filter(user_id__in=user_ids).order_by()
+            .values_list('user_id').annotate(count=Count('id'))
+        )
+    return counts
+
+class UserListSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer for admin user list"""
     full_name = serializers.SerializerMethodField()
     order_count = serializers.SerializerMethodField()
@@ -79,7 +98,11 @@ class UserListSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}".strip()
     
     def get_order_count(self, obj):
-        return obj.orders.count()
+        # Views listing users pass the counts of the page in the context
+        counts = self.context.get('order_counts')
+        if counts is None:
+            counts = order_counts([obj])
+        return counts.get(obj.pk, 0)
 
 class ChangePasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField()
@@ -1,3 +1,91 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import authentication
+from accounts.models import User, UserProfile
+from accounts.serializers import UserSerializer
+from core.testing import PerformanceTestCase
+
+
+class AccountEndpointBudgetTests(PerformanceTestCase):
+    def test_user_profile(self):
+        self.assertBudget('/api/auth/user/', queries=1, ms=50, user=self.customer)
+
+    def test_admin_user_list(self):
+        self.assertBudget('/api/auth/users/', queries=3, ms=150, user=self.admin)
+
+    def test_admin_user_search(self):
+        self.assertBudget('/api/auth/users/?search=customer-1', queries=3, ms=150, user=self.admin)
+
+    def test_admin_user_list_order_counts(self):
+        self.client.force_authenticate(self.admin)
+        users = self.client.get('/api/auth/users/?search=perf-customer-0').data['results']
+        self.assertEqual([user['order_count'] for user in users], [self.customer.orders.count()])
+
+    def test_admin_user_detail(self):
+        self.assertBudget(f'/api/auth/users/{self.customer.pk}/', queries=2, ms=50, user=self.admin)
+
+
+class CachedJWTAuthenticationTests(PerformanceTestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        authentication.tokens.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.customer).access_token}')
+
+    def test_repeat_requests_need_no_auth_queries(self):
+        # The first request loads the user with its profile in one query
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.data['id'], self.customer.pk)
+        self.assertEqual(response.data['profile'], UserSerializer(self.customer).data['profile'])
+
+    def test_saved_users_are_reloaded(self):
+        profile, _ = UserProfile.objects.get_or_create(user=self.customer)
+        self.client.get('/api/auth/user/')
+        # Writes that bypass save() are seen once the cached user expires
+        UserProfile.objects.filter(pk=profile.pk).update(bio='Stale')
+        self.assertNotEqual(self.client.get('/api/auth/user/').data['profile']['bio'], 'Stale')
+
+        profile.bio = 'Updated'
+        profile.save()
+        self.assertEqual(self.client.get('/api/auth/user/').data['profile']['bio'], 'Updated')
+
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+    def test_writes_load_the_user_from_the_database(self):
+        self.client.get('/api/auth/user/')
+        User.objects.filter(pk=self.customer.pk).update(last_name='Changed')
+        response = self.client.patch('/api/auth/user/update/', {'first_name': 'Patched'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(pk=self.customer.pk).last_name, 'Changed')
+
+    def test_invalid_tokens_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+
+class TokenCacheTests(SimpleTestCase):
+    def test_least_recently_used_tokens_are_evicted(self):
+        cache = authentication.TokenCache()
+        with override_settings(AUTH_CACHE={'MAX_TOKENS': 2}):
+            for name in (b'a', b'b'):
+                cache.set(name, {'exp': time.time() + 60})
+            self.assertIsNotNone(cache.get(b'a'))
+            cache.set(b'c', {'exp': time.time() + 60})
+        self.assertIsNone(cache.get(b'b'))
+        self.assertIsNotNone(cache.get(b'a'))
+
+    def test_tokens_are_dropped_when_they_expire(self):
+        cache = authentication.TokenCache()
+        cache.set(b'a', {'exp': 100})
+        self.assertIsNotNone(cache.get(b'a', now=99))
+        self.assertIsNone(cache.get(b'a', now=100))
+        self.assertEqual(len(cache.tokens), 0)
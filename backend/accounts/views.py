@@ -4,18 +4,17 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth import authenticate, get_user_model
-from django.core.mail import send_mail
-from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.db.models import Q
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.template.loader import render_to_string
 from django.contrib.sites.shortcuts import get_current_site
+from core.tasks import send_templated_email_task
 from .models import User, UserProfile
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserSerializer,
     PasswordResetSerializer, PasswordResetConfirmSerializer,
-    ChangePasswordSerializer, UserProfileSerializer, UserListSerializer
+    ChangePasswordSerializer, UserProfileSerializer, UserListSerializer, order_counts
 )
 
 User = get_user_model()
@@ -50,18 +49,14 @@ class RegisterView(generics.CreateAPIView):
         
         verification_url = f"http://{current_site.domain}/api/auth/verify-email-confirm/{uid}/{token}/"
         
-        subject = 'Verify Your Email Address'
-        message = render_to_string('emails/verify_email.html', {
-            'user': user,
-            'verification_url': verification_url,
-        })
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
+        send_templated_email_task.delay(
+            subject='Verify Your Email Address',
+            template_name='emails/verify_email.html',
+            context={
+                'user': {'first_name': user.first_name},
+                'verification_url': verification_url,
+            },
             recipient_list=[user.email],
-            fail_silently=False,
         )
 
 @api_view(['POST'])
@@ -158,18 +153,14 @@ def password_reset(request):
         current_site = get_current_site(request)
         reset_url = f"http://{current_site.domain}/reset-password/{uid}/{token}/"
         
-        subject = 'Password Reset Request'
-        message = render_to_string('emails/password_reset.html', {
-            'user': user,
-            'reset_url': reset_url,
-        })
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
+        send_templated_email_task.delay(
+            subject='Password Reset Request',
+            template_name='emails/password_reset.html',
+            context={
+                'user': {'first_name': user.first_name},
+                'reset_url': reset_url,
+            },
             recipient_list=[email],
-            fail_silently=False,
         )
         
         return Response({'message': 'Password reset email sent successfully'})
@@ -211,18 +202,14 @@ def send_verification_email(request):
     
     verification_url = f"http://{current_site.domain}/api/auth/verify-email-confirm/{uid}/{token}/"
     
-    subject = 'Verify Your Email Address'
-    message = render_to_string('emails/verify_email.html', {
-        'user': user,
-        'verification_url': verification_url,
-    })
-    
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
+    send_templated_email_task.delay(
+        subject='Verify Your Email Address',
+        template_name='emails/verify_email.html',
+        context={
+            'user': {'first_name': user.first_name},
+            'verification_url': verification_url,
+        },
         recipient_list=[user.email],
-        fail_silently=False,
     )
     
     return Response({'message': 'Verification email sent successfully'})
@@ -261,6 +248,17 @@ class UserListView(generics.ListAPIView):
                 Q(last_name__icontains=search)
             )
         return queryset.order_by('-date_joined')
+    
+    def list(self, request, *args, **kwargs):
+        users = self.paginate_queryset(self.get_queryset())
+        self.order_counts = order_counts(users)
+        serializer = self.get_serializer(users, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['order_counts'] = getattr(self, 'order_counts', None)
+        return context
 
 class UserDetailView(generics.RetrieveUpdateAPIView):
     queryset = User.objects.all()
@@ -1,3 +1,18 @@
 from django.contrib import admin
+from django.utils import timezone
+from .models import Job
 
-# Register your models here.
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'queue', 'priority', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'queue', 'name']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['locked_by', 'locked_at', 'finished_at', 'last_error', 'result', 'created_at', 'updated_at']
+    actions = ['retry_jobs']
+    
+    @admin.action(description='Retry selected jobs')
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0, last_error=''
+        )
+        self.message_user(request, f'{count} job(s) queued for retry')
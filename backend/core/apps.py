@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Install the query hooks (metrics, N+1 detection, slow query log)
+        # on every new database connection
+        from . import instrumentation, nplusone, slowqueries  # noqa: F401
@@ -0,0 +1,174 @@
+import contextvars
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_REQUESTS': 20,      # sub-requests accepted in one batch
+    'MAX_WORKERS': 4,        # sub-requests run concurrently; 1 runs them inline
+    'PATH_PREFIX': '/api/',
+    'EXCLUDE': ['batch'],    # route names that cannot be batched
+}
+
+# Request META that describes the batch request's own body or route
+_REQUEST_ONLY_META = {'CONTENT_LENGTH', 'CONTENT_TYPE', 'PATH_INFO', 'QUERY_STRING', 'REQUEST_METHOD', 'wsgi.input'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_batch_settings():
+    """
+    BATCH_REQUESTS settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'BATCH_REQUESTS', {}))
+    return config
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor._max_workers != workers:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+        return _executor
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_batch(data, max_requests):
+    """
+    Validate the batch body: ``{"requests": [{"id": ..., "path": ...}]}``.
+    Ids default to the position in the list.
+    """
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('"requests" must be a non-empty list')
+    if len(items) > max_requests:
+        raise BatchError(f'At most {max_requests} requests per batch')
+
+    parsed = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'path': item}
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchError(f'Request {index} needs a "path"')
+        if item.get('method', 'GET').upper() != 'GET':
+            raise BatchError(f'Request {index}: only GET requests can be batched')
+        parsed.append({'id': str(item.get('id', index)), 'path': item['path']})
+    return parsed
+
+
+def _sub_request(request, user, auth, path):
+    """
+    A GET request for ``path`` that shares the batch request's headers and
+    is authenticated as the batch request's user, without re-running the
+    middleware or decoding the token again
+    """
+    parts = urlsplit(path)
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = parts.path
+    sub.META = {key: value for key, value in request.META.items() if key not in _REQUEST_ONLY_META}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=parts.path, QUERY_STRING=parts.query)
+    sub.GET = QueryDict(parts.query)
+    sub.COOKIES = request.COOKIES
+    sub.user = user
+    if user.is_authenticated:
+        # Picked up by rest_framework.request.Request, as in force_authenticate()
+        sub._force_auth_user = user
+        sub._force_auth_token = auth
+    return sub
+
+
+def _body(response):
+    content = getattr(response, 'content', b'')
+    if 'json' in response.get('Content-Type', ''):
+        try:
+            return json.loads(content)
+        except ValueError:
+            pass
+    return content.decode(response.charset or 'utf-8', errors='replace')
+
+
+def dispatch(request, user, auth, path, config):
+    """
+    Resolve and call the view for one sub-request; returns (status, body)
+    """
+    parts = urlsplit(path)
+    if parts.scheme or parts.netloc or not parts.path.startswith(config['PATH_PREFIX']):
+        return 400, {'detail': f"Only {config['PATH_PREFIX']} paths can be batched"}
+    try:
+        match = resolve(parts.path)
+    except Resolver404:
+        return 404, {'detail': 'Not found.'}
+    if match.url_name in config['EXCLUDE'] or match.view_name in config['EXCLUDE']:
+        return 400, {'detail': 'This route cannot be batched'}
+
+    sub = _sub_request(request, user, auth, path)
+    sub.resolver_match = match
+    view = match.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+    try:
+        response = view(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+    except Http404:
+        return 404, {'detail': 'Not found.'}
+    except PermissionDenied:
+        return 403, {'detail': 'You do not have permission to perform this action.'}
+    except Exception:
+        logger.exception(f'Batched request for {path} failed')
+        return 500, {'detail': 'Internal server error.'}
+    return response.status_code, _body(response)
+
+
+def _run_in_worker(context, *args):
+    # Pool threads keep their own connections; treat each sub-request like
+    # a request and honour CONN_MAX_AGE around it
+    close_old_connections()
+    try:
+        return context.run(dispatch, *args)
+    finally:
+        close_old_connections()
+
+
+def run_batch(request, user, auth, items):
+    """
+    Dispatch the sub-requests, identical paths only once, and return one
+    result per item in order
+    """
+    config = get_batch_settings()
+    paths = list(dict.fromkeys(item['path'] for item in items))
+    workers = min(config['MAX_WORKERS'], len(paths))
+
+    if workers <= 1:
+        results = {path: dispatch(request, user, auth, path, config) for path in paths}
+    else:
+        executor = _get_executor(config['MAX_WORKERS'])
+        # Each sub-request runs in a copy of this context, so request
+        # metrics and N+1 tracking include its queries
+        futures = {
+            path: executor.submit(_run_in_worker, contextvars.copy_context(), request, user, auth, path, config)
+            for path in paths
+        }
+        results = {path: future.result() for path, future in futures.items()}
+
+    return [
+        {'id': item['id'], 'path': item['path'], 'status': results[item['path']][0], 'body': results[item['path']][1]}
+        for item in items
+    ]
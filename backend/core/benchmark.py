@@ -0,0 +1,388 @@
+import asyncio
+import http.client
+import io
+import json
+import math
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+
+class Route:
+    """
+    One entry of the benchmark mix. ``path`` may contain {product},
+    {category} and {order} placeholders, filled per request from the data
+    in the database.
+    """
+    def __init__(self, name, path, weight=1, auth=False, method='GET'):
+        self.name = name
+        self.path = path
+        self.weight = weight
+        self.auth = auth
+        self.method = method
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['path'], data.get('weight', 1), data.get('auth', False), data.get('method', 'GET'))
+
+
+DEFAULT_MIX = [
+    Route('product_list', '/api/products/', 30),
+    Route('product_detail', '/api/products/{product}/', 20),
+    Route('product_quick_view', '/api/products/{product}/quick-view/', 10),
+    Route('related_products', '/api/products/{product}/related/', 10),
+    Route('category_list', '/api/products/categories/', 8),
+    Route('category_products', '/api/products/categories/{category}/', 5),
+    Route('featured_products', '/api/products/featured/', 8),
+    Route('product_search', '/api/products/?search=smart', 4),
+    Route('product_reviews', '/api/reviews/product/{product}/', 5),
+    Route('order_list', '/api/orders/', 5, auth=True),
+]
+
+
+def load_mix(path):
+    with open(path) as f:
+        return [Route.from_dict(item) for item in json.load(f)]
+
+
+def load_placeholders(user=None, limit=200):
+    """
+    Sample slugs and ids for the path placeholders
+    """
+    from orders.sharding import user_orders
+    from products.models import Category, Product
+
+    values = {
+        'product': list(Product.objects.filter(is_active=True).order_by('id').values_list('slug', flat=True)[:limit]),
+        'category': list(Category.objects.filter(is_active=True).order_by('id').values_list('slug', flat=True)[:limit]),
+        'order': [],
+    }
+    if user is not None:
+        values['order'] = [str(pk) for pk in user_orders(user).values_list('id', flat=True)[:limit]]
+    return values
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(math.ceil(fraction * len(sorted_values)), len(sorted_values)) - 1
+    return sorted_values[max(index, 0)]
+
+
+def _environ(method, path, headers, host):
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': host,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+class WSGITransport:
+    """
+    Calls the project's WSGI application in-process. ``host`` must pass
+    ALLOWED_HOSTS.
+    """
+    name = 'wsgi'
+
+    def __init__(self, application=None, host='localhost'):
+        if application is None:
+            from django.core.wsgi import get_wsgi_application
+            application = get_wsgi_application()
+        self.application = application
+        self.host = host
+
+    def request(self, method, path, headers):
+        status = []
+
+        def start_response(status_line, response_headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+
+        result = self.application(_environ(method, path, headers, self.host), start_response)
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0], size
+
+
+class HTTPTransport:
+    """
+    Sends requests to a running server over one keep-alive connection
+    per worker thread
+    """
+    name = 'http'
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, headers):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.connection_class(self.netloc, timeout=30)
+        try:
+            connection.request(method, self.prefix + path, headers=headers)
+            response = connection.getresponse()
+            return response.status, len(response.read())
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+
+
+class ASGITransport:
+    """
+    Calls the project's ASGI application in-process, from coroutines
+    """
+    name = 'asgi'
+
+    def __init__(self, application=None, host='localhost'):
+        if application is None:
+            from django.core.asgi import get_asgi_application
+            application = get_asgi_application()
+        self.application = application
+        self.host = host
+
+    async def request(self, method, path, headers):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode())] + [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+        response = {'status': None, 'size': 0}
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['size'] += len(message.get('body', b''))
+
+        await self.application(scope, receive, send)
+        return response['status'], response['size']
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, route, seconds, status, size):
+        with self.lock:
+            self.samples.setdefault(route, []).append((seconds, status, size))
+
+
+class Benchmark:
+    """
+    Drive a weighted mix of routes with concurrent workers and collect
+    per-route latency, throughput and error statistics
+    """
+    def __init__(self, transport, routes=None, concurrency=8, requests=1000, duration=None,
+                 warmup=0, token=None, placeholders=None, seed=1):
+        self.transport = transport
+        self.routes = [route for route in (routes or DEFAULT_MIX) if route.weight > 0]
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.warmup = warmup
+        self.token = token
+        self.placeholders = placeholders or {}
+        self.seed = seed
+
+        # Routes that need a token or placeholder values we don't have
+        self.skipped = [route.name for route in self.routes if not self._runnable(route)]
+        self.routes = [route for route in self.routes if self._runnable(route)]
+        self.weights = [route.weight for route in self.routes]
+        if not self.routes:
+            raise ValueError('No runnable routes in the mix')
+
+    def _runnable(self, route):
+        if route.auth and not self.token:
+            return False
+        return all(self.placeholders.get(key) for key in ('product', 'category', 'order') if f'{{{key}}}' in route.path)
+
+    def _next(self, rng):
+        route = rng.choices(self.routes, self.weights)[0]
+        path = route.path
+        for key, values in self.placeholders.items():
+            if f'{{{key}}}' in path:
+                path = path.replace(f'{{{key}}}', rng.choice(values))
+        headers = {'Accept': 'application/json'}
+        if route.auth:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return route, path, headers
+
+    def _budget(self):
+        """
+        Shared counter handing out request slots to the workers
+        """
+        lock = threading.Lock()
+        issued = [0]
+        deadline = time.monotonic() + self.duration if self.duration else None
+
+        def take():
+            if deadline is not None:
+                return time.monotonic() < deadline
+            with lock:
+                if issued[0] >= self.requests:
+                    return False
+                issued[0] += 1
+                return True
+        return take
+
+    def _thread_phase(self, recorder, take):
+        def worker(n):
+            rng = random.Random(self.seed * 1000 + n)
+            while take():
+                route, path, headers = self._next(rng)
+                start = time.perf_counter()
+                try:
+                    status, size = self.transport.request(route.method, path, headers)
+                except Exception:
+                    status, size = 0, 0
+                recorder.add(route.name, time.perf_counter() - start, status, size)
+
+        threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    async def _async_phase(self, recorder, take):
+        async def worker(n):
+            rng = random.Random(self.seed * 1000 + n)
+            while take():
+                route, path, headers = self._next(rng)
+                start = time.perf_counter()
+                try:
+                    status, size = await self.transport.request(route.method, path, headers)
+                except Exception:
+                    status, size = 0, 0
+                recorder.add(route.name, time.perf_counter() - start, status, size)
+
+        await asyncio.gather(*(worker(n) for n in range(self.concurrency)))
+
+    def _phase(self, recorder, take):
+        if asyncio.iscoroutinefunction(self.transport.request):
+            asyncio.run(self._async_phase(recorder, take))
+        else:
+            self._thread_phase(recorder, take)
+
+    def run(self):
+        if self.warmup:
+            remaining = [self.warmup]
+            lock = threading.Lock()
+
+            def take_warmup():
+                with lock:
+                    remaining[0] -= 1
+                    return remaining[0] >= 0
+            self._phase(Recorder(), take_warmup)
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        self._phase(recorder, self._budget())
+        elapsed = time.perf_counter() - started
+        return self.summarize(recorder.samples, elapsed)
+
+    def summarize(self, samples, elapsed):
+        def stats(rows):
+            latencies = sorted(seconds * 1000 for seconds, _, _ in rows)
+            errors = sum(1 for _, status, _ in rows if not status or status >= 400)
+            return {
+                'requests': len(rows),
+                'errors': errors,
+                'error_rate': round(errors / len(rows), 4) if rows else 0.0,
+                'throughput': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+                'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                'p50_ms': round(percentile(latencies, 0.50), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+                'bytes': sum(size for _, _, size in rows),
+            }
+
+        all_rows = [row for rows in samples.values() for row in rows]
+        return {
+            'meta': {
+                'transport': self.transport.name,
+                'concurrency': self.concurrency,
+                'requests': self.requests if not self.duration else None,
+                'duration': self.duration,
+                'elapsed_s': round(elapsed, 3),
+                'seed': self.seed,
+                'skipped_routes': self.skipped,
+                'debug': settings.DEBUG,
+                'database': settings.DATABASES['default']['ENGINE'],
+            },
+            'routes': {name: stats(rows) for name, rows in sorted(samples.items())},
+            'total': stats(all_rows),
+        }
+
+
+def compare(results, baseline, threshold=0.10):
+    """
+    Regressions of ``results`` against ``baseline``: p95 latency up, or
+    throughput down, by more than ``threshold``, or new errors
+    """
+    regressions = []
+    current_routes = dict(results['routes'], __total__=results['total'])
+    baseline_routes = dict(baseline.get('routes', {}), __total__=baseline.get('total', {}))
+    for name, current in current_routes.items():
+        previous = baseline_routes.get(name)
+        if not previous:
+            continue
+        label = 'total' if name == '__total__' else name
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{label}: p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if previous['throughput'] and current['throughput'] < previous['throughput'] * (1 - threshold):
+            regressions.append(f"{label}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+        if current['error_rate'] > previous['error_rate'] + 0.01:
+            regressions.append(f"{label}: error rate {previous['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return regressions
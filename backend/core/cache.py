@@ -0,0 +1,46 @@
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache as BaseFileBasedCache
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+from django.core.cache.backends.redis import RedisCache as BaseRedisCache
+
+from .instrumentation import get_current_metrics
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """
+    Count cache hits and misses for the sampled request (see core.instrumentation)
+    """
+    def get(self, key, default=None, version=None):
+        metrics = get_current_metrics()
+        if metrics is None:
+            return super().get(key, default, version)
+        start = time.perf_counter()
+        value = super().get(key, _MISSING, version)
+        hit = value is not _MISSING
+        metrics.record_cache(int(hit), int(not hit), time.perf_counter() - start)
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        metrics = get_current_metrics()
+        if metrics is None:
+            return super().get_many(keys, version)
+        keys = list(keys)
+        start = time.perf_counter()
+        values = super().get_many(keys, version)
+        metrics.record_cache(len(values), len(keys) - len(values), time.perf_counter() - start)
+        return values
+
+
+class LocMemCache(InstrumentedCacheMixin, BaseLocMemCache):
+    pass
+
+
+class FileBasedCache(InstrumentedCacheMixin, BaseFileBasedCache):
+    pass
+
+
+class RedisCache(InstrumentedCacheMixin, BaseRedisCache):
+    pass
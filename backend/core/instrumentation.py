@@ -0,0 +1,181 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'SAMPLE_RATE': 1.0,       # fraction of requests instrumented
+    'SERVER_TIMING': True,    # emit the Server-Timing response header
+    'LOG': True,              # emit one structured log line per sampled request
+}
+
+_current = ContextVar('request_metrics', default=None)
+_serializing = ContextVar('serializing', default=False)
+
+
+def get_instrumentation_settings():
+    """
+    Instrumentation settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'REQUEST_INSTRUMENTATION', {}))
+    return config
+
+
+def should_sample():
+    rate = get_instrumentation_settings()['SAMPLE_RATE']
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def is_sampled(request):
+    """
+    Whether ``request`` is instrumented; decided once per request so the
+    metrics and logging middlewares agree
+    """
+    sampled = getattr(request, '_instrumentation_sampled', None)
+    if sampled is None:
+        sampled = request._instrumentation_sampled = should_sample()
+    return sampled
+
+
+def get_current_metrics():
+    """
+    Metrics of the request being handled in this context, if it is sampled
+    """
+    return _current.get()
+
+
+class RequestMetrics:
+    """
+    Timings and counters collected while one request is processed
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    def record_cache(self, hits, misses, duration):
+        self.cache_hits += hits
+        self.cache_misses += misses
+        self.cache_time += duration
+
+    def record_serialization(self, duration):
+        self.serialize_time += duration
+
+    def record_render(self, duration):
+        self.render_time += duration
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    @property
+    def view_time(self):
+        # Everything that is neither serialization nor JSON rendering:
+        # middleware, view code and the ORM
+        return max(self.total_time - self.serialize_time - self.render_time, 0.0)
+
+    def server_timing(self):
+        """
+        Server-Timing header value (durations in milliseconds)
+        """
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.db_queries} queries"',
+            f'cache;dur={self.cache_time * 1000:.2f};desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'view;dur={self.view_time * 1000:.2f}',
+            f'serialize;dur={self.serialize_time * 1000:.2f};desc="serializer data"',
+            f'render;dur={self.render_time * 1000:.2f};desc="JSON rendering"',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': round(self.cache_time * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2),
+            'serialize_ms': round(self.serialize_time * 1000, 2),
+            'render_ms': round(self.render_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """
+    Installed on every connection; times queries for the metrics of the
+    current context. Async views run their queries in sync_to_async
+    threads with their own connections, and the context (unlike a
+    per-connection wrapper) follows them there.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.db_wrapper(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+def time_serialization(to_representation, instance):
+    """
+    Call ``to_representation`` and add its duration, queries it triggers
+    included, to the serialization time of the current metrics. Nested
+    serializers run inside the outermost call and are not counted again.
+    """
+    metrics = _current.get()
+    if metrics is None or _serializing.get():
+        return to_representation(instance)
+    token = _serializing.set(True)
+    start = time.perf_counter()
+    try:
+        return to_representation(instance)
+    finally:
+        metrics.record_serialization(time.perf_counter() - start)
+        _serializing.reset(token)
+
+
+@contextmanager
+def collect_metrics():
+    """
+    Collect RequestMetrics for the enclosed block on every database alias.
+
+    Nested blocks share the outer block's metrics, so the metrics and
+    logging middlewares can both read one set of numbers.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        try:
+            yield metrics
+        finally:
+            metrics.finish()
+        return
+
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        metrics.finish()
+        _current.reset(token)
@@ -0,0 +1,266 @@
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONCURRENCY': 4,         # jobs executed in parallel per worker
+    'BATCH_SIZE': 10,         # jobs claimed per poll
+    'POOL': 'thread',         # 'thread' or 'process'
+    'POLL_INTERVAL': 1.0,     # seconds to sleep when the queue is empty
+    'LOCK_TIMEOUT': 60 * 10,  # running jobs older than this are requeued
+    'RETRY_BACKOFF': 30,      # seconds, doubled after every failed attempt
+    'MAX_ATTEMPTS': 3,
+    'ALWAYS_EAGER': False,    # run jobs inline instead of queueing them
+    'SCHEDULE': {},           # {task name: interval in seconds}
+}
+
+_registry = {}
+
+
+def get_queue_settings():
+    """
+    Job queue settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'JOB_QUEUE', {}))
+    return config
+
+
+class Task:
+    """
+    A function that can run inline or be queued for a worker.
+
+    With ``batch`` set, the function only prepares an item and
+    ``batch(items)`` does the work: the worker runs up to ``batch_size``
+    due jobs of the tasks sharing a ``batch`` handler in one call (see
+    run_batch()).
+    """
+    def __init__(self, func, name=None, queue='default', priority=0, max_attempts=None,
+                 batch=None, batch_size=None):
+        self.func = func
+        self.name = name or f'{func.__module__}.{func.__name__}'
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.batch = batch
+        self.batch_size = batch_size
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+        self.__module__ = func.__module__
+
+    def __call__(self, *args, **kwargs):
+        if self.batch is not None:
+            return self.batch([self.func(*args, **kwargs)])
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def delay(self, *args, **kwargs):
+        """
+        Queue the task with default options
+        """
+        return self.apply_async(args=args, kwargs=kwargs)
+
+    def apply_async(self, args=None, kwargs=None, countdown=None, eta=None,
+                    priority=None, queue=None, max_attempts=None):
+        """
+        Queue the task, optionally delayed by ``countdown`` seconds or until ``eta``
+        """
+        return enqueue(
+            self.name,
+            args=args,
+            kwargs=kwargs,
+            countdown=countdown,
+            eta=eta,
+            priority=self.priority if priority is None else priority,
+            queue=queue or self.queue,
+            max_attempts=max_attempts or self.max_attempts,
+        )
+
+
+def task(func=None, **options):
+    """
+    Register a function as a background task.
+
+    Usable bare (``@task``) or with options (``@task(priority=10)``).
+    The decorated function keeps working as a plain call and gains
+    ``delay()`` / ``apply_async()`` to run it on a worker.
+    """
+    def decorator(func):
+        wrapped = Task(func, **options)
+        _registry[wrapped.name] = wrapped
+        return wrapped
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def get_task(name):
+    """
+    Look up a registered task, importing its module on first use
+    """
+    if name not in _registry:
+        candidate = import_string(name)
+        if not isinstance(candidate, Task):
+            raise ValueError(f'{name} is not a registered task')
+        _registry[name] = candidate
+    return _registry[name]
+
+
+def batched_with(batch):
+    """
+    Names of the registered tasks handled by ``batch``
+    """
+    return [name for name, candidate in _registry.items() if candidate.batch is batch]
+
+
+def enqueue(name, args=None, kwargs=None, countdown=None, eta=None,
+            priority=0, queue='default', max_attempts=None):
+    """
+    Store a job for the worker, or run it immediately when ALWAYS_EAGER is set
+    """
+    from .models import Job
+
+    config = get_queue_settings()
+    args = list(args or [])
+    kwargs = dict(kwargs or {})
+
+    if config['ALWAYS_EAGER']:
+        get_task(name)(*args, **kwargs)
+        return None
+
+    run_at = eta or timezone.now()
+    if countdown:
+        run_at += timedelta(seconds=countdown)
+
+    return Job.objects.create(
+        name=name,
+        args=args,
+        kwargs=kwargs,
+        queue=queue,
+        priority=priority,
+        run_at=run_at,
+        max_attempts=max_attempts or config['MAX_ATTEMPTS'],
+    )
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff in seconds before the next attempt
+    """
+    return get_queue_settings()['RETRY_BACKOFF'] * (2 ** max(attempts - 1, 0))
+
+
+def _save_outcome(job, fields, attempts=3):
+    """
+    Persist a job result, riding out short write-lock contention (SQLite)
+    """
+    for attempt in range(attempts):
+        try:
+            job.save(update_fields=fields)
+            return
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def _record_failure(job, error):
+    from .models import Job
+
+    job.last_error = ''.join(traceback.format_exception(error))[-5000:]
+    job.locked_by = ''
+    job.locked_at = None
+    if job.attempts < job.max_attempts:
+        job.status = Job.QUEUED
+        job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        logger.warning(f'Job {job.pk} ({job.name}) failed, retry {job.attempts}/{job.max_attempts}: {str(error)}')
+    else:
+        job.status = Job.FAILED
+        job.finished_at = timezone.now()
+        logger.error(f'Job {job.pk} ({job.name}) failed permanently: {str(error)}')
+    _save_outcome(job, ['status', 'run_at', 'finished_at', 'last_error', 'locked_by', 'locked_at', 'updated_at'])
+
+
+def _record_success(job, result):
+    from .models import Job
+
+    job.status = Job.SUCCEEDED
+    job.finished_at = timezone.now()
+    try:
+        json.dumps(result)
+        job.result = result
+    except (TypeError, ValueError):
+        job.result = repr(result)
+    _save_outcome(job, ['status', 'finished_at', 'result', 'updated_at'])
+
+
+def run_job(job_id):
+    """
+    Execute a claimed job and record the outcome.
+
+    Runs inside worker threads or child processes, so it only takes the
+    job id and manages its own database connection.
+    """
+    from .models import Job
+
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        try:
+            result = get_task(job.name)(*job.args, **job.kwargs)
+        except Exception as e:
+            _record_failure(job, e)
+            return False
+        _record_success(job, result)
+        return True
+    finally:
+        close_old_connections()
+
+
+def run_batch(job_ids):
+    """
+    Execute claimed jobs of tasks sharing a ``batch`` handler together:
+    every job prepares its item, then one handler call processes them
+    all. A job that fails to prepare fails alone; a failing handler fails
+    (and retries) every job of the batch.
+    """
+    from .models import Job
+
+    close_old_connections()
+    try:
+        jobs, items = [], []
+        for job in Job.objects.filter(pk__in=job_ids).order_by('-priority', 'run_at', 'id'):
+            try:
+                task = get_task(job.name)
+                items.append(task.func(*job.args, **job.kwargs))
+            except Exception as e:
+                _record_failure(job, e)
+                continue
+            jobs.append(job)
+            batch = task.batch
+        if not jobs:
+            return False
+
+        try:
+            result = batch(items)
+        except Exception as e:
+            for job in jobs:
+                _record_failure(job, e)
+            return False
+        for job in jobs:
+            _record_success(job, result)
+        return True
+    finally:
+        close_old_connections()
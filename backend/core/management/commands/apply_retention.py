@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from core.retention import RetentionEngine
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive expired rows according to DATA_RETENTION policies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', dest='policies',
+                            help='Only apply the named policy (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Count expired rows without touching them')
+        parser.add_argument('--batch-size', type=int, help='Rows per batch')
+        parser.add_argument('--pause', type=float, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        engine = RetentionEngine(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        for stats in engine.run(names=options['policies']):
+            if stats.get('skipped'):
+                self.stdout.write(f"{stats['policy']}: skipped ({stats['model']} not installed)")
+                continue
+            verb = 'would process' if stats['dry_run'] else stats['action']
+            self.stdout.write(
+                f"{stats['policy']}: {verb} {stats['rows']} rows in {stats['batches']} batches "
+                f"({stats['rows_per_second']} rows/s, {stats['archived']} archived, "
+                f"{stats['deleted']} deleted incl. cascades)"
+            )
+        self.stdout.write(self.style.SUCCESS('Retention run completed'))
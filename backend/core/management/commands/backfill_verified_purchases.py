@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from reviews.purchases import backfill_verified_purchases
+
+
+class Command(BaseCommand):
+    help = 'Recompute the verified purchase flag of every review from delivered orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Reviews checked per query when orders are sharded')
+
+    def handle(self, *args, **options):
+        stats = backfill_verified_purchases(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Verified {stats['verified']} reviews, unverified {stats['unverified']}"
+        ))
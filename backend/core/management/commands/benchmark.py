@@ -0,0 +1,149 @@
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from core.benchmark import (
+    DEFAULT_MIX, ASGITransport, Benchmark, HTTPTransport, Route, WSGITransport, compare, load_mix,
+    load_placeholders,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Load-test a mix of API endpoints and report per-route latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['wsgi', 'asgi', 'http'], default='wsgi',
+                            help='In-process WSGI/ASGI application, or a running server (--url)')
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL for --target http')
+        parser.add_argument('--host', default='localhost',
+                            help='Host header for in-process targets; must be in ALLOWED_HOSTS')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent workers')
+        parser.add_argument('--requests', type=int, default=1000, help='Measured requests in total')
+        parser.add_argument('--duration', type=float, help='Run for this many seconds instead of --requests')
+        parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests sent first')
+        parser.add_argument('--mix', help='JSON file with a list of {name, path, weight, auth, method} routes')
+        parser.add_argument('--route', action='append', default=[], metavar='NAME=WEIGHT',
+                            help='Override the weight of a route in the mix (0 disables it)')
+        parser.add_argument('--user', help='Email of the user whose token authenticates auth routes')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against results previously written with --output')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative change in p95 or throughput counted as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error when the baseline comparison finds regressions')
+        parser.add_argument('--keep-rate-limit', action='store_true',
+                            help='Leave rate limiting on for in-process targets')
+
+    def _routes(self, options):
+        routes = load_mix(options['mix']) if options['mix'] else [
+            Route(route.name, route.path, route.weight, route.auth, route.method) for route in DEFAULT_MIX
+        ]
+        by_name = {route.name: route for route in routes}
+        for override in options['route']:
+            name, _, weight = override.partition('=')
+            if name not in by_name:
+                raise CommandError(f'Unknown route {name!r}; known routes: {", ".join(by_name)}')
+            try:
+                by_name[name].weight = float(weight)
+            except ValueError:
+                raise CommandError(f'Invalid weight in --route {override!r}')
+        return routes
+
+    def _token(self, email):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        try:
+            user = User.objects.get(email=email)
+        except User.DoesNotExist:
+            raise CommandError(f'No user with email {email!r}')
+        return user, str(RefreshToken.for_user(user).access_token)
+
+    def _transport(self, options):
+        if options['target'] == 'http':
+            return HTTPTransport(options['url'])
+        if options['target'] == 'asgi':
+            return ASGITransport(host=options['host'])
+        return WSGITransport(host=options['host'])
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{'route':<22} {'reqs':>6} {'err':>5} {'req/s':>8} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+        )
+        rows = list(results['routes'].items()) + [('total', results['total'])]
+        for name, stats in rows:
+            self.stdout.write(
+                f"{name:<22} {stats['requests']:>6} {stats['errors']:>5} {stats['throughput']:>8.1f} "
+                f"{stats['mean_ms']:>8.1f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+            )
+        if results['meta']['skipped_routes']:
+            self.stdout.write(f"Skipped (needs --user or data): {', '.join(results['meta']['skipped_routes'])}")
+
+    def handle(self, *args, **options):
+        routes = self._routes(options)
+        user, token = self._token(options['user']) if options['user'] else (None, None)
+        in_process = options['target'] != 'http'
+
+        try:
+            benchmark = Benchmark(
+                self._transport(options),
+                routes=routes,
+                concurrency=options['concurrency'],
+                requests=options['requests'],
+                duration=options['duration'],
+                warmup=options['warmup'],
+                token=token,
+                placeholders=load_placeholders(user),
+                seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        target = options['url'] if not in_process else f"in-process {options['target']}"
+        amount = f"{options['duration']}s" if options['duration'] else f"{options['requests']} requests"
+        self.stdout.write(f"Benchmarking {target}: {amount}, {options['concurrency']} workers")
+
+        # Per-request log lines and N+1 warnings would drown the report
+        quiet = {'core.middleware': logging.WARNING, 'core.nplusone': logging.ERROR}
+        log_levels = {name: logging.getLogger(name).level for name in quiet}
+        for name, level in quiet.items():
+            logging.getLogger(name).setLevel(level)
+        try:
+            if in_process and not options['keep_rate_limit']:
+                with override_settings(RATE_LIMIT={'ENABLED': False}):
+                    results = benchmark.run()
+            else:
+                results = benchmark.run()
+        finally:
+            for name, level in log_levels.items():
+                logging.getLogger(name).setLevel(level)
+        results['meta']['target'] = target
+
+        self._report(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {exc}")
+            regressions = compare(results, baseline, options['threshold'])
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS(
+                    f"No regressions against {options['baseline']} (threshold {options['threshold']:.0%})"
+                ))
+            else:
+                for regression in regressions:
+                    self.stdout.write(self.style.WARNING(f'Regression: {regression}'))
+                if options['fail_on_regression']:
+                    raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
@@ -0,0 +1,75 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.benchmark import ASGITransport, Benchmark, Route, load_placeholders
+
+# The catalog reads that have an async version in products.async_views
+CATALOG_ROUTES = [
+    ('product_list', '', 30),
+    ('product_detail', '{product}/', 20),
+    ('product_quick_view', '{product}/quick-view/', 15),
+    ('related_products', '{product}/related/', 15),
+    ('featured_products', 'featured/', 10),
+    ('search_suggestions', 'search-suggestions/?q=smart', 10),
+]
+
+PREFIXES = {'sync': '/api/products/', 'async': '/api/async/products/'}
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync and async catalog endpoints on the ASGI application'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                            help='Concurrent clients; each level is run for both paths')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per run')
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--uncached', action='store_true',
+                            help='Use a dummy cache so every request reaches the database')
+        parser.add_argument('--host', default='localhost')
+
+    def _run(self, transport, path, concurrency, options, placeholders):
+        routes = [Route(name, PREFIXES[path] + suffix, weight) for name, suffix, weight in CATALOG_ROUTES]
+        return Benchmark(
+            transport, routes, concurrency=concurrency, requests=options['requests'],
+            warmup=options['warmup'], placeholders=placeholders,
+        ).run()
+
+    def handle(self, *args, **options):
+        overrides = {'RATE_LIMIT': {'ENABLED': False}}
+        if options['uncached']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        # Set up the application first: django.setup() reconfigures logging
+        transport = ASGITransport(host=options['host'])
+        placeholders = load_placeholders()
+
+        # Per-request log lines and N+1 warnings would drown the report
+        quiet = {'core.middleware': logging.WARNING, 'core.nplusone': logging.ERROR}
+        log_levels = {name: logging.getLogger(name).level for name in quiet}
+        for name, level in quiet.items():
+            logging.getLogger(name).setLevel(level)
+
+        self.stdout.write(
+            f"{options['requests']} requests per run on the in-process ASGI application"
+            f"{' without cache' if options['uncached'] else ''}"
+        )
+        self.stdout.write(f"{'clients':>8} {'path':<6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+        try:
+            with override_settings(**overrides):
+                for concurrency in options['concurrency']:
+                    throughput = {}
+                    for path in ('sync', 'async'):
+                        total = self._run(transport, path, concurrency, options, placeholders)['total']
+                        throughput[path] = total['throughput']
+                        self.stdout.write(
+                            f"{concurrency:>8} {path:<6} {total['throughput']:>8.1f} {total['p50_ms']:>8.1f} "
+                            f"{total['p95_ms']:>8.1f} {total['p99_ms']:>8.1f} {total['errors']:>7}"
+                        )
+                    if throughput['sync']:
+                        self.stdout.write(f"{'':>8} async/sync throughput: {throughput['async'] / throughput['sync']:.2f}x")
+        finally:
+            for name, level in log_levels.items():
+                logging.getLogger(name).setLevel(level)
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from core.middleware import RateLimitMiddleware
+from core.ratelimit import SlidingWindowLimiter
+
+
+class ListLimiter:
+    """
+    The previous per-process implementation, kept for comparison:
+    one Python list of timestamps per client, rebuilt on every request.
+    """
+    def __init__(self):
+        self.requests = {}
+
+    def hit(self, key, limit, period):
+        now = time.time()
+        cutoff = now - period
+        self.requests[key] = [t for t in self.requests.get(key, []) if t > cutoff]
+        if len(self.requests[key]) >= limit:
+            return False
+        self.requests[key].append(now)
+        return True
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of the rate limiter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50000)
+        parser.add_argument('--clients', type=int, default=1000, help='Distinct client keys')
+        parser.add_argument('--limit', type=int, default=1000, help='Requests allowed per period')
+        parser.add_argument('--period', type=int, default=60)
+        parser.add_argument('--path', default='/api/products/', help='Path used for the middleware run')
+
+    def _time(self, label, iterations, func):
+        start = time.perf_counter()
+        for i in range(iterations):
+            func(i)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{label:<28} {elapsed / iterations * 1e6:8.2f} us/request')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        clients = options['clients']
+        limit = options['limit']
+        period = options['period']
+        prefix = f'rl-bench-{time.time_ns()}'
+
+        self.stdout.write(f'{iterations} requests over {clients} clients, limit {limit}/{period}s')
+
+        limiter = SlidingWindowLimiter(prefix=prefix)
+        self._time('sliding window (cache)', iterations,
+                   lambda i: limiter.hit(f'c{i % clients}', limit, period))
+
+        legacy = ListLimiter()
+        self._time('timestamp lists (legacy)', iterations,
+                   lambda i: legacy.hit(f'c{i % clients}', limit, period))
+
+        factory = RequestFactory()
+        middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        match = resolve(options['path'])
+        requests = []
+        for n in range(clients):
+            request = factory.get(options['path'], REMOTE_ADDR=f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}')
+            request.resolver_match = match
+            requests.append(request)
+
+        def through_middleware(i):
+            request = requests[i % clients]
+            middleware.process_view(request, match.func, match.args, match.kwargs)
+            middleware.process_response(request, HttpResponse())
+
+        self._time('middleware (full path)', iterations, through_middleware)
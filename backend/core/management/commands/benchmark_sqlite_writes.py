@@ -0,0 +1,183 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import F
+from django.test import override_settings
+
+from core.benchmark import percentile
+from core.writes import serialized_write
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+
+# (SQLITE_PROFILES entry, single-writer queue)
+RUNS = {
+    'default': ('default', False),
+    'concurrent': ('concurrent', False),
+    'queued': ('concurrent', True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent order writes and catalog reads against scratch SQLite databases '
+        'with each connection profile and report lock errors and throughput'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of operations that place an order')
+        parser.add_argument('--runs', nargs='+', choices=list(RUNS), default=list(RUNS))
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def _add_database(self, alias, name, options):
+        connections.settings[alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name, 'OPTIONS': options},
+        })[alias]
+
+    def _remove_database(self, alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def _prepare_template(self, path):
+        alias = 'sqlite_bench_template'
+        self._add_database(alias, path, {})
+        try:
+            call_command('migrate', database=alias, verbosity=0)
+            category = Category.objects.using(alias).create(name='Benchmark', slug='benchmark')
+            Product.objects.using(alias).bulk_create([
+                Product(name=f'Benchmark {n}', slug=f'benchmark-{n}', description='-', category=category,
+                        price=Decimal(10 + n), stock_quantity=10 ** 6, sku=f'BENCH-{n}')
+                for n in range(50)
+            ])
+            from django.contrib.auth import get_user_model
+            user = get_user_model().objects.db_manager(alias).create_user(
+                username='sqlite-bench', email='sqlite-bench@example.com', password='bench',
+            )
+            return user.pk, list(Product.objects.using(alias).values_list('pk', flat=True))
+        finally:
+            self._remove_database(alias)
+
+    def _place_order(self, alias, user_id, product_id, queued):
+        write = serialized_write(alias) if queued else transaction.atomic(using=alias)
+        with write:
+            # Read, then write: the pattern that deadlocks deferred transactions
+            product = Product.objects.using(alias).get(pk=product_id)
+            order = Order.objects.using(alias).create(
+                user_id=user_id, total_amount=product.price, shipping_first_name='Bench',
+                shipping_last_name='Mark', shipping_email='bench@example.com', shipping_phone='0',
+                shipping_address='-', shipping_city='-', shipping_state='-', shipping_postal_code='0',
+            )
+            OrderItem.objects.using(alias).create(
+                order=order, product=product, product_name=product.name, product_sku=product.sku,
+                quantity=1, price=product.price,
+            )
+            Product.objects.using(alias).filter(pk=product_id).update(stock_quantity=F('stock_quantity') - 1)
+
+    def _read_catalog(self, alias):
+        list(Product.objects.using(alias).select_related('category').order_by('-id')[:20])
+
+    def _run(self, alias, user_id, product_ids, queued, options):
+        samples = {'write': [], 'read': []}
+        errors = {'write': 0, 'read': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(n):
+            rng = random.Random(options['seed'] * 1000 + n)
+            try:
+                while time.monotonic() < deadline:
+                    kind = 'write' if rng.random() < options['write_ratio'] else 'read'
+                    start = time.perf_counter()
+                    try:
+                        if kind == 'write':
+                            self._place_order(alias, user_id, rng.choice(product_ids), queued)
+                        else:
+                            self._read_catalog(alias)
+                    except OperationalError as exc:
+                        if 'locked' not in str(exc) and 'busy' not in str(exc):
+                            raise
+                        with lock:
+                            errors[kind] += 1
+                        continue
+                    with lock:
+                        samples[kind].append((time.perf_counter() - start) * 1000)
+            finally:
+                connections[alias].close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        result = {}
+        for kind in ('write', 'read'):
+            latencies = sorted(samples[kind])
+            attempts = len(latencies) + errors[kind]
+            result[kind] = {
+                'ok': len(latencies),
+                'lock_errors': errors[kind],
+                'error_rate': round(errors[kind] / attempts, 4) if attempts else 0.0,
+                'throughput': round(len(latencies) / elapsed, 1),
+                'p50_ms': round(percentile(latencies, 0.50), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+            }
+        return result
+
+    def handle(self, *args, **options):
+        if not 0 <= options['write_ratio'] <= 1:
+            raise CommandError('--write-ratio must be between 0 and 1')
+
+        directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+        results = {}
+        try:
+            template = os.path.join(directory, 'template.sqlite3')
+            user_id, product_ids = self._prepare_template(template)
+            self.stdout.write(
+                f"{options['threads']} threads for {options['duration']:.0f}s per run, "
+                f"{options['write_ratio']:.0%} order writes"
+            )
+            self.stdout.write(
+                f"{'run':<11} {'writes/s':>9} {'lock errors':>12} {'error rate':>11} "
+                f"{'write p99':>10} {'reads/s':>8} {'read p99':>9}"
+            )
+            for name in options['runs']:
+                profile, queued = RUNS[name]
+                alias = f'sqlite_bench_{name}'
+                path = os.path.join(directory, f'{name}.sqlite3')
+                shutil.copyfile(template, path)
+                self._add_database(alias, path, settings.SQLITE_PROFILES[profile])
+                try:
+                    with override_settings(SQLITE_WRITE_QUEUE={'ENABLED': queued}):
+                        result = results[name] = self._run(alias, user_id, product_ids, queued, options)
+                finally:
+                    self._remove_database(alias)
+                write, read = result['write'], result['read']
+                self.stdout.write(
+                    f"{name:<11} {write['throughput']:>9.1f} {write['lock_errors'] + read['lock_errors']:>12} "
+                    f"{write['error_rate']:>11.2%} {write['p99_ms']:>9.1f}ms {read['throughput']:>8.1f} "
+                    f"{read['p99_ms']:>7.1f}ms"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in ('threads', 'duration', 'write_ratio', 'seed')},
+                           'runs': results}, f, indent=2)
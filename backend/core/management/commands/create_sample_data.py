@@ -1,60 +1,53 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from products.models import Category, Product
-from orders.models import Order, OrderItem
-import random
+from core.sampledata import PRESETS, SampleDataGenerator
 
 User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Create sample data for development'
+    help = 'Create sample data for development and load testing'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(PRESETS), default='small',
+                            help='Preset dataset size; the options below override single values')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many past days')
+        parser.add_argument('--categories', type=int, help='Top-level categories')
+        parser.add_argument('--subcategories', type=int, help='Children per category at each nested level')
+        parser.add_argument('--category-depth', type=int, help='Levels of nested categories below the top level')
+        parser.add_argument('--products', type=int)
+        parser.add_argument('--images-per-product', type=int)
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--orders', type=int)
+        parser.add_argument('--max-items-per-order', type=int)
+        parser.add_argument('--reviews', type=int)
+        parser.add_argument('--helpful-votes', type=int)
     
     def handle(self, *args, **options):
-        self.stdout.write('Creating sample data...')
-        
-        # Create sample categories
-        categories_data = [
-            {'name': 'Electronics', 'description': 'Electronic devices and gadgets'},
-            {'name': 'Clothing', 'description': 'Fashion and apparel'},
-            {'name': 'Books', 'description': 'Books and educational materials'},
-            {'name': 'Home & Garden', 'description': 'Home improvement and garden supplies'},
-        ]
-        
-        categories = []
-        for cat_data in categories_data:
-            category, created = Category.objects.get_or_create(
-                name=cat_data['name'],
-                defaults={
-                    'slug': cat_data['name'].lower().replace(' ', '-'),
-                    'description': cat_data['description']
-                }
-            )
-            categories.append(category)
-            if created:
-                self.stdout.write(f'Created category: {category.name}')
+        sizes = dict(PRESETS[options['size']])
+        for name in sizes:
+            if options.get(name) is not None:
+                sizes[name] = options[name]
         
-        # Create sample products
-        for i in range(20):
-            category = random.choice(categories)
-            product, created = Product.objects.get_or_create(
-                name=f'Sample Product {i+1}',
-                defaults={
-                    'slug': f'sample-product-{i+1}',
-                    'description': f'This is a sample product {i+1} description.',
-                    'short_description': f'Sample product {i+1}',
-                    'category': category,
-                    'price': random.uniform(10, 500),
-                    'stock_quantity': random.randint(0, 100),
-                    'sku': f'SP{i+1:03d}',
-                    'is_featured': random.choice([True, False])
-                }
-            )
-            if created:
-                self.stdout.write(f'Created product: {product.name}')
+        self.stdout.write(
+            f"Creating sample data (seed {options['seed']}): "
+            + ', '.join(f'{name}={value}' for name, value in sizes.items())
+        )
+        started = time.monotonic()
+        generator = SampleDataGenerator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            days=options['days'],
+            log=self.stdout.write,
+        )
+        generator.generate(**sizes)
         
         # Create sample user
         if not User.objects.filter(email='demo@example.com').exists():
-            user = User.objects.create_user(
+            User.objects.create_user(
                 username='demo',
                 email='demo@example.com',
                 password='demo123',
@@ -64,5 +57,5 @@ class Command(BaseCommand):
             self.stdout.write('Created demo user (demo@example.com / demo123)')
         
         self.stdout.write(
-            self.style.SUCCESS('Sample data created successfully!')
+            self.style.SUCCESS(f'Sample data created successfully in {time.monotonic() - started:.1f}s!')
         )
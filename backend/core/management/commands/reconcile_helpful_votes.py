@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from reviews.helpful import flush_helpful_votes, reconcile_helpful_counts
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered helpful votes, or recount them from the votes table and fix drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flush-only', action='store_true',
+                            help='Only apply the buffered votes of closed epochs')
+        parser.add_argument('--batch-size', type=int, help='Rows per bulk update')
+
+    def handle(self, *args, **options):
+        if options['flush_only']:
+            applied = flush_helpful_votes()
+            self.stdout.write(self.style.SUCCESS(f'Applied buffered votes of {applied} reviews'))
+            return
+        fixed = reconcile_helpful_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Fixed the helpful counters of {fixed} reviews'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from core.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run a background job worker backed by the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', dest='queues',
+                            help='Queue to consume (repeatable, default: "default")')
+        parser.add_argument('--concurrency', type=int, help='Jobs run in parallel')
+        parser.add_argument('--batch-size', type=int, help='Jobs claimed per poll')
+        parser.add_argument('--pool', choices=['thread', 'process'], help='Executor used to run jobs')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--max-jobs', type=int, help='Exit after processing this many jobs')
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            queues=options['queues'],
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(
+            f'Starting worker {worker.worker_id} '
+            f'(queues={",".join(worker.queues)}, concurrency={worker.concurrency}, pool={worker.pool})'
+        )
+        processed = worker.run(burst=options['burst'], max_jobs=options['max_jobs'])
+        self.stdout.write(self.style.SUCCESS(f'Worker finished, processed {processed} job(s)'))
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.slowqueries import get_slow_query_settings, request_explain, slow_query_log
+
+
+class Command(BaseCommand):
+    help = 'Show the slowest query fingerprints recorded by the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--explain', metavar='FINGERPRINT',
+                            help='Ask the workers to capture the plan of this fingerprint')
+        parser.add_argument('--reset', action='store_true', help='Clear the recorded queries')
+        parser.add_argument('--json', action='store_true', help='Print raw JSON')
+
+    def handle(self, *args, **options):
+        if not get_slow_query_settings()['DIR']:
+            self.stderr.write(
+                'SLOW_QUERIES["DIR"] is not set: only queries of this process are visible.'
+            )
+
+        if options['reset']:
+            slow_query_log.reset()
+            self.stdout.write('Slow query log cleared')
+            return
+
+        if options['explain']:
+            request_explain(options['explain'])
+            self.stdout.write(
+                f'Plan requested; it is captured the next time {options["explain"]} runs slowly'
+            )
+
+        entries = slow_query_log.top(options['limit'])
+        if options['json']:
+            self.stdout.write(json.dumps(entries, indent=2))
+            return
+
+        if not entries:
+            self.stdout.write('No slow queries recorded')
+        for entry in entries:
+            sample = entry['sample']
+            self.stdout.write(
+                f"{entry['fingerprint']}  total {entry['total_ms']:.1f}ms  "
+                f"count {entry['count']}  mean {entry['mean_ms']:.1f}ms  max {entry['max_ms']:.1f}ms"
+            )
+            self.stdout.write(f"  {entry['normalized_sql'][:300]}")
+            for site, count in sorted(entry['call_sites'].items(), key=lambda item: -item[1]):
+                self.stdout.write(f'  at {site} ({count}x)')
+            self.stdout.write(f"  slowest params: {sample['params']}")
+            if entry['plan']:
+                for line in entry['plan'].splitlines():
+                    self.stdout.write(f'  | {line}')
+            self.stdout.write('')
@@ -0,0 +1,323 @@
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': None,              # shared directory for multi-process aggregation
+    'FLUSH_INTERVAL': 5.0,    # seconds between writes of this process's file
+    'TOKEN': None,            # if set, required as "Authorization: Bearer <token>"
+    'COLLECT_ALL': False,     # time queries and cache lookups of every request, not only sampled ones
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def get_metrics_settings():
+    """
+    Metrics settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'METRICS', {}))
+    return config
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A named metric with optional labels, registered on creation
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.values = {}
+        self.registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def merge_values(self, target, source):
+        for key, value in source.items():
+            target[key] = target.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Gauges of all live processes are summed at scrape time
+    """
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Values are stored as per-bucket counts followed by sum and count
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self.registry.lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def merge_values(self, target, source):
+        for key, row in source.items():
+            if key in target:
+                target[key] = [a + b for a, b in zip(target[key], row)]
+            else:
+                target[key] = list(row)
+
+    def samples(self, values):
+        for key, row in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(float(bound))
+                yield f'{self.name}_bucket', _format_labels(self.labelnames, key, ('le', le)), cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum', labels, row[-2]
+            yield f'{self.name}_count', labels, row[-1]
+
+
+class FileStore:
+    """
+    One JSON snapshot per process in a shared directory.
+
+    Each worker rewrites its own file (atomically) at most every
+    FLUSH_INTERVAL seconds; a scrape merges the files of all workers.
+    Counters and histograms of exited workers are kept so totals never go
+    backwards, their gauges are dropped.
+    """
+    def __init__(self, directory, prefix='metrics'):
+        self.directory = directory
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, pid):
+        return os.path.join(self.directory, f'{self.prefix}-{pid}.json')
+
+    def write(self, snapshot):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f'.{self.prefix}-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.path(snapshot['pid']))
+
+    def read(self):
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith(f'{self.prefix}-') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self._store = None
+        self._store_dir = None
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+
+    def get_store(self):
+        directory = get_metrics_settings()['DIR']
+        if directory != self._store_dir:
+            self._store = FileStore(str(directory)) if directory else None
+            self._store_dir = directory
+        return self._store
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'metrics': {
+                    name: [
+                        [list(key), list(value) if isinstance(value, list) else value]
+                        for key, value in metric.values.items()
+                    ]
+                    for name, metric in self.metrics.items()
+                },
+            }
+
+    def flush(self, force=False):
+        store = self.get_store()
+        if store is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < get_metrics_settings()['FLUSH_INTERVAL']:
+            return
+        self._last_flush = now
+        store.write(self.snapshot())
+
+    def collect(self):
+        """
+        Values of every metric, merged across processes when a store is set
+        """
+        store = self.get_store()
+        if store is None:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush(force=True)
+            snapshots = store.read()
+
+        merged = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            alive = snapshot['pid'] == os.getpid() or _process_alive(snapshot['pid'])
+            for name, rows in snapshot['metrics'].items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.type == 'gauge' and not alive):
+                    continue
+                metric.merge_values(merged[name], {tuple(key): value for key, value in rows})
+        return merged
+
+    def expose(self, values=None):
+        """
+        Render all metrics in the Prometheus text exposition format;
+        ``values`` are collect() results, computed if not given
+        """
+        lines = []
+        for name, metric_values in (values or self.collect()).items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for sample_name, labels, value in metric.samples(metric_values):
+                lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush, force=True)
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route, method and status code',
+    ['route', 'method', 'status'],
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route',
+    ['route', 'method'],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled',
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per HTTP request by route',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups made while handling requests',
+    ['result'],
+)
+Gauge(
+    'cache_hit_ratio', 'Cache hits over lookups since start, computed at scrape time',
+)
+
+
+def observe_request(route, method, status, duration, request_metrics=None):
+    """
+    Count a finished request; query counts and cache lookups are only
+    known for instrumented requests (``request_metrics``)
+    """
+    REQUESTS.inc(route=route, method=method, status=status)
+    REQUEST_LATENCY.observe(duration, route=route, method=method)
+    if request_metrics is not None:
+        DB_QUERIES.observe(request_metrics.db_queries, route=route)
+        if request_metrics.cache_hits:
+            CACHE_REQUESTS.inc(request_metrics.cache_hits, result='hit')
+        if request_metrics.cache_misses:
+            CACHE_REQUESTS.inc(request_metrics.cache_misses, result='miss')
+    REGISTRY.flush()
+
+
+def expose_metrics():
+    """
+    Prometheus text for all workers, with the derived cache hit ratio
+    """
+    values = REGISTRY.collect()
+    cache = values['cache_requests_total']
+    hits = cache.get(('hit',), 0)
+    lookups = hits + cache.get(('miss',), 0)
+    # Derived from the merged counters rather than summed across processes
+    values['cache_hit_ratio'] = {(): hits / lookups if lookups else 0.0}
+    return REGISTRY.expose(values)
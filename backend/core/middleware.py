@@ -1,72 +1,175 @@
+import json
 import time
 import logging
+from contextlib import nullcontext
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 from django.conf import settings
+from .instrumentation import collect_metrics, get_instrumentation_settings, is_sampled
+from .metrics import REQUESTS_IN_FLIGHT, get_metrics_settings, observe_request
+from .ratelimit import check_request
 
 logger = logging.getLogger(__name__)
 
-class RequestLoggingMiddleware(MiddlewareMixin):
+class MetricsMiddleware:
     """
-    Log all requests with timing information
+    Record Prometheus metrics for every request: latency and status per
+    resolved route and in-flight requests. Database queries and cache
+    lookups are counted for instrumented requests only (sampled, see
+    core.instrumentation, or all with METRICS['COLLECT_ALL']), so the
+    wrappers stay off for most traffic.
     """
-    def process_request(self, request):
-        request.start_time = time.time()
-    
-    def process_response(self, request, response):
-        if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            logger.info(
-                f"{request.method} {request.path} - "
-                f"Status: {response.status_code} - "
-                f"Duration: {duration:.2f}s"
-            )
-        return response
+    async_capable = True
+    sync_capable = True
 
-class RateLimitMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _collect(self, request):
+        if get_metrics_settings()['COLLECT_ALL'] or is_sampled(request):
+            return collect_metrics()
+        return nullcontext()
+
+    def _observe(self, request, status, start, metrics):
+        REQUESTS_IN_FLIGHT.dec()
+        resolver_match = getattr(request, 'resolver_match', None)
+        # Route names rather than paths keep label cardinality bounded
+        route = resolver_match.view_name if resolver_match else 'unresolved'
+        observe_request(route, request.method, status, time.perf_counter() - start, metrics)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_metrics_settings()['ENABLED']:
+            return self.get_response(request)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        status = 500
+        metrics = None
+        try:
+            with self._collect(request) as metrics:
+                response = self.get_response(request)
+                status = response.status_code
+            return response
+        finally:
+            self._observe(request, status, start, metrics)
+
+    async def __acall__(self, request):
+        if not get_metrics_settings()['ENABLED']:
+            return await self.get_response(request)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        status = 500
+        metrics = None
+        try:
+            with self._collect(request) as metrics:
+                response = await self.get_response(request)
+                status = response.status_code
+            return response
+        finally:
+            self._observe(request, status, start, metrics)
+
+class RequestLoggingMiddleware:
     """
-    Simple rate limiting middleware
+    Log all requests with timing information.
+
+    Sampled requests (REQUEST_INSTRUMENTATION['SAMPLE_RATE']) are
+    instrumented: database queries, cache hits and misses and response
+    rendering are timed and reported in a Server-Timing header and a
+    structured log line; see core.instrumentation.
     """
+    async_capable = True
+    sync_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.requests = {}  # In production, use Redis
-    
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _log(self, request, response, start):
+        logger.info(
+            f"{request.method} {request.path} - "
+            f"Status: {response.status_code} - "
+            f"Duration: {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+    def _report(self, request, response, metrics):
+        config = get_instrumentation_settings()
+        if config['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing()
+        if config['LOG']:
+            resolver_match = getattr(request, 'resolver_match', None)
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': resolver_match.view_name if resolver_match else None,
+                'status': response.status_code,
+                **metrics.as_dict(),
+            }))
+
     def __call__(self, request):
-        client_ip = self.get_client_ip(request)
-        
-        # Rate limit: 100 requests per minute
-        current_time = time.time()
-        minute_ago = current_time - 60
-        
-        # Clean old requests
-        if client_ip in self.requests:
-            self.requests[client_ip] = [
-                req_time for req_time in self.requests[client_ip] 
-                if req_time > minute_ago
-            ]
-        else:
-            self.requests[client_ip] = []
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_sampled(request):
+            start = time.perf_counter()
+            response = self.get_response(request)
+            self._log(request, response, start)
+            return response
+
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+            # Lazy responses (e.g. TemplateResponse) are rendered by now;
+            # DRF responses have been rendered by the handler as well.
+        self._report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        if not is_sampled(request):
+            start = time.perf_counter()
+            response = await self.get_response(request)
+            self._log(request, response, start)
+            return response
+
+        with collect_metrics() as metrics:
+            response = await self.get_response(request)
+        self._report(request, response, metrics)
+        return response
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Sliding-window rate limiting backed by the shared cache.
+
+    Limits are configured per client (user or IP) and per resolved route
+    in settings.RATE_LIMIT; see core.ratelimit.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route_name = request.resolver_match.view_name if request.resolver_match else None
+        result = check_request(request, route_name)
+        if result is None:
+            return None
         
-        # Check rate limit
-        if len(self.requests[client_ip]) >= 100:
+        request.rate_limit = result
+        if not result.allowed:
             return JsonResponse(
                 {'error': 'Rate limit exceeded'}, 
                 status=429
             )
-        
-        # Add current request
-        self.requests[client_ip].append(current_time)
-        
-        response = self.get_response(request)
-        return response
+        return None
     
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    def process_response(self, request, response):
+        result = getattr(request, 'rate_limit', None)
+        if result is not None:
+            response['X-RateLimit-Limit'] = str(result.limit)
+            response['X-RateLimit-Remaining'] = str(result.remaining)
+            response['X-RateLimit-Reset'] = str(result.reset)
+            if not result.allowed:
+                response['Retry-After'] = str(result.retry_after)
+        return response
 
 class SecurityHeadersMiddleware(MiddlewareMixin):
     """
@@ -1,6 +1,8 @@
 from django.db import models
 from rest_framework import serializers
 
+from .instrumentation import time_serialization
+
 class UserQuerySetMixin:
     """
     Mixin to filter queryset by current user
@@ -16,6 +18,14 @@ class TimestampSerializerMixin:
     created_at = serializers.DateTimeField(read_only=True)
     updated_at = serializers.DateTimeField(read_only=True)
 
+class InstrumentedSerializerMixin:
+    """
+    Mixin to report the time spent building serializer data to the
+    request metrics (see core.instrumentation)
+    """
+    def to_representation(self, instance):
+        return time_serialization(super().to_representation, instance)
+
 class UserSerializerMixin:
     """
     Mixin to automatically set user field
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class TimeStampedModel(models.Model):
     """
@@ -32,3 +33,63 @@ class BaseModel(TimeStampedModel, SoftDeleteModel):
     """
     class Meta:
         abstract = True
+
+class Job(TimeStampedModel):
+    """
+    A unit of background work stored in the database (see core.jobs)
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=50, default='default')
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'queue', '-priority', 'run_at']),
+            models.Index(fields=['status', 'locked_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+class Watermark(models.Model):
+    """
+    Named high-water mark for incremental jobs
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+    @classmethod
+    def get_value(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first()
+
+    @classmethod
+    def set_value(cls, name, value):
+        cls.objects.update_or_create(name=name, defaults={'value': value})
@@ -0,0 +1,238 @@
+import logging
+import os
+import re
+import sys
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .slowqueries import fingerprint, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'THRESHOLD': 3,        # same-shape queries in one request/test before reporting
+    'RAISE': False,        # middleware: turn detections into a 500 instead of a warning
+    'IGNORE': [],          # regexes matched against the normalized SQL
+    'STACK_DEPTH': 8,
+}
+
+
+def get_nplusone_settings():
+    """
+    N+1 detector settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'NPLUSONE', {}))
+    return config
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class Detection:
+    """
+    One query shape repeated within a request or test
+    """
+    def __init__(self, fp, sql, count, origins, stack):
+        self.fingerprint = fp
+        self.sql = sql
+        self.count = count
+        self.origins = origins
+        self.stack = stack
+
+    def __str__(self):
+        origins = ', '.join(f'{origin} ({count}x)' for origin, count in self.origins.items()) or 'unknown origin'
+        lines = [f'{self.count} queries from {origins}:', f'  {self.sql[:300]}']
+        lines.extend(f'    at {frame}' for frame in self.stack)
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'sql': self.sql,
+            'count': self.count,
+            'origins': self.origins,
+            'stack': self.stack,
+        }
+
+
+_HOOK_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('nplusone.py', 'slowqueries.py', 'instrumentation.py')
+}
+
+
+def _project_frame(frame, root):
+    filename = frame.f_code.co_filename
+    return filename.startswith(root) and 'site-packages' not in filename and filename not in _HOOK_FILES
+
+
+def find_origin(frame, root, depth):
+    """
+    The serializer field or model property that issued the query, and the
+    project frames leading to it
+    """
+    origin = None
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        owner = frame.f_locals.get('self')
+        if origin is None and owner is not None:
+            attribute = getattr(type(owner), code.co_name, None)
+            if isinstance(attribute, property) and _project_frame(frame, root):
+                origin = f'{type(owner).__name__}.{code.co_name} (property)'
+            elif code.co_name == 'to_representation' and 'field' in frame.f_locals:
+                field = frame.f_locals['field']
+                name = getattr(field, 'field_name', None)
+                if name is not None:
+                    origin = f'{type(owner).__name__}.{name} (serializer field)'
+        if _project_frame(frame, root) and len(stack) < depth:
+            stack.append(f'{os.path.relpath(code.co_filename, root)}:{frame.f_lineno} in {code.co_name}')
+        frame = frame.f_back
+    return origin, stack
+
+
+_trackers = ContextVar('nplusone_trackers', default=())
+
+
+def track_queries(execute, sql, params, many, context):
+    """
+    Installed on every connection; feeds the SELECTs to the trackers
+    active in the current context (sync_to_async threads included)
+    """
+    trackers = _trackers.get()
+    if trackers and not many and sql.lstrip()[:6].upper() == 'SELECT':
+        for tracker in trackers:
+            tracker.record(sql)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    if track_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_queries)
+
+
+class QueryTracker:
+    """
+    Group the SELECTs issued while active by normalized shape
+    """
+    def __init__(self, threshold=None):
+        config = get_nplusone_settings()
+        self.threshold = threshold or config['THRESHOLD']
+        self.ignore = [re.compile(pattern) for pattern in config['IGNORE']]
+        self.depth = config['STACK_DEPTH']
+        self.root = str(settings.BASE_DIR)
+        self.groups = {}
+        self._token = None
+
+    def record(self, sql):
+        normalized = normalize_sql(sql)
+        fp = fingerprint(normalized)
+        group = self.groups.get(fp)
+        if group is None:
+            if any(pattern.search(normalized) for pattern in self.ignore):
+                self.groups[fp] = None
+                return
+            group = self.groups[fp] = {'sql': normalized, 'count': 0, 'origins': {}, 'stack': None, 'stack_origin': None}
+        elif group is None:
+            return
+        group['count'] += 1
+        origin, stack = find_origin(sys._getframe(2), self.root, self.depth)
+        if origin:
+            group['origins'][origin] = group['origins'].get(origin, 0) + 1
+        # Keep the first stack, preferring one with a known origin
+        if group['stack'] is None or (origin and group['stack_origin'] is None):
+            group['stack'], group['stack_origin'] = stack, origin
+
+    def __enter__(self):
+        self._token = _trackers.set(_trackers.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _trackers.reset(self._token)
+        self._token = None
+
+    @property
+    def detections(self):
+        return [
+            Detection(fp, group['sql'], group['count'], group['origins'], group['stack'] or [])
+            for fp, group in self.groups.items()
+            if group is not None and group['count'] >= self.threshold
+        ]
+
+    def report(self):
+        return '\n\n'.join(str(detection) for detection in self.detections)
+
+
+class detect_n_plus_one(ContextDecorator):
+    """
+    Fail a test (or block) that repeats one query shape ``threshold`` times.
+
+        @detect_n_plus_one()
+        def test_product_list(self): ...
+
+        with detect_n_plus_one(threshold=5) as tracker:
+            client.get('/api/orders/')
+    """
+    def __init__(self, threshold=None, raise_error=True):
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.tracker = None
+
+    def __enter__(self):
+        self.tracker = QueryTracker(self.threshold).__enter__()
+        return self.tracker
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracker.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and self.raise_error and self.tracker.detections:
+            raise NPlusOneError(f'N+1 queries detected:\n\n{self.tracker.report()}')
+        return False
+
+
+class NPlusOneMiddleware:
+    """
+    Development-only: report repeated query shapes per request in the log
+    and an X-NPlusOne header (or fail the request when NPLUSONE['RAISE'])
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryTracker() as tracker:
+            response = self.get_response(request)
+        return self._report(request, response, tracker)
+
+    async def __acall__(self, request):
+        with QueryTracker() as tracker:
+            response = await self.get_response(request)
+        return self._report(request, response, tracker)
+
+    def _report(self, request, response, tracker):
+        detections = tracker.detections
+        if detections:
+            report = tracker.report()
+            if get_nplusone_settings()['RAISE']:
+                raise NPlusOneError(f'N+1 queries detected in {request.method} {request.path}:\n\n{report}')
+            logger.warning(f'N+1 queries detected in {request.method} {request.path}:\n\n{report}')
+            response['X-NPlusOne'] = ', '.join(
+                f'{detection.fingerprint}={detection.count}' for detection in detections
+            )
+        return response
@@ -1,5 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from collections import OrderedDict
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -36,3 +44,113 @@ class SmallResultsSetPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 20
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a sort field plus the primary key. A page starts
+    right after the last row of the previous one (WHERE (field, id) < (x, y)),
+    so every page costs the same however deep it is, and nothing is
+    counted. Rows that tie on the sort field are ordered by id, which keeps
+    the cursor exact where CursorPagination would fall back to offsets.
+
+    ``orderings`` maps the values of ``?sort=`` to (field, id) orderings;
+    back each one with an index.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'sort'
+    orderings = {'recent': ('-created_at', '-id')}
+    default_ordering = 'recent'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            position, backwards = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return [str(value) for value in position], bool(backwards)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, backwards):
+        position = [self.fields[name.lstrip('-')].value_to_string(row) for name in self.ordering]
+        encoded = base64.urlsafe_b64encode(json.dumps([position, backwards]).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def page_queryset(self, queryset, base_url, sort=None, cursor=None):
+        """
+        The rows of the page at ``cursor`` plus one, unevaluated (so async
+        views can run it); pass what they return to finish_page()
+        """
+        self.base_url = remove_query_param(base_url, self.cursor_query_param)
+        self.ordering = self.orderings[sort if sort in self.orderings else self.default_ordering]
+        self.fields = {name.lstrip('-'): queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering}
+        cursor = self.decode_cursor(cursor)
+        self.cursor, self.backwards = cursor is not None, bool(cursor and cursor[1])
+
+        # Going back reads the preceding rows in reverse order
+        ordering = [
+            (name[1:] if name.startswith('-') else f'-{name}') if self.backwards else name
+            for name in self.ordering
+        ]
+        if cursor:
+            if len(cursor[0]) != len(ordering):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                values = [self.fields[name.lstrip('-')].to_python(value) for name, value in zip(ordering, cursor[0])]
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self._after(ordering, values))
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def _after(self, ordering, values):
+        # (a, b) after (x, y): a after x, or a = x and b after y
+        condition, equal = Q(), Q()
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def finish_page(self, rows):
+        rows = list(rows)
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.backwards:
+            rows.reverse()
+        self.has_next = bool(rows) and (more if not self.backwards else True)
+        self.has_previous = bool(rows) and (more if self.backwards else self.cursor)
+        self.rows = rows
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(self.page_queryset(
+            queryset, request.build_absolute_uri(),
+            sort=request.query_params.get(self.ordering_query_param),
+            cursor=request.query_params.get(self.cursor_query_param),
+        ))
+
+    def get_next_link(self):
+        return self.encode_cursor(self.rows[-1], False) if self.has_next else None
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.rows[0], True) if self.has_previous else None
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
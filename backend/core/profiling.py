@@ -0,0 +1,228 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'HEADER': 'X-Profile',        # request header that asks for a profile
+    'QUERY_PARAM': '_profile',    # or this query parameter
+    'PATH_PREFIX': '/api/',
+    'DIR': None,                  # defaults to BASE_DIR / 'profiles'
+    'MAX_PROFILES': 100,          # oldest profiles are deleted beyond this
+    'TOP_FUNCTIONS': 30,          # rows in the stored summary
+}
+
+PROFILE_ID = re.compile(r'^[0-9]{14}-[a-z0-9]{8}$')
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls', 'filename')
+
+
+def get_profiling_settings():
+    """
+    PROFILING settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'PROFILING', {}))
+    config['DIR'] = str(config['DIR'] or os.path.join(settings.BASE_DIR, 'profiles'))
+    return config
+
+
+def summarize(stats, sort='cumulative', limit=30):
+    """
+    The top ``limit`` functions of a pstats.Stats, as printed by pstats
+    """
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+class ProfileStore:
+    """
+    Profiles on disk: ``<id>.prof`` (pstats, for snakeviz and friends)
+    plus ``<id>.json`` with the request and a text summary
+    """
+    def __init__(self, directory=None, max_profiles=None):
+        config = get_profiling_settings()
+        self.directory = directory or config['DIR']
+        self.max_profiles = max_profiles or config['MAX_PROFILES']
+
+    def path(self, profile_id, extension='prof'):
+        if not PROFILE_ID.match(profile_id):
+            raise ValueError(f'Invalid profile id {profile_id!r}')
+        return os.path.join(self.directory, f'{profile_id}.{extension}')
+
+    def save(self, profiler, meta, top=30):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{timezone.now():%Y%m%d%H%M%S}-{get_random_string(8, 'abcdefghijklmnopqrstuvwxyz0123456789')}"
+        profiler.dump_stats(self.path(profile_id))
+        stats = pstats.Stats(self.path(profile_id))
+        meta = dict(meta, id=profile_id, function_calls=stats.total_calls,
+                    summary=summarize(stats, limit=top))
+        with open(self.path(profile_id, 'json'), 'w') as f:
+            json.dump(meta, f)
+        self.prune()
+        return profile_id
+
+    def get(self, profile_id):
+        try:
+            with open(self.path(profile_id, 'json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def stats(self, profile_id):
+        return pstats.Stats(self.path(profile_id))
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # Ids start with a timestamp, so they sort oldest first
+        return sorted(name[:-5] for name in names if name.endswith('.json') and PROFILE_ID.match(name[:-5]))
+
+    def list(self):
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            meta = self.get(profile_id)
+            if meta is not None:
+                meta.pop('summary', None)
+                profiles.append(meta)
+        return profiles
+
+    def delete(self, profile_id):
+        for extension in ('prof', 'json'):
+            try:
+                os.remove(self.path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+    def prune(self):
+        ids = self._ids()
+        for profile_id in ids[:max(len(ids) - self.max_profiles, 0)]:
+            self.delete(profile_id)
+
+    def clear(self):
+        for profile_id in self._ids():
+            self.delete(profile_id)
+
+
+def _profiling_user(request):
+    """
+    The staff user sending ``request``, from its JWT, if any. The
+    middleware runs before the session and auth middleware (so profiles
+    cover them), hence no request.user to fall back on.
+    """
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    from accounts.authentication import CachedJWTAuthentication
+
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        authenticated = None
+    user = authenticated[0] if authenticated else None
+    if user is not None and user.is_staff:
+        return user
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests on demand: an admin sends the X-Profile header
+    (or ``?_profile=1``) with their JWT to any /api/ route and the
+    request runs under cProfile. The response carries an X-Profile-Id
+    header; profiles are listed and downloaded at /api/core/profiles/.
+
+    Requests without the flag only pay for a header and query string check.
+    Under ASGI the profiler follows the event loop thread, so ORM calls
+    made through sync_to_async show up as time spent awaiting them.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        config = get_profiling_settings()
+        self.meta_key = 'HTTP_' + config['HEADER'].upper().replace('-', '_')
+        self.param = config['QUERY_PARAM']
+
+    def _requested(self, request):
+        if self.meta_key in request.META:
+            return True
+        return self.param in request.META.get('QUERY_STRING', '') and self.param in request.GET
+
+    def _profile_user(self, request):
+        config = get_profiling_settings()
+        if not config['ENABLED'] or not request.path.startswith(config['PATH_PREFIX']):
+            return None
+        return _profiling_user(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._requested(request):
+            return self.get_response(request)
+        user = self._profile_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return self._store(request, response, user, profiler, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self._requested(request):
+            return await self.get_response(request)
+        user = await sync_to_async(self._profile_user)(request)
+        if user is None:
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        return self._store(request, response, user, profiler, time.perf_counter() - start)
+
+    def _store(self, request, response, user, profiler, duration):
+        config = get_profiling_settings()
+        meta = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'user': user.get_username(),
+            'created_at': timezone.now().isoformat(),
+        }
+        try:
+            profile_id = ProfileStore(config['DIR'], config['MAX_PROFILES']).save(
+                profiler, meta, config['TOP_FUNCTIONS'],
+            )
+        except OSError:
+            logger.exception('Could not store the profile of %s %s', request.method, request.path)
+            return response
+        logger.info(f"Profiled {request.method} {request.path} in {meta['duration_ms']}ms: {profile_id}")
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,190 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'KEY_PREFIX': 'rl',
+    'TRUSTED_PROXIES': 0,       # proxies appending to X-Forwarded-For
+    'ANONYMOUS': '100/m',       # per client IP
+    'AUTHENTICATED': '300/m',   # per user id
+    'ROUTES': {},               # {url name: rate}, applied on top of the above
+    'EXEMPT': [],               # url names never limited
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+_config = None
+
+
+def parse_rate(rate):
+    """
+    Parse '100/m' style rates into (limit, period in seconds)
+    """
+    if not rate:
+        return None
+    count, _, period = rate.partition('/')
+    multiplier = 1
+    if period[:-1].isdigit():
+        multiplier, period = int(period[:-1]), period[-1]
+    return int(count), PERIODS[period[0].lower()] * multiplier
+
+
+def get_ratelimit_settings():
+    """
+    Parsed RATE_LIMIT settings, computed once and reset on setting changes
+    """
+    global _config
+    if _config is None:
+        config = DEFAULTS.copy()
+        config.update(getattr(settings, 'RATE_LIMIT', {}))
+        config['ANONYMOUS'] = parse_rate(config['ANONYMOUS'])
+        config['AUTHENTICATED'] = parse_rate(config['AUTHENTICATED'])
+        config['ROUTES'] = {name: parse_rate(rate) for name, rate in config['ROUTES'].items()}
+        config['EXEMPT'] = frozenset(config['EXEMPT'])
+        _config = config
+    return _config
+
+
+@receiver(setting_changed)
+def _reset_config(setting, **kwargs):
+    global _config
+    if setting in ('RATE_LIMIT', 'CACHES'):
+        _config = None
+
+
+class RateLimitResult:
+    __slots__ = ('allowed', 'limit', 'remaining', 'reset', 'retry_after')
+
+    def __init__(self, allowed, limit, remaining, reset, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding window counter kept in the shared cache.
+
+    Each key costs two counters (current and previous fixed window) that
+    expire on their own, so memory stays bounded and every check is O(1)
+    regardless of traffic. The request count is estimated as
+    ``previous * overlap + current``. Use a cache shared by all workers
+    (Redis, Memcached) for the limit to hold across processes.
+    """
+    def __init__(self, cache_alias='default', prefix='rl'):
+        self.cache = caches[cache_alias]
+        self.prefix = prefix
+
+    def hit(self, key, limit, period, now=None):
+        now = time.time() if now is None else now
+        window = int(now // period)
+        elapsed = now - window * period
+        current_key = f'{self.prefix}:{key}:{period}:{window}'
+        previous_key = f'{self.prefix}:{key}:{period}:{window - 1}'
+
+        # add() is a no-op when the key exists; incr() is atomic on shared backends
+        self.cache.add(current_key, 0, timeout=period * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, timeout=period * 2)
+            current = 1
+        previous = self.cache.get(previous_key, 0)
+
+        overlap = (period - elapsed) / period
+        estimated = previous * overlap + current
+        reset = max(int(math.ceil(period - elapsed)), 1)
+
+        if estimated <= limit:
+            return RateLimitResult(True, limit, int(limit - estimated), reset, 0)
+
+        # Rejected requests do not count against the client
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        current -= 1
+        if current >= limit or not previous:
+            retry_after = reset
+        else:
+            # Time until the previous window's weight decays enough
+            retry_after = (period - elapsed) - (limit - current) * period / previous
+            retry_after = min(max(int(math.ceil(retry_after)), 1), reset)
+        return RateLimitResult(False, limit, 0, reset, retry_after)
+
+
+def get_client_ip(request):
+    """
+    The client address: REMOTE_ADDR, or with TRUSTED_PROXIES the entry of
+    X-Forwarded-For added by the outermost trusted proxy. Entries to its
+    left come from the client and can be forged.
+    """
+    proxies = get_ratelimit_settings()['TRUSTED_PROXIES']
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def get_request_user_id(request):
+    """
+    Identify the caller without a database query: the session user if
+    already loaded, else the user_id claim of a valid bearer token.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and getattr(user, 'is_authenticated', False):
+        return user.pk
+
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return None
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    from rest_framework_simplejwt.settings import api_settings
+    from accounts.authentication import validated_token
+    try:
+        # Verified once per process, then served from the token cache
+        return validated_token(header[7:].strip())[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, KeyError):
+        return None
+
+
+def check_request(request, route_name):
+    """
+    Apply the global and route policies to a request; returns the most
+    restrictive result, or None when rate limiting does not apply.
+    """
+    config = get_ratelimit_settings()
+    if not config['ENABLED'] or route_name in config['EXEMPT']:
+        return None
+
+    user_id = get_request_user_id(request)
+    if user_id is not None:
+        ident, rate = f'u{user_id}', config['AUTHENTICATED']
+    else:
+        ident, rate = f'ip{get_client_ip(request)}', config['ANONYMOUS']
+
+    limiter = SlidingWindowLimiter(config['CACHE'], config['KEY_PREFIX'])
+    checks = []
+    if rate:
+        checks.append((f'all:{ident}', rate))
+    route_rate = config['ROUTES'].get(route_name)
+    if route_rate:
+        checks.append((f'{route_name}:{ident}', route_rate))
+
+    tightest = None
+    for key, (limit, period) in checks:
+        result = limiter.hit(key, limit, period)
+        if not result.allowed:
+            return result
+        if tightest is None or result.remaining < tightest.remaining:
+            tightest = result
+    return tightest
@@ -0,0 +1,20 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from .instrumentation import get_current_metrics
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that reports its rendering time to the request metrics
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = get_current_metrics()
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.record_render(time.perf_counter() - start)
@@ -0,0 +1,258 @@
+"""
+Read replica routing (DATABASE_ROUTERS).
+
+Requests with a safe method read from one replica, picked per request
+among the healthy ones; everything else, and every write, uses the
+primary. A client that wrote is pinned to the primary for PIN_SECONDS so
+it reads its own writes while the replicas catch up. Outside requests
+(management commands, jobs, the shell) the router stays out of the way
+and queries go to the primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+
+from .ratelimit import get_request_user_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'REPLICAS': [],               # database aliases serving reads
+    'PIN_SECONDS': 5,             # reads stay on the primary this long after a write
+    'HEALTH_CHECK_INTERVAL': 30,  # seconds between checks of a replica
+    'CACHE': 'default',           # pins are kept here; share it between workers
+    'KEY_PREFIX': 'db_pin',
+    'READ_ONLY_PATHS': ['/api/batch/'],  # POST endpoints that only read
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_config = None
+
+
+def get_replica_settings():
+    """
+    REPLICA_ROUTING settings merged over the defaults, computed once and
+    reset on setting changes (the router reads them for every query)
+    """
+    global _config
+    if _config is None:
+        config = DEFAULTS.copy()
+        config.update(getattr(settings, 'REPLICA_ROUTING', {}))
+        config['REPLICAS'] = tuple(config['REPLICAS'])
+        config['READ_ONLY_PATHS'] = tuple(config['READ_ONLY_PATHS'])
+        _config = config
+    return _config
+
+
+@receiver(setting_changed)
+def _reset_config(setting, **kwargs):
+    global _config
+    if setting in ('REPLICA_ROUTING', 'DATABASES'):
+        _config = None
+        health.reset()
+
+
+class RoutingState:
+    """
+    Where the current request reads from. ``replica`` is None when it
+    reads from the primary; ``wrote`` is set by the first write.
+    """
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+class ReplicaHealth:
+    """
+    Per-process replica health, checked with a trivial query at most once
+    per HEALTH_CHECK_INTERVAL. A replica that fails is skipped until its
+    next check.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}  # alias -> (healthy, monotonic time of the check)
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            healthy = True
+        except DatabaseError as exc:
+            logger.warning(f'Replica {alias} is unavailable: {exc}')
+            connections[alias].close()
+            healthy = False
+        with self.lock:
+            self.checked[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def is_healthy(self, alias):
+        healthy, checked_at = self.checked.get(alias, (None, 0.0))
+        if healthy is None or time.monotonic() - checked_at >= get_replica_settings()['HEALTH_CHECK_INTERVAL']:
+            return self.check(alias)
+        return healthy
+
+    def reset(self):
+        with self.lock:
+            self.checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    """
+    A healthy replica for the current request, or None for the primary
+    """
+    healthy = [alias for alias in get_replica_settings()['REPLICAS'] if health.is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, e.g. right before a write
+    that depends on what was read
+    """
+    outer = _state.get()
+    token = _state.set(RoutingState() if outer is not None else None)
+    try:
+        yield
+    finally:
+        inner = _state.get()
+        _state.reset(token)
+        if outer is not None and inner.wrote:
+            outer.wrote = True
+
+
+class ReplicaRouter:
+    """
+    Send reads to the request's replica and writes to the primary
+    """
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        if state.replica is None or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        # Later reads in this request, and the client's next requests,
+        # must see this write
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *get_replica_settings()['REPLICAS']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replica_settings()['REPLICAS']:
+            return False
+        return None
+
+
+def _pin_keys(request):
+    """
+    Cache keys identifying the client: its user (session or bearer token)
+    and its session cookie
+    """
+    config = get_replica_settings()
+    keys = []
+    user_id = get_request_user_id(request)
+    if user_id is not None:
+        keys.append(f"{config['KEY_PREFIX']}:u:{user_id}")
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        session_key = session.session_key
+    if session_key:
+        keys.append(f"{config['KEY_PREFIX']}:s:{session_key}")
+    return keys
+
+
+def is_pinned(request):
+    keys = _pin_keys(request)
+    return bool(keys) and bool(caches[get_replica_settings()['CACHE']].get_many(keys))
+
+
+def pin(request):
+    config = get_replica_settings()
+    keys = _pin_keys(request)
+    if keys:
+        caches[config['CACHE']].set_many(dict.fromkeys(keys, True), config['PIN_SECONDS'])
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Choose where each request reads from (see ReplicaRouter), and pin
+    clients that wrote to the primary. Does nothing without replicas.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _route(self, request):
+        config = get_replica_settings()
+        if not config['REPLICAS']:
+            return None
+        read_only = request.method in SAFE_METHODS or request.path.startswith(config['READ_ONLY_PATHS'])
+        if not read_only or is_pinned(request):
+            return RoutingState()
+        return RoutingState(choose_replica())
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._route(request)
+        if state is None:
+            return self.get_response(request)
+
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            pin(request)
+        return response
+
+    async def __acall__(self, request):
+        if not get_replica_settings()['REPLICAS']:
+            return await self.get_response(request)
+        # Health checks and pin lookups may block
+        state = await sync_to_async(self._route)(request)
+
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            await sync_to_async(pin)(request)
+        return response
@@ -0,0 +1,187 @@
+import json
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,        # rows deleted per transaction
+    'BATCH_PAUSE': 0.05,      # seconds to sleep between batches
+    'ARCHIVE_DIR': 'archive',
+    'POLICIES': [],
+}
+
+
+def get_retention_settings():
+    """
+    Retention settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'DATA_RETENTION', {}))
+    return config
+
+
+def archive_to_file(policy, queryset):
+    """
+    Default archiver: append the rows (and any ``related`` rows) to a
+    JSON lines file under DATA_RETENTION['ARCHIVE_DIR'].
+    """
+    archive_dir = Path(get_retention_settings()['ARCHIVE_DIR'])
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{policy.name}-{timezone.now():%Y%m%d}.jsonl"
+
+    objects = list(queryset)
+    pks = [obj.pk for obj in objects]
+    for accessor in policy.related:
+        relation = policy.model._meta.get_field(accessor)
+        objects.extend(
+            relation.related_model._base_manager.using(queryset.db).filter(**{f'{relation.field.name}__in': pks})
+        )
+
+    with open(path, 'a', encoding='utf-8') as handle:
+        for record in serializers.serialize('python', objects):
+            handle.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+    return len(objects)
+
+
+class RetentionPolicy:
+    """
+    Rows of ``model`` whose ``field`` is older than the age are expired.
+
+    ``filters`` narrows the candidates further (e.g. only terminal order
+    statuses). ``action`` is ``delete`` or ``archive``; archiving calls
+    ``archiver`` on every batch before it is deleted. An archiver may move
+    the rows itself, in which case the follow-up delete is a no-op.
+    ``databases`` lists the aliases holding the rows, or is the dotted
+    path of a callable returning them (e.g. every shard); by default the
+    model's write database.
+    """
+    def __init__(self, name, model, field, days=0, hours=0, filters=None,
+                 action='delete', archiver=None, related=None, batch_size=None, databases=None):
+        if action not in ('delete', 'archive'):
+            raise ValueError(f'Unknown retention action: {action}')
+        self.name = name
+        self.model_label = model
+        self.field = field
+        self.age = timedelta(days=days, hours=hours)
+        self.filters = filters or {}
+        self.action = action
+        self.archiver = archiver or 'core.retention.archive_to_file'
+        self.related = related or []
+        self.batch_size = batch_size
+        self.databases = databases
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(**config)
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def get_databases(self):
+        if self.databases is None:
+            return [router.db_for_write(self.model)]
+        if isinstance(self.databases, str):
+            return list(import_string(self.databases)())
+        return list(self.databases)
+
+    def cutoff(self, now=None):
+        return (now or timezone.now()) - self.age
+
+    def get_queryset(self, now=None, using=None):
+        return self.model._base_manager.db_manager(using).filter(
+            **{f'{self.field}__lt': self.cutoff(now)},
+            **self.filters,
+        )
+
+
+class RetentionEngine:
+    """
+    Apply retention policies in small primary-key ordered batches.
+
+    Each batch is its own short transaction followed by a pause, so the
+    job never holds locks long enough to stall request traffic. Policies
+    spanning several databases (shards) process them in turn.
+    """
+    def __init__(self, policies=None, batch_size=None, pause=None, dry_run=False):
+        config = get_retention_settings()
+        if policies is None:
+            policies = [RetentionPolicy.from_dict(p) for p in config['POLICIES']]
+        self.policies = policies
+        self.batch_size = batch_size or config['BATCH_SIZE']
+        self.pause = config['BATCH_PAUSE'] if pause is None else pause
+        self.dry_run = dry_run
+
+    def run(self, names=None):
+        results = []
+        for policy in self.policies:
+            if names and policy.name not in names:
+                continue
+            results.append(self.apply(policy))
+        return results
+
+    def apply(self, policy):
+        stats = {
+            'policy': policy.name,
+            'model': policy.model_label,
+            'action': policy.action,
+            'dry_run': self.dry_run,
+            'rows': 0,
+            'archived': 0,
+            'deleted': 0,
+            'batches': 0,
+        }
+        try:
+            model = policy.model
+        except LookupError:
+            logger.info(f'Retention policy {policy.name} skipped: {policy.model_label} is not installed')
+            stats['skipped'] = True
+            return stats
+
+        archiver = import_string(policy.archiver) if policy.action == 'archive' else None
+        batch_size = policy.batch_size or self.batch_size
+        started = time.perf_counter()
+
+        for using in policy.get_databases():
+            queryset = policy.get_queryset(using=using)
+            last_pk = None
+            while True:
+                candidates = queryset.order_by('pk')
+                if last_pk is not None:
+                    candidates = candidates.filter(pk__gt=last_pk)
+                pks = list(candidates.values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                last_pk = pks[-1]
+                stats['rows'] += len(pks)
+                stats['batches'] += 1
+
+                if self.dry_run:
+                    continue
+
+                with transaction.atomic(using=queryset.db):
+                    batch = model._base_manager.using(queryset.db).filter(pk__in=pks)
+                    if archiver:
+                        stats['archived'] += archiver(policy, batch) or 0
+                    deleted, _ = batch.delete()
+                stats['deleted'] += deleted
+
+                if self.pause:
+                    time.sleep(self.pause)
+
+        elapsed = time.perf_counter() - started
+        stats['seconds'] = round(elapsed, 3)
+        stats['rows_per_second'] = round(stats['rows'] / elapsed, 1) if elapsed else 0.0
+        logger.info(f'Retention {policy.name}: {stats}')
+        return stats
@@ -0,0 +1,287 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from orders.models import Order, OrderItem
+from products.models import Category, Product, ProductImage
+from reviews.models import Review, ReviewHelpful
+from reviews.ratings import rebuild_product_ratings
+
+User = get_user_model()
+
+# Named dataset sizes; explicit command options override single values
+PRESETS = {
+    'small': {
+        'categories': 4, 'subcategories': 0, 'category_depth': 0, 'products': 20,
+        'images_per_product': 1, 'users': 10, 'orders': 20, 'max_items_per_order': 3,
+        'reviews': 50, 'helpful_votes': 50,
+    },
+    'medium': {
+        'categories': 10, 'subcategories': 4, 'category_depth': 1, 'products': 10_000,
+        'images_per_product': 3, 'users': 2_000, 'orders': 20_000, 'max_items_per_order': 5,
+        'reviews': 50_000, 'helpful_votes': 100_000,
+    },
+    'large': {
+        'categories': 20, 'subcategories': 5, 'category_depth': 2, 'products': 1_000_000,
+        'images_per_product': 3, 'users': 200_000, 'orders': 1_000_000, 'max_items_per_order': 5,
+        'reviews': 5_000_000, 'helpful_votes': 5_000_000,
+    },
+}
+
+ADJECTIVES = ['Classic', 'Smart', 'Compact', 'Premium', 'Eco', 'Portable', 'Wireless', 'Deluxe', 'Essential', 'Ultra']
+NOUNS = ['Speaker', 'Jacket', 'Notebook', 'Lamp', 'Backpack', 'Blender', 'Watch', 'Chair', 'Headphones', 'Kettle']
+REVIEW_TITLES = ['Great value', 'Not as expected', 'Does the job', 'Excellent quality', 'Would buy again', 'Average']
+ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'delivered', 'delivered', 'cancelled']
+
+
+@contextmanager
+def preserve_timestamps(*models):
+    """
+    Let bulk_create keep the created_at/updated_at values we generate
+    instead of overwriting them with now()
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class SampleDataGenerator:
+    """
+    Deterministic, batched generator for development and load-test data.
+
+    Primary keys are assigned up front (continuing after the current
+    maximum), so related rows are built without reading anything back and
+    every table is filled with plain batched bulk_create calls. The same
+    seed and sizes always produce the same data.
+    """
+    def __init__(self, seed=42, batch_size=5000, days=365, log=None):
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.batch_size = batch_size
+        self.days = days
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.stats = {}
+
+    def _next_id(self, model):
+        return (model._base_manager.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+
+    def _timestamp(self):
+        return self.now - timedelta(seconds=self.random.randint(0, self.days * 24 * 60 * 60))
+
+    @contextmanager
+    def writer(self):
+        """
+        Collect rows of several models and bulk_create them in batches.
+
+        Each flush writes every pending model in insertion order (parents
+        before children) inside one transaction, so memory stays bounded
+        by the batch size whatever the dataset size.
+        """
+        pending = {}
+        started = time.monotonic()
+
+        def flush():
+            with transaction.atomic():
+                for model, rows in pending.items():
+                    if rows:
+                        model.objects.bulk_create(rows, batch_size=self.batch_size)
+                        self.stats[model._meta.label] = self.stats.get(model._meta.label, 0) + len(rows)
+                        rows.clear()
+
+        def add(row):
+            rows = pending.setdefault(type(row), [])
+            rows.append(row)
+            if len(rows) >= self.batch_size:
+                flush()
+
+        yield add
+        flush()
+        elapsed = time.monotonic() - started
+        for model in pending:
+            count = self.stats[model._meta.label]
+            self.log(f'{model._meta.label}: {count} rows ({count / elapsed if elapsed else 0:.0f} rows/s)')
+
+    def create_categories(self, top_level, children, depth):
+        """
+        ``top_level`` root categories, each with ``children`` subcategories
+        per level down to ``depth``; returns the ids of the leaves
+        """
+        next_id = self._next_id(Category)
+        level = [None]
+        with self.writer() as add:
+            for depth_level in range(depth + 1 if children else 1):
+                next_level = []
+                for parent_id in level:
+                    for n in range(top_level if parent_id is None else children):
+                        add(Category(id=next_id, name=f'Category {next_id}', slug=f'category-{next_id}',
+                                     parent_id=parent_id, description=f'{self.random.choice(NOUNS)}s and more'))
+                        next_level.append(next_id)
+                        next_id += 1
+                level = next_level
+        return level
+
+    def create_users(self, count):
+        """
+        ``count`` customers sharing one pre-hashed password ("password"),
+        each with a profile; returns the first and last user id
+        """
+        first_id = self._next_id(User)
+        password = make_password('password')
+        with preserve_timestamps(UserProfile), self.writer() as add:
+            for pk in range(first_id, first_id + count):
+                joined = self._timestamp()
+                add(User(id=pk, username=f'user{pk}', email=f'user{pk}@example.com', first_name='Sample',
+                         last_name=f'User {pk}', password=password, date_joined=joined))
+                add(UserProfile(user_id=pk, created_at=joined, updated_at=joined))
+        return first_id, first_id + count - 1
+
+    def create_products(self, count, category_ids, images_per_product):
+        first_id = self._next_id(Product)
+        rng = self.random
+        with preserve_timestamps(Product, ProductImage), self.writer() as add:
+            for n in range(count):
+                pk = first_id + n
+                price = Decimal(rng.randint(100, 100_000)) / 100
+                created = self._timestamp()
+                add(Product(
+                    id=pk,
+                    name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {pk}',
+                    slug=f'product-{pk}',
+                    description='Generated sample product.',
+                    short_description=f'Sample product {pk}',
+                    category_id=category_ids[n % len(category_ids)],
+                    price=price,
+                    compare_price=price * Decimal('1.25') if rng.random() < 0.3 else None,
+                    stock_quantity=rng.randint(0, 500),
+                    sku=f'SKU-{pk:09d}',
+                    is_featured=rng.random() < 0.05,
+                    created_at=created,
+                    updated_at=created,
+                ))
+                for position in range(images_per_product):
+                    add(ProductImage(product_id=pk, image=f'products/product-{pk}/{position}.jpg',
+                                     alt_text=f'Product {pk}', is_primary=position == 0, order=position,
+                                     created_at=created, updated_at=created))
+        return first_id, first_id + count - 1
+
+    def create_reviews(self, count, products, users, helpful_votes):
+        """
+        Spread ``count`` reviews over the products, each by a distinct
+        user, and ``helpful_votes`` votes over the reviews, keeping
+        Review.helpful_count equal to the votes written
+        """
+        first_product, last_product = products
+        first_user, last_user = users
+        product_count = last_product - first_product + 1
+        user_count = last_user - first_user + 1
+        per_product = min(count // product_count, user_count)
+        extra = count - per_product * product_count if per_product < user_count else 0
+        average_votes = helpful_votes / count if count else 0
+        rng = self.random
+        pk = self._next_id(Review)
+
+        with preserve_timestamps(Review, ReviewHelpful), self.writer() as add:
+            for n in range(product_count):
+                offset = rng.randrange(user_count)
+                for k in range(per_product + (1 if n < extra else 0)):
+                    reviewer = offset + k
+                    votes = min(int(rng.random() * average_votes * 2 + 0.5), user_count - 1)
+                    created = self._timestamp()
+                    add(Review(
+                        id=pk,
+                        user_id=first_user + reviewer % user_count,
+                        product_id=first_product + n,
+                        rating=rng.choices((1, 2, 3, 4, 5), weights=(5, 7, 15, 33, 40))[0],
+                        title=rng.choice(REVIEW_TITLES),
+                        content='Generated sample review.',
+                        helpful_count=votes,
+                        created_at=created,
+                        updated_at=created,
+                    ))
+                    # Voters are the users after the reviewer, so never the author
+                    for v in range(1, votes + 1):
+                        add(ReviewHelpful(review_id=pk, user_id=first_user + (reviewer + v) % user_count,
+                                          created_at=created))
+                    pk += 1
+
+    def create_orders(self, count, products, users, max_items):
+        first_product, last_product = products
+        first_user, last_user = users
+        first_id = self._next_id(Order)
+        rng = self.random
+        with preserve_timestamps(Order, OrderItem), self.writer() as add:
+            for pk in range(first_id, first_id + count):
+                user_id = rng.randint(first_user, last_user)
+                picked = rng.sample(range(first_product, last_product + 1),
+                                    min(rng.randint(1, max_items), last_product - first_product + 1))
+                lines = [(product_id, rng.randint(1, 3), Decimal(rng.randint(100, 100_000)) / 100)
+                         for product_id in picked]
+                status = rng.choice(ORDER_STATUSES)
+                created = self._timestamp()
+                add(Order(
+                    id=pk,
+                    user_id=user_id,
+                    order_number=f'SMP-{pk:012d}',
+                    total_amount=sum(price * quantity for _, quantity, price in lines),
+                    status=status,
+                    payment_status='completed' if status in ('shipped', 'delivered') else 'pending',
+                    payment_method='card',
+                    shipping_first_name='Sample',
+                    shipping_last_name=f'User {user_id}',
+                    shipping_email=f'user{user_id}@example.com',
+                    shipping_phone='01700000000',
+                    shipping_address='1 Sample Road',
+                    shipping_city='Dhaka',
+                    shipping_state='Dhaka',
+                    shipping_postal_code='1000',
+                    created_at=created,
+                    updated_at=created,
+                ))
+                for product_id, quantity, price in lines:
+                    add(OrderItem(order_id=pk, product_id=product_id, product_name=f'Product {product_id}',
+                                  product_sku=f'SKU-{product_id:09d}', quantity=quantity, price=price,
+                                  created_at=created, updated_at=created))
+
+    def reset_sequences(self):
+        """
+        Move sequences past the explicitly assigned ids (PostgreSQL etc.)
+        """
+        models = [Category, User, UserProfile, Product, ProductImage, Review, ReviewHelpful, Order, OrderItem]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def generate(self, categories, subcategories, category_depth, products, images_per_product,
+                 users, orders, max_items_per_order, reviews, helpful_votes):
+        leaves = self.create_categories(max(categories, 1), subcategories, category_depth)
+        user_range = self.create_users(users)
+        product_range = self.create_products(products, leaves, images_per_product)
+        if reviews and users and products:
+            self.create_reviews(reviews, product_range, user_range, helpful_votes)
+            rebuild_product_ratings(incremental=False, chunk_size=self.batch_size)
+        if orders and users and products:
+            self.create_orders(orders, product_range, user_range, max_items_per_order)
+        self.reset_sequences()
+        return self.stats
@@ -0,0 +1,372 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .metrics import FileStore
+
+DEFAULTS = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 100,
+    'TOP_N': 50,                 # fingerprints kept, ranked by total time
+    'EXPLAIN': False,            # capture a plan the first time a fingerprint is slow
+    'SENSITIVE_PARAMS': r'password|passwd|secret|token|otp|card|cvv|iban|email|phone',
+    'REDACT_ALL_PARAMS': False,
+    'MAX_PARAM_LENGTH': 200,
+    'CALL_SITES': 5,             # distinct call sites kept per fingerprint
+    'CACHE': 'default',          # shared cache holding explain requests
+    'DIR': None,                 # shared directory for multi-process aggregation
+    'FLUSH_INTERVAL': 10.0,
+}
+
+REDACTED = '[REDACTED]'
+EXPLAIN_REQUESTS_KEY = 'slowq:explain'
+
+_config = None
+_local = threading.local()
+
+
+def get_slow_query_settings():
+    """
+    SLOW_QUERIES settings merged over the defaults, computed once
+    """
+    global _config
+    if _config is None:
+        config = DEFAULTS.copy()
+        config.update(getattr(settings, 'SLOW_QUERIES', {}))
+        config['THRESHOLD'] = config['THRESHOLD_MS'] / 1000
+        config['SENSITIVE_PARAMS'] = re.compile(config['SENSITIVE_PARAMS'], re.IGNORECASE)
+        _config = config
+    return _config
+
+
+@receiver(setting_changed)
+def _reset_config(setting, **kwargs):
+    global _config
+    if setting == 'SLOW_QUERIES':
+        _config = None
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"`.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s|\?')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_INSERT_COLUMNS = re.compile(r'^\s*INSERT\s+INTO\s+\S+\s*\(([^)]*)\)', re.IGNORECASE)
+_COLUMN_BEFORE = re.compile(
+    r'([\w"`.]+)\s*(?:=|<>|!=|<=|>=|<|>|\bI?LIKE\b|\bIN\s*\((?:\s*%s\s*,)*)\s*$',
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql):
+    """
+    SQL with literals and placeholders replaced by ``?`` and value lists
+    collapsed, so queries differing only in their values compare equal
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _VALUE_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+def _placeholder_columns(sql, count):
+    """
+    Best-effort column name bound to each positional placeholder
+    """
+    insert = _INSERT_COLUMNS.match(sql)
+    if insert:
+        names = [name.strip().strip('"`') for name in insert.group(1).split(',')]
+        return [names[i % len(names)] for i in range(count)]
+    columns = []
+    for match in re.finditer(r'%s', sql):
+        before = _COLUMN_BEFORE.search(sql, max(match.start() - 120, 0), match.start())
+        columns.append(before.group(1).replace('"', '').replace('`', '') if before else None)
+    return columns + [None] * (count - len(columns))
+
+
+def _clip(value, max_length):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, str) and len(value) > max_length:
+        return value[:max_length] + '...'
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return str(value)[:max_length]
+
+
+def redact_params(sql, params):
+    """
+    Parameters safe to store and display: values bound to sensitive
+    columns are replaced and long values truncated
+    """
+    config = get_slow_query_settings()
+    if not params:
+        return params
+    if config['REDACT_ALL_PARAMS']:
+        return [REDACTED] * len(params)
+    sensitive, max_length = config['SENSITIVE_PARAMS'], config['MAX_PARAM_LENGTH']
+    if isinstance(params, dict):
+        return {
+            key: REDACTED if sensitive.search(key) else _clip(value, max_length)
+            for key, value in params.items()
+        }
+    columns = _placeholder_columns(sql, len(params))
+    return [
+        REDACTED if column and sensitive.search(column) else _clip(value, max_length)
+        for column, value in zip(columns, params)
+    ]
+
+
+_HOOK_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instrumentation.py'),
+}
+
+
+def find_call_site():
+    """
+    First frame of project code (not Django, DRF or these hooks) on the stack
+    """
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(root)
+            and 'site-packages' not in filename
+            and filename not in _HOOK_FILES
+        ):
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def explain(alias, sql, params):
+    """
+    Query plan of a SELECT, using the backend's EXPLAIN syntax
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    connection = connections[alias]
+    prefix = connection.ops.explain_query_prefix()
+    suppressed, _local.suppressed = getattr(_local, 'suppressed', False), True
+    try:
+        # A savepoint keeps a failed EXPLAIN from breaking the caller's transaction
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+    finally:
+        _local.suppressed = suppressed
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def request_explain(fp):
+    """
+    Ask every worker to capture a plan the next time ``fp`` is slow
+    """
+    cache = caches[get_slow_query_settings()['CACHE']]
+    requested = cache.get(EXPLAIN_REQUESTS_KEY) or set()
+    requested.add(fp)
+    cache.set(EXPLAIN_REQUESTS_KEY, requested, timeout=60 * 60 * 24)
+
+
+def _take_explain_request(fp):
+    cache = caches[get_slow_query_settings()['CACHE']]
+    requested = cache.get(EXPLAIN_REQUESTS_KEY)
+    if not requested or fp not in requested:
+        return False
+    requested.discard(fp)
+    cache.set(EXPLAIN_REQUESTS_KEY, requested, timeout=60 * 60 * 24)
+    return True
+
+
+class SlowQueryLog:
+    """
+    In-memory top-N of slow queries by total time per fingerprint.
+
+    Only the redacted parameters are ever reported or written to disk; the
+    raw parameters of the latest sample stay in memory to run EXPLAIN.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._raw = {}
+        self._last_flush = 0.0
+
+    def record(self, alias, sql, params, duration, many=False):
+        config = get_slow_query_settings()
+        normalized = normalize_sql(sql)
+        fp = fingerprint(normalized)
+        call_site = find_call_site()
+        sample = {
+            'sql': sql,
+            'params': None if many else redact_params(sql, params),
+            'duration_ms': round(duration * 1000, 2),
+            'call_site': call_site,
+            'database': alias,
+            'at': timezone.now().isoformat(),
+        }
+
+        with self.lock:
+            entry = self.entries.get(fp)
+            if entry is None:
+                if len(self.entries) >= config['TOP_N']:
+                    # Evict the fingerprint with the least total time
+                    victim = min(self.entries.values(), key=lambda e: e['total_ms'])
+                    if victim['total_ms'] > sample['duration_ms']:
+                        return
+                    del self.entries[victim['fingerprint']]
+                    self._raw.pop(victim['fingerprint'], None)
+                entry = self.entries[fp] = {
+                    'fingerprint': fp,
+                    'normalized_sql': normalized,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'call_sites': {},
+                    'sample': sample,
+                    'plan': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] = round(entry['total_ms'] + sample['duration_ms'], 2)
+            if sample['duration_ms'] >= entry['max_ms']:
+                entry['max_ms'] = sample['duration_ms']
+                entry['sample'] = sample
+                if not many:
+                    self._raw[fp] = (alias, sql, params)
+            sites = entry['call_sites']
+            if call_site in sites or len(sites) < config['CALL_SITES']:
+                sites[call_site] = sites.get(call_site, 0) + 1
+            needs_plan = entry['plan'] is None and not many
+
+        if needs_plan and (config['EXPLAIN'] or _take_explain_request(fp)):
+            plan = explain(alias, sql, params)
+            with self.lock:
+                if fp in self.entries:
+                    self.entries[fp]['plan'] = plan
+        self.flush()
+
+    def explain(self, fp):
+        """
+        Plan for a fingerprint sampled by this process, or None
+        """
+        raw = self._raw.get(fp)
+        if raw is None:
+            return None
+        plan = explain(*raw)
+        with self.lock:
+            if fp in self.entries:
+                self.entries[fp]['plan'] = plan
+        return plan
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'entries': [dict(entry, call_sites=dict(entry['call_sites'])) for entry in self.entries.values()],
+            }
+
+    def get_store(self):
+        directory = get_slow_query_settings()['DIR']
+        return FileStore(str(directory), prefix='slowqueries') if directory else None
+
+    def flush(self, force=False):
+        store = self.get_store()
+        if store is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < get_slow_query_settings()['FLUSH_INTERVAL']:
+            return
+        self._last_flush = now
+        store.write(self.snapshot())
+
+    def top(self, limit=None):
+        """
+        Slow query fingerprints of all workers, by total time descending
+        """
+        store = self.get_store()
+        if store is None:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush(force=True)
+            snapshots = store.read()
+
+        merged = {}
+        for snapshot in snapshots:
+            for entry in snapshot['entries']:
+                current = merged.get(entry['fingerprint'])
+                if current is None:
+                    merged[entry['fingerprint']] = dict(entry, call_sites=dict(entry['call_sites']))
+                    continue
+                current['count'] += entry['count']
+                current['total_ms'] = round(current['total_ms'] + entry['total_ms'], 2)
+                if entry['max_ms'] > current['max_ms']:
+                    current['max_ms'] = entry['max_ms']
+                    current['sample'] = entry['sample']
+                current['plan'] = current['plan'] or entry['plan']
+                for site, count in entry['call_sites'].items():
+                    current['call_sites'][site] = current['call_sites'].get(site, 0) + count
+
+        entries = sorted(merged.values(), key=lambda e: e['total_ms'], reverse=True)
+        for entry in entries:
+            entry['mean_ms'] = round(entry['total_ms'] / entry['count'], 2)
+        return entries[:limit or get_slow_query_settings()['TOP_N']]
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+            self._raw.clear()
+        store = self.get_store()
+        if store is not None:
+            for filename in os.listdir(store.directory):
+                if filename.startswith('slowqueries-') and filename.endswith('.json'):
+                    os.remove(os.path.join(store.directory, filename))
+
+
+slow_query_log = SlowQueryLog()
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    """
+    execute_wrapper recording statements slower than THRESHOLD_MS
+    """
+    if getattr(_local, 'suppressed', False):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        config = get_slow_query_settings()
+        if config['ENABLED'] and duration >= config['THRESHOLD']:
+            # Queries issued while recording (explain requests, a database
+            # cache) must not be recorded themselves
+            _local.suppressed = True
+            try:
+                slow_query_log.record(context['connection'].alias, sql, params, duration, many)
+            finally:
+                _local.suppressed = False
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
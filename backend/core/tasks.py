@@ -1,60 +1,95 @@
-from celery import shared_task
-from django.core.mail import send_mail
-from django.conf import settings
+from core.jobs import task
+from core.mail import build_message, build_template_message, get_mail_settings, mail_dispatcher
 import logging
 
 logger = logging.getLogger(__name__)
 
-@shared_task
+def deliver_mail(messages):
+    """
+    Send the messages of a batch of mail jobs over one connection; a
+    delivery failure raises so the worker retries every job of the batch
+    """
+    sent = mail_dispatcher.deliver(messages)
+    logger.info(f'Sent {sent} email(s) to {sum(len(message.to) for message in messages)} recipient(s)')
+    return sent
+
+@task(batch=deliver_mail, batch_size=get_mail_settings()['BATCH_SIZE'])
 def send_email_task(subject, message, recipient_list):
     """
     Async email sending task
+
+    Builds the message; the worker sends the messages of all due mail
+    jobs together through deliver_mail().
+    """
+    return build_message(subject, message, recipient_list)
+
+@task(priority=10, batch=deliver_mail, batch_size=get_mail_settings()['BATCH_SIZE'])
+def send_templated_email_task(subject, template_name, context, recipient_list):
     """
+    Render a templated email outside the request cycle, sent with the
+    other due mail jobs
+    """
+    return build_template_message(subject, template_name, context, recipient_list)
+
+@task
+def process_product_image(image_id):
+    """
+    Compress an uploaded product image in the background
+    """
+    from django.core.files.base import ContentFile
+    from products.models import ProductImage
+    from .utils import compress_image
+    
     try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=recipient_list,
-            fail_silently=False,
-        )
-        logger.info(f'Email sent successfully to {recipient_list}')
-        return True
-    except Exception as e:
-        logger.error(f'Failed to send email: {str(e)}')
+        product_image = ProductImage.objects.get(pk=image_id)
+    except ProductImage.DoesNotExist:
+        logger.warning(f'Product image {image_id} no longer exists')
         return False
+    
+    compressed = compress_image(product_image.image)
+    if compressed is None:
+        return False
+    
+    name = product_image.image.name.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    product_image.image.save(f'{name}.jpg', ContentFile(compressed.read()), save=False)
+    product_image.save(update_fields=['image', 'updated_at'])
+    logger.info(f'Product image {image_id} compressed')
+    return True
 
-@shared_task
-def cleanup_old_data():
+@task
+def cleanup_old_data(dry_run=False):
     """
-    Clean up old data (run daily)
+    Apply the DATA_RETENTION policies (run daily)
     """
-    from django.utils import timezone
-    from datetime import timedelta
+    from .retention import RetentionEngine
     
-    # Clean up old sessions, logs, etc.
-    cutoff_date = timezone.now() - timedelta(days=30)
-    
-    # Add your cleanup logic here
+    results = RetentionEngine(dry_run=dry_run).run()
     logger.info('Data cleanup completed')
+    return results
 
-@shared_task
-def update_product_ratings():
+@task
+def update_product_ratings(incremental=True):
     """
-    Update product average ratings (run hourly)
+    Update stored product rating aggregates (run hourly)
     """
-    from products.models import Product
-    from reviews.models import Review
-    from django.db.models import Avg
+    from reviews.ratings import rebuild_product_ratings
     
-    products = Product.objects.all()
-    for product in products:
-        avg_rating = Review.objects.filter(product=product).aggregate(
-            avg_rating=Avg('rating')
-        )['avg_rating'] or 0
-        
-        # You might want to store this in a separate field
-        # product.average_rating = avg_rating
-        # product.save()
+    return rebuild_product_ratings(incremental=incremental)
+
+@task
+def flush_helpful_votes():
+    """
+    Apply the helpful vote counts buffered for hot reviews (run every minute)
+    """
+    from reviews.helpful import flush_helpful_votes
+    
+    return flush_helpful_votes()
+
+@task
+def reconcile_helpful_counts():
+    """
+    Recount helpful votes and fix drifted counters (run daily)
+    """
+    from reviews.helpful import reconcile_helpful_counts
     
-    logger.info('Product ratings updated')
+    return reconcile_helpful_counts()
@@ -0,0 +1,170 @@
+import logging
+import os
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from orders.models import Order, OrderItem
+from products.models import Category, Product, ProductImage
+from reviews.models import Review
+from reviews.ratings import rebuild_product_ratings
+
+User = get_user_model()
+
+# Latency budgets vary with the machine, so only query budgets are checked
+# by default; PERF_LATENCY_BUDGETS=1 checks latency too, multiplied by
+# PERF_LATENCY_SCALE on slow machines
+CHECK_LATENCY = os.environ.get('PERF_LATENCY_BUDGETS', '') in ('1', 'true', 'yes')
+LATENCY_SCALE = float(os.environ.get('PERF_LATENCY_SCALE', 1))
+
+
+def seed_dataset(categories=5, products_per_category=12, images_per_product=3,
+                 customers=20, reviews_per_product=5, orders_per_customer=4, items_per_order=3):
+    """
+    Deterministic catalog, customers, reviews and orders for performance
+    tests, inserted with bulk_create.
+
+    Returns a dict with the admin user, a customer with orders and the
+    created categories and products.
+    """
+    admin = User.objects.create_superuser(username='perf-admin', email='perf-admin@example.com', password='pass')
+    users = User.objects.bulk_create([
+        User(username=f'perf-customer-{n}', email=f'perf-customer-{n}@example.com',
+             first_name='Customer', last_name=str(n))
+        for n in range(customers)
+    ])
+
+    category_objs = Category.objects.bulk_create([
+        Category(name=f'Category {n}', slug=f'category-{n}', description=f'Category {n}')
+        for n in range(categories)
+    ])
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Product {c}-{n}',
+            slug=f'product-{c}-{n}',
+            description='A product used by the performance tests.',
+            short_description=f'Product {c}-{n}',
+            category=category,
+            price=Decimal(10 + n),
+            compare_price=Decimal(20 + n) if n % 3 == 0 else None,
+            stock_quantity=n % 7,
+            sku=f'PERF-{c}-{n}',
+            is_featured=n % 4 == 0,
+        )
+        for c, category in enumerate(category_objs)
+        for n in range(products_per_category)
+    ])
+    ProductImage.objects.bulk_create([
+        ProductImage(product=product, image=f'products/{product.slug}/{n}.jpg',
+                     alt_text=product.name, is_primary=n == 0, order=n)
+        for product in products
+        for n in range(images_per_product)
+    ])
+    Review.objects.bulk_create([
+        Review(user=users[(p + n) % len(users)], product=product, rating=(p + n) % 5 + 1,
+               title=f'Review {n}', content='Works as described.')
+        for p, product in enumerate(products)
+        for n in range(min(reviews_per_product, len(users)))
+    ])
+    rebuild_product_ratings(incremental=False)
+
+    orders = Order.objects.bulk_create([
+        Order(
+            user=user,
+            order_number=f'PERF-{u:04d}-{n:02d}',
+            total_amount=Decimal('0'),
+            status='delivered' if n % 2 else 'processing',
+            shipping_first_name=user.first_name,
+            shipping_last_name=user.last_name,
+            shipping_email=user.email,
+            shipping_phone='0123456789',
+            shipping_address='1 Test Street',
+            shipping_city='Dhaka',
+            shipping_state='Dhaka',
+            shipping_postal_code='1000',
+        )
+        for u, user in enumerate(users)
+        for n in range(orders_per_customer)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=product,
+            product_name=product.name,
+            product_sku=product.sku,
+            quantity=1 + n,
+            price=product.price,
+        )
+        for o, order in enumerate(orders)
+        for n, product in enumerate(products[o % len(products):][:items_per_order])
+    ])
+
+    return {
+        'admin': admin,
+        'customer': users[0],
+        'categories': category_objs,
+        'products': products,
+    }
+
+
+@override_settings(RATE_LIMIT={'ENABLED': False})
+class PerformanceTestCase(APITestCase):
+    """
+    Seeds the dataset once per class and checks endpoints against query
+    and latency budgets. Caches are cleared before every measured request
+    so budgets cover the uncached path.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # One request log line per measured call would drown the test output
+        request_logger = logging.getLogger('core.middleware')
+        cls._request_log_level = request_logger.level
+        request_logger.setLevel(logging.WARNING)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.getLogger('core.middleware').setLevel(cls._request_log_level)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+        cls.admin = cls.data['admin']
+        cls.customer = cls.data['customer']
+        cls.product = cls.data['products'][0]
+        cls.category = cls.data['categories'][0]
+
+    def assertBudget(self, url, queries, ms=None, user=None, method='get', status=200, data=None):
+        """
+        Request ``url`` and fail if it issues more than ``queries`` queries
+        or, with PERF_LATENCY_BUDGETS set, takes longer than ``ms``
+        milliseconds (scaled by PERF_LATENCY_SCALE)
+        """
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connections['default']) as context:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, data, format='json')
+            elapsed = (time.perf_counter() - start) * 1000
+        self.client.force_authenticate(None)
+
+        self.assertEqual(response.status_code, status, f'{method.upper()} {url}: {response.content[:500]!r}')
+        executed = len(context.captured_queries)
+        if executed > queries:
+            sql = '\n'.join(f'  {query["sql"]}' for query in context.captured_queries)
+            self.fail(f'{method.upper()} {url} ran {executed} queries, budget is {queries}:\n{sql}')
+        if CHECK_LATENCY and ms is not None:
+            budget = ms * LATENCY_SCALE
+            self.assertLessEqual(
+                elapsed, budget,
+                f'{method.upper()} {url} took {elapsed:.1f}ms, budget is {budget:.0f}ms',
+            )
+        return response
@@ -1,3 +1,882 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.conf import settings
+from django.core.cache import caches
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import OperationalError, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import replicas, writes
+from core.jobs import enqueue, run_batch, run_job, task
+from core.mail import MailDispatcher, build_message, mail_dispatcher
+from core.metrics import DB_QUERIES, REQUESTS, Counter, FileStore, Gauge, Histogram, Registry
+from core.models import Job
+from core.sampledata import SampleDataGenerator
+from core.nplusone import NPlusOneError, detect_n_plus_one
+from core.slowqueries import REDACTED, fingerprint, normalize_sql, slow_query_log
+from core.ratelimit import SlidingWindowLimiter
+from core.retention import RetentionEngine, RetentionPolicy
+from core.worker import Worker
+from core.benchmark import Benchmark, Route, WSGITransport, compare, percentile
+from core.testing import PerformanceTestCase, seed_dataset
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from reviews.models import Review, ReviewHelpful
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """
+    locmem-style backend failing the next ``failures`` sends and counting
+    the connections it opens
+    """
+    failures = 0
+    connections = 0
+
+    def open(self):
+        FlakyEmailBackend.connections += 1
+        return True
+
+    def send_messages(self, messages):
+        if FlakyEmailBackend.failures:
+            FlakyEmailBackend.failures -= 1
+            raise ConnectionError('Connection refused')
+        mail.outbox.extend(messages)
+        return len(messages)
+
+
+class MailDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        FlakyEmailBackend.failures = 0
+        FlakyEmailBackend.connections = 0
+
+    def test_deliver_sends_batches_over_one_connection(self):
+        dispatcher = MailDispatcher(backend='core.tests.FlakyEmailBackend', batch_size=2)
+        messages = [build_message(f'Message {n}', 'Body', [f'user{n}@example.com']) for n in range(5)]
+        self.assertEqual(dispatcher.deliver(messages), 5)
+        self.assertEqual([message.subject for message in mail.outbox], [f'Message {n}' for n in range(5)])
+        self.assertEqual(FlakyEmailBackend.connections, 1)
+        metrics = dispatcher.metrics.snapshot()
+        self.assertEqual((metrics['sent'], metrics['batches'], metrics['connections']), (5, 3, 1))
+
+    def test_deliver_raises_on_failure(self):
+        dispatcher = MailDispatcher(backend='core.tests.FlakyEmailBackend')
+        FlakyEmailBackend.failures = 1
+        with self.assertRaises(ConnectionError):
+            dispatcher.deliver([build_message('Broken', 'Body', ['a@example.com'])])
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(dispatcher.metrics.snapshot()['failed'], 1)
+
+
+@task
+def failing_task():
+    raise ValueError('Task failed')
+
+
+class JobQueueTests(TransactionTestCase):
+    def run_due(self, worker):
+        Job.objects.filter(status=Job.QUEUED).update(run_at=timezone.now())
+        for job_id in worker.claim(10):
+            run_job(job_id)
+
+    def test_failing_job_is_retried_until_max_attempts(self):
+        job = enqueue('core.tests.failing_task', max_attempts=2)
+        worker = Worker()
+
+        self.run_due(worker)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('Task failed', job.last_error)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.run_due(worker)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(EMAIL_BACKEND='core.tests.FlakyEmailBackend')
+    def test_email_job_is_retried_when_sending_fails(self):
+        from core.tasks import send_email_task
+
+        FlakyEmailBackend.failures = 1
+        job = send_email_task.delay('Welcome', 'Hello', ['a@example.com'])
+        worker = Worker()
+
+        self.run_due(worker)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(mail.outbox, [])
+
+        self.run_due(worker)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND='core.tests.FlakyEmailBackend')
+    def test_due_mail_jobs_are_sent_over_one_connection(self):
+        from core.tasks import send_email_task
+
+        FlakyEmailBackend.failures = 0
+        connections = mail_dispatcher.metrics.snapshot()['connections']
+        mail_jobs = [send_email_task.delay(f'Message {n}', 'Hello', [f'user{n}@example.com']) for n in range(3)]
+        other = enqueue('core.tests.failing_task', priority=1, max_attempts=1)
+        worker = Worker(batch_size=2)
+
+        # The claim takes two jobs; the batch is topped up with the third mail job
+        units = sorted(worker.group(worker.claim(2)), key=len)
+        self.assertEqual(units, [[other.pk], [job.pk for job in mail_jobs]])
+        self.assertTrue(run_batch(units[1]))
+        self.assertEqual(mail_dispatcher.metrics.snapshot()['connections'], connections + 1)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), [f'Message {n}' for n in range(3)])
+        self.assertEqual(set(Job.objects.filter(pk__in=units[1]).values_list('status', flat=True)), {Job.SUCCEEDED})
+
+        FlakyEmailBackend.failures = 1
+        failed_jobs = [send_email_task.delay('Retry', 'Hello', [f'user{n}@example.com']) for n in range(2)]
+        units = worker.group(worker.claim(2, names=['core.tasks.send_email_task']))
+        self.assertEqual(units, [[job.pk for job in failed_jobs]])
+        self.assertFalse(run_batch(units[0]))
+        self.assertEqual(set(Job.objects.filter(pk__in=units[0]).values_list('status', flat=True)), {Job.QUEUED})
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        stale_at = timezone.now() - timedelta(hours=1)
+        retried = Job.objects.create(name='core.tests.failing_task', status=Job.RUNNING, attempts=1,
+                                     max_attempts=3, locked_by='gone', locked_at=stale_at)
+        exhausted = Job.objects.create(name='core.tests.failing_task', status=Job.RUNNING, attempts=3,
+                                       max_attempts=3, locked_by='gone', locked_at=stale_at)
+
+        with self.assertLogs('core.worker', 'ERROR'):
+            self.assertEqual(Worker().requeue_stale(), 1)
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((retried.status, retried.locked_by), (Job.QUEUED, ''))
+        self.assertEqual(exhausted.status, Job.FAILED)
+
+    def test_periodic_task_is_claimed_by_one_worker(self):
+        schedule = {'core.tasks.update_product_ratings': 3600}
+        with override_settings(JOB_QUEUE={'SCHEDULE': schedule}):
+            first, second = Worker(), Worker()
+        self.assertTrue(first.claim_schedule('core.tasks.update_product_ratings', 3600))
+        # A second worker that also saw no pending job loses the claim
+        self.assertFalse(second.claim_schedule('core.tasks.update_product_ratings', 3600))
+
+        Job.objects.all().delete()
+        first.enqueue_scheduled()
+        second.enqueue_scheduled()
+        self.assertEqual(Job.objects.count(), 0)
+
+
+class RetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(categories=1, products_per_category=4, images_per_product=0, customers=3,
+                     reviews_per_product=0, orders_per_customer=4, items_per_order=2)
+        # Every third order is old, of either status
+        cls.old_ids = list(Order.objects.order_by('id').values_list('id', flat=True)[::3])
+        Order.objects.filter(id__in=cls.old_ids).update(created_at=timezone.now() - timedelta(days=60))
+
+    def engine(self, policy, **options):
+        return RetentionEngine(policies=[policy], pause=0, **options)
+
+    def policy(self, **options):
+        return RetentionPolicy('old_orders', 'orders.Order', 'created_at', days=30, **options)
+
+    def test_deletes_only_rows_matching_the_policy(self):
+        expired = set(Order.objects.filter(id__in=self.old_ids, status='processing').values_list('id', flat=True))
+        kept = set(Order.objects.values_list('id', flat=True)) - expired
+        self.assertTrue(expired)
+
+        [stats] = self.engine(self.policy(filters={'status': 'processing'}), batch_size=2).run()
+        self.assertEqual((stats['rows'], stats['batches']), (len(expired), -(-len(expired) // 2)))
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), kept)
+        self.assertFalse(OrderItem.objects.filter(order_id__in=expired).exists())
+
+    def test_dry_run_changes_nothing(self):
+        [stats] = self.engine(self.policy(), dry_run=True).run()
+        self.assertEqual((stats['rows'], stats['deleted']), (len(self.old_ids), 0))
+        self.assertEqual(Order.objects.filter(id__in=self.old_ids).count(), len(self.old_ids))
+
+    def test_archive_writes_rows_with_related_before_deleting(self):
+        items = OrderItem.objects.filter(order_id__in=self.old_ids).count()
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(DATA_RETENTION={'ARCHIVE_DIR': directory}):
+                [stats] = self.engine(self.policy(action='archive', related=['items'])).run()
+            [archive] = os.listdir(directory)
+            with open(os.path.join(directory, archive)) as f:
+                models = [json.loads(line)['model'] for line in f]
+
+        self.assertEqual(stats['archived'], len(self.old_ids) + items)
+        self.assertEqual(models.count('orders.order'), len(self.old_ids))
+        self.assertEqual(models.count('orders.orderitem'), items)
+        self.assertFalse(Order.objects.filter(id__in=self.old_ids).exists())
+
+    def test_databases_come_from_the_policy(self):
+        [stats] = self.engine(self.policy(databases='orders.sharding.shard_databases'), dry_run=True).run()
+        self.assertEqual(stats['rows'], len(self.old_ids))
+        [stats] = self.engine(self.policy(databases=[]), dry_run=True).run()
+        self.assertEqual(stats['rows'], 0)
+
+    def test_unknown_action_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.policy(action='truncate')
+
+
+class SlidingWindowLimiterTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.limiter = SlidingWindowLimiter()
+
+    def test_trips_at_the_limit_and_resets(self):
+        start = 6000.0
+        for n in range(3):
+            self.assertTrue(self.limiter.hit('client', 3, 60, now=start + n).allowed)
+        rejected = self.limiter.hit('client', 3, 60, now=start + 3)
+        self.assertFalse(rejected.allowed)
+        self.assertGreater(rejected.retry_after, 0)
+        # Two windows later the previous window no longer weighs in
+        self.assertTrue(self.limiter.hit('client', 3, 60, now=start + 120).allowed)
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        start = 6000.0
+        for n in range(4):
+            self.limiter.hit('client', 4, 60, now=start + n)
+        # Half way into the next window half of the previous hits still count
+        self.assertEqual(self.limiter.hit('client', 4, 60, now=start + 90).remaining, 1)
+        self.assertTrue(self.limiter.hit('client', 4, 60, now=start + 90).allowed)
+        self.assertFalse(self.limiter.hit('client', 4, 60, now=start + 90).allowed)
+
+    def test_rejected_hits_do_not_count(self):
+        for n in range(5):
+            self.limiter.hit('client', 1, 60, now=6000.0)
+        self.assertTrue(self.limiter.hit('client', 1, 60, now=6120.0).allowed)
+
+
+@override_settings(RATE_LIMIT={'ANONYMOUS': None, 'ROUTES': {'login': '2/m'}})
+class RateLimitMiddlewareTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def login(self, **headers):
+        return self.client.post('/api/auth/login/', {'email': 'nobody@example.com', 'password': 'x'},
+                                format='json', **headers)
+
+    def test_route_limit_rejects_with_retry_after(self):
+        responses = [self.login() for _ in range(3)]
+        self.assertNotEqual(responses[1].status_code, 429)
+        self.assertEqual(responses[1]['X-RateLimit-Remaining'], '0')
+        self.assertEqual(responses[2].status_code, 429)
+        self.assertIn('Retry-After', responses[2])
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        responses = [self.login(HTTP_X_FORWARDED_FOR=f'10.0.0.{n}') for n in range(3)]
+        self.assertEqual(responses[2].status_code, 429)
+
+    def test_trusted_proxy_entry_identifies_the_client(self):
+        with override_settings(RATE_LIMIT={'ANONYMOUS': None, 'ROUTES': {'login': '2/m'}, 'TRUSTED_PROXIES': 1}):
+            # The client-supplied left-most entries change, the proxy's does not
+            responses = [self.login(HTTP_X_FORWARDED_FOR=f'10.0.0.{n}, 203.0.113.7') for n in range(3)]
+            self.assertEqual(responses[2].status_code, 429)
+            self.assertNotEqual(self.login(HTTP_X_FORWARDED_FOR='203.0.113.8').status_code, 429)
+
+
+class InstrumentationTests(PerformanceTestCase):
+    def timings(self, response):
+        entries = re.findall(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing'])
+        return {name: (float(duration), desc) for name, duration, desc in entries}
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1.0, 'LOG': False})
+    def test_sampled_requests_report_server_timing(self):
+        with CaptureQueriesContext(connections['default']) as context:
+            response = self.client.get('/api/products/')
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'cache', 'view', 'serialize', 'render', 'total'})
+        self.assertEqual(timings['db'][1], f'{len(context.captured_queries)} queries')
+        self.assertGreater(timings['serialize'][0], 0)
+        parts = sum(timings[name][0] for name in ('view', 'serialize', 'render'))
+        self.assertAlmostEqual(parts, timings['total'][0], delta=0.05)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1.0, 'LOG': True})
+    def test_sampled_requests_log_a_structured_line(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            self.client.get(f'/api/products/{self.product.slug}/')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['view'], line['status']), ('products:product_detail', 200))
+        self.assertGreater(line['db_queries'], 0)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0.0})
+    def test_unsampled_requests_are_not_instrumented(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/products/'))
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.requests = Counter('requests_total', 'Requests', ['route'], registry=self.registry)
+        self.latency = Histogram('latency_seconds', 'Latency', buckets=(0.1, 1), registry=self.registry)
+        self.in_flight = Gauge('in_flight', 'In flight', registry=self.registry)
+
+    def test_text_exposition(self):
+        self.requests.inc(route='list')
+        self.requests.inc(2, route='list')
+        self.latency.observe(0.05)
+        self.latency.observe(0.5)
+        self.in_flight.inc()
+        text = self.registry.expose()
+        self.assertIn('# TYPE requests_total counter\nrequests_total{route="list"} 3.0', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1.0\nlatency_seconds_bucket{le="1.0"} 2.0\n'
+                      'latency_seconds_bucket{le="+Inf"} 2.0\nlatency_seconds_sum 0.55\nlatency_seconds_count 2.0', text)
+        self.assertIn('in_flight 1.0', text)
+
+    def test_workers_are_merged_through_the_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # An exited worker: its counters still count, its gauges do not
+            exited = {'pid': 2 ** 22 + 1, 'metrics': {'requests_total': [[['list'], 5]], 'in_flight': [[[], 4]]}}
+            FileStore(directory).write(exited)
+            self.requests.inc(route='list')
+            self.in_flight.inc()
+            with override_settings(METRICS={'DIR': directory}):
+                values = self.registry.collect()
+        self.assertEqual(values['requests_total'], {('list',): 6})
+        self.assertEqual(values['in_flight'], {(): 1})
+
+
+class MetricsMiddlewareTests(PerformanceTestCase):
+    route = 'products:product_list'
+
+    def counts(self):
+        requests = REQUESTS.values.get((self.route, 'GET', '200'), 0)
+        return requests, DB_QUERIES.values.get((self.route,), [0])[-1]
+
+    def assertCounted(self, requests, queries):
+        before = self.counts()
+        self.client.get('/api/products/')
+        after = self.counts()
+        self.assertEqual((after[0] - before[0], after[1] - before[1]), (requests, queries))
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0.0})
+    def test_unsampled_requests_skip_the_collector(self):
+        self.assertCounted(requests=1, queries=0)
+        with override_settings(METRICS={'COLLECT_ALL': True}):
+            self.assertCounted(requests=1, queries=1)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1.0, 'LOG': False})
+    def test_sampled_requests_count_queries(self):
+        self.assertCounted(requests=1, queries=1)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/products/')
+        response = self.client.get('/api/core/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(f'http_requests_total{{route="{self.route}",method="GET",status="200"}}', response.content.decode())
+
+
+@override_settings(SLOW_QUERIES={'THRESHOLD_MS': 0, 'EXPLAIN': True})
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        slow_query_log.reset()
+        self.addCleanup(slow_query_log.reset)
+
+    def load_products(self):
+        return list(Product.objects.filter(slug='slow-query-test'))
+
+    def entry_for(self, text):
+        return next(entry for entry in slow_query_log.top() if text in entry['normalized_sql'])
+
+    def test_records_the_call_site_and_plan(self):
+        self.load_products()
+        self.load_products()
+        entry = self.entry_for('"products_product"."slug" = ?')
+        self.assertEqual(entry['count'], 2)
+        [site] = entry['call_sites']
+        self.assertRegex(site, r'^core/tests\.py:\d+ in load_products$')
+        self.assertEqual(entry['sample']['params'], ['slow-query-test'])
+        self.assertIn('products_product', entry['plan'])
+
+    def test_sensitive_params_are_redacted(self):
+        slow_query_log.record('default', 'SELECT id FROM accounts_user WHERE "email" = %s AND id = %s',
+                              ['someone@example.com', 7], 0.5)
+        entry = self.entry_for('accounts_user')
+        self.assertEqual(entry['sample']['params'], [REDACTED, 7])
+
+    def test_queries_differing_in_values_share_a_fingerprint(self):
+        first = normalize_sql("SELECT * FROM t WHERE a = 1 AND b IN (%s, %s) AND c = 'x'")
+        second = normalize_sql("SELECT * FROM t WHERE a = 22 AND b IN (%s) AND c = 'yy'")
+        self.assertEqual(first, 'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?')
+        self.assertEqual(fingerprint(first), fingerprint(second))
+
+
+class NPlusOneDetectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(categories=2, products_per_category=3, images_per_product=0, customers=1,
+                     reviews_per_product=0, orders_per_customer=0)
+
+    def test_flags_a_loop_over_a_foreign_key(self):
+        with self.assertRaises(NPlusOneError) as raised:
+            with detect_n_plus_one():
+                [product.category.name for product in Product.objects.all()]
+        [detection] = raised.exception.args[0].split('\n\n')[1:]
+        self.assertIn('6 queries', detection)
+        self.assertIn('"products_category"', detection)
+        self.assertIn('core/tests.py', detection)
+
+    def test_names_the_serializer_field(self):
+        from products.serializers import ProductListSerializer
+
+        with detect_n_plus_one(raise_error=False) as tracker:
+            ProductListSerializer(Product.objects.all(), many=True).data
+        origins = {origin for detection in tracker.detections for origin in detection.origins}
+        self.assertIn('ProductListSerializer.category (serializer field)', origins)
+
+    def test_joined_and_ignored_queries_pass(self):
+        with detect_n_plus_one():
+            [product.category.name for product in Product.objects.select_related('category')]
+        with override_settings(NPLUSONE={'IGNORE': [r'FROM "products_category"']}):
+            with detect_n_plus_one():
+                [product.category.name for product in Product.objects.all()]
+
+
+class SampleDataTests(TestCase):
+    sizes = {
+        'categories': 2, 'subcategories': 2, 'category_depth': 1, 'products': 12, 'images_per_product': 2,
+        'users': 6, 'orders': 10, 'max_items_per_order': 3, 'reviews': 30, 'helpful_votes': 40,
+    }
+
+    def generate(self, seed=7):
+        # A small batch size makes every table span several flushes
+        return SampleDataGenerator(seed=seed, batch_size=7, days=30).generate(**self.sizes)
+
+    def dataset(self):
+        return (
+            list(Product.objects.order_by('id').values_list('id', 'name', 'category_id', 'price')),
+            list(Review.objects.order_by('id').values_list('user_id', 'product_id', 'rating', 'helpful_count')),
+            list(Order.objects.order_by('id').values_list('user_id', 'total_amount', 'status')),
+        )
+
+    def test_generates_the_requested_sizes(self):
+        stats = self.generate()
+        self.assertEqual(stats['products.Category'], 2 + 2 * 2)
+        self.assertEqual(Product.objects.count(), 12)
+        self.assertEqual(stats['products.ProductImage'], 24)
+        self.assertEqual(Review.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 10)
+        self.assertEqual(stats['accounts.User'], stats['accounts.UserProfile'], 6)
+        # Products sit in the leaf categories
+        self.assertFalse(Product.objects.filter(category__parent__isnull=True).exists())
+
+    def test_counters_match_the_rows(self):
+        self.generate()
+        for review in Review.objects.all():
+            self.assertEqual(review.helpful_count, ReviewHelpful.objects.filter(review=review).count())
+            self.assertFalse(ReviewHelpful.objects.filter(review=review, user_id=review.user_id).exists())
+        for product in Product.objects.all():
+            self.assertEqual(product.rating_count, product.reviews.count())
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.total_amount, sum(item.price * item.quantity for item in order.items.all()))
+
+    def test_timestamps_are_spread_over_the_past_days(self):
+        self.generate()
+        created = list(Order.objects.values_list('created_at', flat=True))
+        self.assertEqual(len(set(created)), len(created))
+        self.assertTrue(all(timezone.now() - timedelta(days=30, minutes=1) <= at <= timezone.now() for at in created))
+
+    def test_same_seed_same_data(self):
+        def generated(seed):
+            with transaction.atomic():
+                self.generate(seed)
+                dataset = self.dataset()
+                transaction.set_rollback(True)
+            return dataset
+
+        first = generated(7)
+        self.assertEqual(generated(7), first)
+        self.assertNotEqual(generated(8), first)
+
+
+class CoreEndpointBudgetTests(PerformanceTestCase):
+    # Readiness probes every database, test replicas and shards included
+    databases = '__all__'
+
+    def test_health_check(self):
+        self.assertBudget('/api/core/health/', queries=0, ms=20)
+
+    def test_readiness(self):
+        self.assertBudget('/api/core/ready/', queries=1, ms=50)
+
+    def test_site_stats(self):
+        self.assertBudget('/api/core/stats/', queries=5, ms=50, user=self.admin)
+
+    def test_budget_violation_fails(self):
+        with self.assertRaises(AssertionError):
+            self.assertBudget('/api/products/', queries=1, ms=1000)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def stats(self, p95, throughput, error_rate=0.0):
+        return {'p95_ms': p95, 'throughput': throughput, 'error_rate': error_rate}
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.95), 0.0)
+
+    def test_compare_flags_regressions_over_threshold(self):
+        baseline = {'routes': {'list': self.stats(10, 100)}, 'total': self.stats(10, 100)}
+        within = {'routes': {'list': self.stats(10.5, 95)}, 'total': self.stats(10.5, 95)}
+        slower = {'routes': {'list': self.stats(15, 100, 0.05)}, 'total': self.stats(10, 60)}
+
+        self.assertEqual(compare(within, baseline, 0.10), [])
+        regressions = compare(slower, baseline, 0.10)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[0].startswith('list: p95'))
+        self.assertTrue(regressions[-1].startswith('total: throughput'))
+
+    def test_runs_weighted_mix_and_counts_errors(self):
+        def application(environ, start_response):
+            status = '404 Not Found' if environ['PATH_INFO'].endswith('/missing/') else '200 OK'
+            start_response(status, [('Content-Type', 'text/plain')])
+            return [environ['PATH_INFO'].encode()]
+
+        routes = [Route('detail', '/items/{product}/', 3), Route('missing', '/missing/', 1),
+                  Route('orders', '/orders/', 1, auth=True)]
+        results = Benchmark(WSGITransport(application), routes, concurrency=4, requests=200,
+                            placeholders={'product': ['a', 'b']}).run()
+
+        self.assertEqual(results['meta']['skipped_routes'], ['orders'])
+        self.assertEqual(results['total']['requests'], 200)
+        self.assertEqual(set(results['routes']), {'detail', 'missing'})
+        self.assertEqual(results['total']['errors'], results['routes']['missing']['requests'])
+        self.assertEqual(results['routes']['missing']['error_rate'], 1.0)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILING={'DIR': directory.name}, RATE_LIMIT={'ENABLED': False})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass')
+
+    def token(self, user):
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    def test_admin_request_is_profiled(self):
+        response = self.client.get('/api/products/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=self.token(self.admin))
+        profile_id = response['X-Profile-Id']
+
+        self.client.force_authenticate(self.admin)
+        listing = self.client.get('/api/core/profiles/')
+        self.assertEqual([profile['id'] for profile in listing.data['results']], [profile_id])
+        self.assertEqual(listing.data['results'][0]['path'], '/api/products/')
+
+        detail = self.client.get(f'/api/core/profiles/{profile_id}/', {'sort': 'tottime', 'limit': 5})
+        self.assertIn('function calls', detail.data['summary'])
+        download = self.client.get(f'/api/core/profiles/{profile_id}/', {'download': 1})
+        self.assertEqual(download.status_code, 200)
+        self.assertGreater(len(b''.join(download.streaming_content)), 0)
+
+    def test_flag_is_ignored_for_customers_and_anonymous(self):
+        response = self.client.get('/api/products/?_profile=1', HTTP_AUTHORIZATION=self.token(self.customer))
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get('/api/products/?_profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+        # Only a JWT counts; the session is not loaded yet when profiling starts
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/products/?_profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_profiles_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/core/profiles/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/core/profiles/not-an-id/').status_code, 404)
+
+
+@override_settings(BATCH_REQUESTS={'MAX_WORKERS': 1})
+class BatchTests(PerformanceTestCase):
+    def batch(self, requests, user=None):
+        if user is not None:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        response = self.client.post('/api/batch/', {'requests': requests}, format='json')
+        self.client.credentials()
+        return response
+
+    def test_sub_requests_match_direct_requests(self):
+        paths = ['/api/products/featured/', '/api/products/categories/', f'/api/products/{self.product.slug}/']
+        response = self.batch([{'id': str(n), 'path': path} for n, path in enumerate(paths)])
+
+        self.assertEqual(response.status_code, 200)
+        for n, (path, result) in enumerate(zip(paths, response.data['responses'])):
+            self.assertEqual(result['id'], str(n))
+            self.assertEqual(result['status'], 200)
+            self.assertEqual(result['body'], self.client.get(path).json())
+
+    def test_authenticates_once_for_all_sub_requests(self):
+        response = self.batch(['/api/auth/user/', '/api/orders/', '/api/products/admin/products/'], user=self.customer)
+        statuses = [result['status'] for result in response.data['responses']]
+        self.assertEqual(statuses, [200, 200, 403])
+        self.assertEqual(response.data['responses'][0]['body']['email'], self.customer.email)
+
+        anonymous = self.batch(['/api/auth/user/', '/api/products/featured/'])
+        self.assertEqual([result['status'] for result in anonymous.data['responses']], [401, 200])
+
+    def test_identical_sub_requests_run_once(self):
+        for cache in caches.all():
+            cache.clear()
+        single = self.batch([f'/api/products/{self.product.slug}/related/'])
+        with CaptureQueriesContext(connections['default']) as once:
+            self.batch([f'/api/products/{self.product.slug}/related/'])
+        with CaptureQueriesContext(connections['default']) as twice:
+            response = self.batch([f'/api/products/{self.product.slug}/related/'] * 2)
+        self.assertEqual(len(once), len(twice))
+        self.assertEqual(response.data['responses'][0]['body'], single.data['responses'][0]['body'])
+        self.assertEqual(response.data['responses'][0]['body'], response.data['responses'][1]['body'])
+
+    def test_rejected_requests(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch(['/api/products/'] * 21).status_code, 400)
+        self.assertEqual(self.batch([{'path': '/api/orders/', 'method': 'POST'}]).status_code, 400)
+
+        results = self.batch(['/admin/', 'http://example.com/api/products/', '/api/batch/', '/api/nope/'])
+        self.assertEqual([result['status'] for result in results.data['responses']], [400, 400, 400, 404])
+
+
+@override_settings(RATE_LIMIT={'ENABLED': False}, BATCH_REQUESTS={'MAX_WORKERS': 4})
+class ConcurrentBatchTests(TransactionTestCase):
+    def test_sub_requests_run_on_worker_threads(self):
+        seed_dataset(categories=2, products_per_category=3, customers=2)
+        paths = ['/api/products/', '/api/products/featured/', '/api/products/categories/', '/api/products/filters/']
+        response = APIClient().post('/api/batch/', {'requests': paths}, format='json')
+        self.assertEqual([result['status'] for result in response.data['responses']], [200] * 4)
+        self.assertEqual(response.data['responses'][0]['body']['count'], 6)
+
+
+# Two replicas for the routing tests, registered before the test runner
+# sets up the databases so it creates and migrates them like the default one
+REPLICAS = ('replica_a', 'replica_b')
+for alias in REPLICAS:
+    connections.settings[alias] = dict(
+        connections.settings['default'],
+        TEST=dict(
+            connections.settings['default']['TEST'],
+            NAME=os.path.join(tempfile.gettempdir(), f'test_{alias}_{os.getpid()}.sqlite3'),
+        ),
+    )
+
+
+def replicate(alias):
+    """
+    Copy the primary into a replica, as a replication job would
+    """
+    connections['default'].ensure_connection()
+    connections[alias].ensure_connection()
+    connections['default'].connection.backup(connections[alias].connection)
+
+
+@override_settings(
+    RATE_LIMIT={'ENABLED': False},
+    REPLICA_ROUTING={'REPLICAS': ['replica_a'], 'HEALTH_CHECK_INTERVAL': 60},
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', *REPLICAS}
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        data = seed_dataset(categories=1, products_per_category=2, customers=2, orders_per_customer=1)
+        self.customer = data['customer']
+        self.product = data['products'][0]
+        replicate('replica_a')
+
+    def get(self, path, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client.get(path)
+
+    def test_safe_requests_read_from_the_replica(self):
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+
+        with CaptureQueriesContext(connections['replica_a']) as replica:
+            response = self.get(f'/api/products/{self.product.slug}/')
+        self.assertEqual(response.data['name'], self.product.name)
+        self.assertTrue(replica.captured_queries)
+
+        replicate('replica_a')
+        caches['default'].clear()
+        self.assertEqual(self.get(f'/api/products/{self.product.slug}/').data['name'], 'Renamed')
+
+    def test_writes_go_to_the_primary_and_pin_the_writer(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.customer).access_token}')
+        with CaptureQueriesContext(connections['replica_a']) as replica:
+            response = client.patch('/api/auth/user/update/', {'first_name': 'Updated'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica.captured_queries, [])
+
+        # The writer reads its own write; other clients read the replica
+        self.assertEqual(self.get('/api/auth/user/', self.customer).data['first_name'], 'Updated')
+        admin = get_user_model().objects.get(is_superuser=True)
+        self.assertEqual(self.get(f'/api/auth/users/{self.customer.pk}/', admin).data['first_name'], 'Customer')
+
+        # Once the pin expires the writer reads the (stale) replica too
+        caches['default'].clear()
+        self.assertEqual(self.get('/api/auth/user/', self.customer).data['first_name'], 'Customer')
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        state = replicas.RoutingState('replica_a')
+        token = replicas._state.set(state)
+        try:
+            router = replicas.ReplicaRouter()
+            self.assertEqual(router.db_for_read(Product), 'replica_a')
+            with replicas.use_primary():
+                self.assertEqual(router.db_for_read(Product), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Product), 'default')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            self.assertEqual(router.db_for_read(Product), 'default')
+        finally:
+            replicas._state.reset(token)
+        self.assertIsNone(router.db_for_read(Product))
+
+
+@override_settings(REPLICA_ROUTING={'REPLICAS': list(REPLICAS), 'HEALTH_CHECK_INTERVAL': 60})
+class ReplicaHealthTests(SimpleTestCase):
+    databases = set(REPLICAS)
+
+    def setUp(self):
+        # Take replica_b down: read-only SQLite URIs fail to open a missing file
+        connection = connections['replica_b']
+        connection.close()
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = f"file:{os.path.join(tempfile.gettempdir(), 'missing.sqlite3')}?mode=ro"
+        self.addCleanup(connection.settings_dict.__setitem__, 'NAME', name)
+        self.addCleanup(replicas.health.reset)
+
+    def test_unavailable_replicas_are_skipped(self):
+        with self.assertLogs('core.replicas', 'WARNING'):
+            self.assertEqual({replicas.choose_replica() for _ in range(10)}, {'replica_a'})
+        self.assertFalse(replicas.health.is_healthy('replica_b'))
+
+    def test_falls_back_to_the_primary(self):
+        with override_settings(REPLICA_ROUTING={'REPLICAS': ['replica_b']}):
+            with self.assertLogs('core.replicas', 'WARNING'):
+                self.assertIsNone(replicas.choose_replica())
+
+
+class WriteQueueTests(SimpleTestCase):
+    def test_writers_are_served_in_arrival_order(self):
+        queue = writes.WriteQueue()
+        order = []
+        self.assertTrue(queue.acquire())
+
+        def writer(n):
+            queue.acquire()
+            order.append(n)
+            queue.release()
+
+        threads = []
+        for n in range(5):
+            threads.append(threading.Thread(target=writer, args=(n,)))
+            threads[-1].start()
+            # Wait for each writer to take its ticket before starting the next
+            while queue.waiting < n + 1:
+                time.sleep(0.001)
+        queue.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+
+    def test_holder_may_enter_again(self):
+        queue = writes.WriteQueue()
+        self.assertTrue(queue.acquire())
+        self.assertTrue(queue.acquire())
+        queue.release()
+        self.assertEqual(queue.owner, threading.get_ident())
+        queue.release()
+        self.assertIsNone(queue.owner)
+
+    def test_timed_out_writers_give_up_their_turn(self):
+        queue = writes.WriteQueue()
+        queue.acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(queue.acquire(timeout=0.01)))
+        waiter.start()
+        waiter.join()
+        self.assertEqual(results, [False])
+
+        queue.release()
+        self.assertTrue(queue.acquire(timeout=1))
+        self.assertEqual(queue.waiting, 0)
+        queue.release()
+
+
+@override_settings(SQLITE_WRITE_QUEUE={'ENABLED': True, 'TIMEOUT': 30})
+class SerializedWriteTests(TransactionTestCase):
+    def test_concurrent_profile_uses_wal_and_immediate_transactions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connection = DatabaseWrapper({
+                **connections['default'].settings_dict,
+                'NAME': os.path.join(directory, 'concurrent.sqlite3'),
+                'OPTIONS': settings.SQLITE_PROFILES['concurrent'],
+            }, alias='concurrent')
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+            finally:
+                connection.close()
+
+    def test_writes_queue_outside_transactions_only(self):
+        queue = writes.get_queue('default')
+        with writes.serialized_write():
+            self.assertTrue(connections['default'].in_atomic_block)
+            self.assertEqual(queue.owner, threading.get_ident())
+        self.assertIsNone(queue.owner)
+
+        with transaction.atomic(), writes.serialized_write():
+            self.assertIsNone(queue.owner)
+
+        with override_settings(SQLITE_WRITE_QUEUE={'ENABLED': False}), writes.serialized_write():
+            self.assertIsNone(queue.owner)
+
+    def test_times_out_behind_a_stuck_writer(self):
+        queue = writes.get_queue('default')
+        held, done = threading.Event(), threading.Event()
+
+        def stuck_writer():
+            queue.acquire()
+            held.set()
+            done.wait()
+            queue.release()
+
+        holder = threading.Thread(target=stuck_writer)
+        holder.start()
+        held.wait()
+        try:
+            with override_settings(SQLITE_WRITE_QUEUE={'TIMEOUT': 0.01}):
+                with self.assertRaisesMessage(OperationalError, 'write queue'):
+                    with writes.serialized_write():
+                        pass
+        finally:
+            done.set()
+            holder.join()
+        self.assertEqual(queue.waiting, 0)
@@ -3,5 +3,10 @@ from . import views
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
+    path('ready/', views.readiness, name='readiness'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('slow-queries/', views.slow_queries, name='slow_queries'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
     path('stats/', views.site_stats, name='site_stats'),
 ]
@@ -40,15 +40,9 @@ def send_notification_email(user, subject, message):
     """
     Send notification email to user
     """
-    from django.core.mail import send_mail
+    from .tasks import send_email_task
     
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[user.email],
-        fail_silently=False,
-    )
+    send_email_task.delay(subject, message, [user.email])
 
 def generate_order_number():
     """
@@ -1,9 +1,20 @@
+import time
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare, get_random_string
+from .batch import BatchError, get_batch_settings, parse_batch, run_batch
+from .metrics import expose_metrics, get_metrics_settings
+from .profiling import SORT_KEYS, ProfileStore, summarize
+from .replicas import get_replica_settings
+from .slowqueries import request_explain, slow_query_log
 from products.models import Product
 from orders.models import Order
+from orders.sharding import scatter
 
 User = get_user_model()
 
@@ -18,6 +29,56 @@ def health_check(request):
         'message': 'API is running successfully'
     })
 
+def metrics(request):
+    """
+    Prometheus metrics of all workers in the text exposition format
+    """
+    token = get_metrics_settings()['TOKEN']
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(expose_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _timed(check):
+    start = time.perf_counter()
+    try:
+        check()
+    except Exception as e:
+        return {'ok': False, 'error': str(e), 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
+    return {'ok': True, 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+def _check_database(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+def _check_cache(alias):
+    cache = caches[alias]
+    key = f'readiness:{get_random_string(12)}'
+    cache.set(key, 1, timeout=10)
+    if cache.get(key) != 1:
+        raise RuntimeError('value written to the cache could not be read back')
+    cache.delete(key)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def readiness(request):
+    """
+    Probe database and cache round trips; 503 if any of them fails.
+    Read replicas are reported but not required: reads fall back to the
+    primary while they are down.
+    """
+    checks = {}
+    for alias in connections:
+        checks[f'database:{alias}'] = _timed(lambda: _check_database(alias))
+    for alias in caches:
+        checks[f'cache:{alias}'] = _timed(lambda: _check_cache(alias))
+    optional = {f'database:{alias}' for alias in get_replica_settings()['REPLICAS']}
+    ready = all(check['ok'] for name, check in checks.items() if name not in optional)
+    return Response(
+        {'status': 'ready' if ready else 'unavailable', 'checks': checks},
+        status=200 if ready else 503,
+    )
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def site_stats(request):
@@ -27,8 +88,105 @@ def site_stats(request):
     stats = {
         'total_users': User.objects.count(),
         'total_products': Product.objects.count(),
-        'total_orders': Order.objects.count(),
+        'total_orders': sum(scatter(lambda using: Order.objects.using(using).count())),
         'active_products': Product.objects.filter(is_active=True).count(),
         'featured_products': Product.objects.filter(is_featured=True).count(),
     }
     return Response(stats)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def slow_queries(request):
+    """
+    Slowest query fingerprints by total time.
+
+    ``?explain=<fingerprint>`` returns the plan when this worker holds the
+    sample, and otherwise asks all workers to capture it next time.
+    DELETE clears the log.
+    """
+    if request.method == 'DELETE':
+        slow_query_log.reset()
+        return Response(status=204)
+
+    explained = None
+    fp = request.query_params.get('explain')
+    if fp:
+        plan = slow_query_log.explain(fp)
+        if plan is None:
+            request_explain(fp)
+        explained = {'fingerprint': fp, 'plan': plan, 'requested': plan is None}
+
+    try:
+        limit = int(request.query_params.get('limit', 0)) or None
+    except ValueError:
+        limit = None
+    return Response({
+        'results': slow_query_log.top(limit),
+        'explain': explained,
+    })
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def profiles(request):
+    """
+    Captured request profiles, newest first. DELETE removes them all.
+    """
+    store = ProfileStore()
+    if request.method == 'DELETE':
+        store.clear()
+        return Response(status=204)
+    return Response({'results': store.list()})
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def profile_detail(request, profile_id):
+    """
+    One profile with its top functions (``?sort=`` cumulative, tottime,
+    ncalls or filename; ``?limit=``). ``?download=1`` returns the raw
+    pstats file for snakeviz or ``python -m pstats``.
+    """
+    store = ProfileStore()
+    try:
+        meta = store.get(profile_id)
+    except ValueError:
+        raise Http404
+    if meta is None:
+        raise Http404
+
+    if request.method == 'DELETE':
+        store.delete(profile_id)
+        return Response(status=204)
+
+    if request.query_params.get('download'):
+        return FileResponse(open(store.path(profile_id), 'rb'), as_attachment=True,
+                            filename=f'{profile_id}.prof', content_type='application/octet-stream')
+
+    sort = request.query_params.get('sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        sort = 'cumulative'
+    try:
+        limit = int(request.query_params.get('limit', 0)) or None
+    except ValueError:
+        limit = None
+    if sort != 'cumulative' or limit:
+        meta['summary'] = summarize(store.stats(profile_id), sort, limit or 30)
+    return Response(meta)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch(request):
+    """
+    Run several GET requests to /api/ routes in one round trip.
+
+        {"requests": [{"id": "featured", "path": "/api/products/featured/"},
+                      {"id": "me", "path": "/api/auth/profile/"}]}
+
+    The batch is authenticated once and every sub-request runs as that
+    user, each with its own status code. Sub-requests skip the middleware
+    but go through the views' own caching and permissions.
+    """
+    try:
+        items = parse_batch(request.data, get_batch_settings()['MAX_REQUESTS'])
+    except BatchError as exc:
+        return Response({'error': str(exc)}, status=400)
+    return Response({'responses': run_batch(request._request, request.user, request.auth, items)})
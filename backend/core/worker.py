@@ -0,0 +1,223 @@
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .jobs import batched_with, get_queue_settings, get_task, run_batch, run_job
+from .models import Job, Watermark
+
+logger = logging.getLogger(__name__)
+
+
+def _init_process():
+    """
+    Set up Django in pool child processes
+    """
+    import django
+    django.setup()
+
+
+class Worker:
+    """
+    Poll the job table, claim jobs in batches and run them in a pool
+    """
+    def __init__(self, queues=None, concurrency=None, batch_size=None, pool=None, poll_interval=None):
+        config = get_queue_settings()
+        self.queues = queues or ['default']
+        self.concurrency = concurrency or config['CONCURRENCY']
+        self.batch_size = batch_size or config['BATCH_SIZE']
+        self.pool = pool or config['POOL']
+        self.poll_interval = config['POLL_INTERVAL'] if poll_interval is None else poll_interval
+        self.lock_timeout = config['LOCK_TIMEOUT']
+        self.schedule = config['SCHEDULE']
+        self.worker_id = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.processed = 0
+        self._running = False
+        self._last_maintenance = 0
+
+    def claim(self, limit, names=None):
+        """
+        Atomically mark up to ``limit`` due jobs (of the tasks in ``names``,
+        if given) as running for this worker
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            candidates = Job.objects.filter(
+                status=Job.QUEUED,
+                queue__in=self.queues,
+                run_at__lte=now,
+            ).order_by('-priority', 'run_at', 'id')
+            if names is not None:
+                candidates = candidates.filter(name__in=names)
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list('id', flat=True)[:limit])
+            if not ids:
+                return []
+
+            # The status guard makes the claim safe on backends without
+            # SKIP LOCKED: a job another worker took is simply not updated.
+            Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+                status=Job.RUNNING,
+                locked_by=self.worker_id,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+        return list(
+            Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=self.worker_id)
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)
+        )
+
+    def group(self, claimed):
+        """
+        Split claimed job ids into units of work. Jobs of batched tasks
+        (core.jobs.Task ``batch``) run together, topped up with more due
+        jobs of the same handler to the task's ``batch_size``; any other
+        job runs alone.
+        """
+        if not claimed:
+            return []
+        names = dict(Job.objects.filter(id__in=claimed).values_list('id', 'name'))
+        units, batches = [], {}
+        for job_id in claimed:
+            try:
+                task = get_task(names[job_id])
+            except Exception:
+                # run_job() records the error on the job
+                task = None
+            if task is None or task.batch is None:
+                units.append([job_id])
+            else:
+                batches.setdefault(task.batch, (task, []))[1].append(job_id)
+
+        for batch, (task, job_ids) in batches.items():
+            size = task.batch_size or self.batch_size
+            if len(job_ids) < size:
+                try:
+                    job_ids += self.claim(size - len(job_ids), names=batched_with(batch))
+                except OperationalError as e:
+                    logger.warning(f'Job claim failed: {str(e)}')
+            units.append(job_ids)
+        return units
+
+    def requeue_stale(self):
+        """
+        Return jobs whose worker died mid-run to the queue, failing those
+        that used up their attempts (a job that keeps killing its worker)
+        """
+        now = timezone.now()
+        stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=self.lock_timeout))
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, finished_at=now, locked_by='', locked_at=None, updated_at=now,
+            last_error='Worker stopped responding while running the job',
+        )
+        if failed:
+            logger.error(f'Failed {failed} stale job(s) out of attempts')
+        count = stale.update(status=Job.QUEUED, locked_by='', locked_at=None, updated_at=now)
+        if count:
+            logger.warning(f'Requeued {count} stale job(s)')
+        return count
+
+    def claim_schedule(self, name, interval):
+        """
+        Take the next run of a periodic task; of several workers racing for
+        it, exactly one wins the conditional UPDATE of its watermark
+        """
+        key = f'schedule:{name}'
+        now = timezone.now()
+        Watermark.objects.get_or_create(name=key)
+        return Watermark.objects.filter(Q(value__isnull=True) | Q(value__lte=now), name=key).update(
+            value=now + timedelta(seconds=interval)
+        ) == 1
+
+    def enqueue_scheduled(self):
+        """
+        Keep one pending job for every periodic task in the schedule
+        """
+        from .jobs import enqueue
+
+        for name, interval in self.schedule.items():
+            pending = Job.objects.filter(
+                name=name, status__in=[Job.QUEUED, Job.RUNNING]
+            ).exists()
+            if not pending and self.claim_schedule(name, interval):
+                enqueue(name, countdown=interval)
+
+    def maintenance(self):
+        if time.monotonic() - self._last_maintenance < 30:
+            return
+        self._last_maintenance = time.monotonic()
+        self.requeue_stale()
+        self.enqueue_scheduled()
+
+    def _make_executor(self):
+        if self.pool == 'process':
+            # Forked children must not share the parent's database connections
+            connections.close_all()
+            return ProcessPoolExecutor(max_workers=self.concurrency, initializer=_init_process)
+        return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job-worker')
+
+    def stop(self, *args):
+        self._running = False
+
+    def run(self, burst=False, max_jobs=None):
+        """
+        Process jobs until stopped; with ``burst`` exit once the queue is empty
+        """
+        self._running = True
+        if not burst:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        logger.info(
+            f'Worker {self.worker_id} started: queues={self.queues} '
+            f'concurrency={self.concurrency} pool={self.pool}'
+        )
+        in_flight = {}
+        with self._make_executor() as executor:
+            while self._running:
+                self.maintenance()
+
+                free = self.concurrency - len(in_flight)
+                try:
+                    claimed = self.claim(min(free, self.batch_size)) if free > 0 else []
+                except OperationalError as e:
+                    # Another writer holds the lock; try again on the next poll
+                    logger.warning(f'Job claim failed: {str(e)}')
+                    claimed = []
+                # A batch takes one pool slot; in_flight maps futures to job counts
+                for job_ids in self.group(claimed):
+                    if len(job_ids) == 1:
+                        in_flight[executor.submit(run_job, job_ids[0])] = 1
+                    else:
+                        in_flight[executor.submit(run_batch, job_ids)] = len(job_ids)
+
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.processed += in_flight.pop(future)
+                        if future.exception():
+                            logger.error(f'Worker pool error: {future.exception()}')
+                elif burst:
+                    break
+                else:
+                    time.sleep(self.poll_interval)
+
+                if max_jobs and self.processed >= max_jobs:
+                    break
+
+            wait(in_flight)
+            self.processed += sum(in_flight.values())
+
+        logger.info(f'Worker {self.worker_id} stopped after {self.processed} job(s)')
+        return self.processed
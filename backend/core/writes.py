@@ -0,0 +1,130 @@
+"""
+Single-writer queue for SQLite.
+
+SQLite runs one write transaction at a time. When several threads of a
+process start writes together, all but one sleep and retry in SQLite's
+busy handler, waking in no particular order, and a transaction that
+started reading can fail at once with "database is locked" when it tries
+to write. Write paths wrapped in serialized_write() instead line up in a
+FIFO queue per database and enter their transaction one at a time, on the
+caller's own connection. Other processes are kept apart by BEGIN
+IMMEDIATE and the busy timeout (settings.SQLITE_PROFILES).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from .metrics import Histogram
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TIMEOUT': 30,   # seconds a write waits for its turn
+}
+
+WRITE_QUEUE_WAIT = Histogram(
+    'db_write_queue_wait_seconds', 'Time writes waited in the single-writer queue',
+    ['database'],
+)
+
+
+def get_write_queue_settings():
+    """
+    SQLITE_WRITE_QUEUE settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'SQLITE_WRITE_QUEUE', {}))
+    return config
+
+
+class WriteQueue:
+    """
+    A fair lock: writers are served in arrival order. The thread holding
+    it may enter again.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.next_ticket = 0
+        self.serving = 0
+        self.abandoned = set()
+        self.owner = None
+        self.depth = 0
+
+    @property
+    def waiting(self):
+        return self.next_ticket - self.serving - len(self.abandoned) - (1 if self.owner else 0)
+
+    def acquire(self, timeout=None):
+        me = threading.get_ident()
+        with self.condition:
+            if self.owner == me:
+                self.depth += 1
+                return True
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            if not self.condition.wait_for(lambda: self.serving == ticket, timeout):
+                # Later tickets skip this one when it comes up
+                self.abandoned.add(ticket)
+                return False
+            self.owner, self.depth = me, 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.depth -= 1
+            if self.depth:
+                return
+            self.owner = None
+            self.serving += 1
+            while self.serving in self.abandoned:
+                self.abandoned.remove(self.serving)
+                self.serving += 1
+            self.condition.notify_all()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(using):
+    with _queues_lock:
+        if using not in _queues:
+            _queues[using] = WriteQueue()
+        return _queues[using]
+
+
+def _queued(using):
+    connection = connections[using]
+    # Inside a transaction the queue is skipped: the outer transaction may
+    # already hold SQLite's lock that the writer ahead of us waits for
+    return (
+        connection.vendor == 'sqlite'
+        and not connection.in_atomic_block
+        and get_write_queue_settings()['ENABLED']
+    )
+
+
+@contextmanager
+def serialized_write(using=None):
+    """
+    ``transaction.atomic(using)``, entered through the database's write
+    queue when it is SQLite
+    """
+    using = using or DEFAULT_DB_ALIAS
+    if not _queued(using):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    queue = get_queue(using)
+    start = time.perf_counter()
+    if not queue.acquire(timeout=get_write_queue_settings()['TIMEOUT']):
+        raise OperationalError('database is locked: timed out waiting in the write queue')
+    WRITE_QUEUE_WAIT.observe(time.perf_counter() - start, database=using)
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        queue.release()
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -45,6 +46,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.RequestLoggingMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
+    'core.replicas.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RateLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce.urls'
@@ -60,7 +67,7 @@ ROOT_URLCONF = 'ecommerce.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -78,11 +85,81 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite connection profiles, applied to every new connection. 'concurrent'
+# suits a server handling requests in parallel: WAL lets reads run while a
+# write commits, synchronous=NORMAL is safe under WAL, a larger page cache
+# and memory-mapped reads spare syscalls, and BEGIN IMMEDIATE takes the
+# write lock when a transaction starts, so writers queue in the busy
+# timeout instead of failing with "database is locked" when a read
+# transaction tries to write. 'default' is SQLite's own and the default,
+# so management commands and tests leave db.sqlite3 in rollback-journal
+# mode (WAL sticks to a file once set); deployments set
+# SQLITE_PROFILE=concurrent.
+SQLITE_READ_PRAGMAS = [
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+SQLITE_PROFILES = {
+    'default': {},
+    'concurrent': {
+        'init_command': '; '.join(['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL', *SQLITE_READ_PRAGMAS]),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_PROFILES[SQLITE_PROFILE],
+    }
+}
+
+# Order creation and review votes go through a per-database queue so
+# that one process's writers take turns (core.writes)
+SQLITE_WRITE_QUEUE = {
+    'ENABLED': SQLITE_PROFILE == 'concurrent',
+    'TIMEOUT': 30,
+}
+
+# Read replicas (core.replicas): DATABASE_REPLICAS lists SQLite files kept
+# in sync with the primary, e.g. by Litestream or periodic backups. They
+# are opened read-only; safe requests read from them.
+DATABASE_REPLICAS = [path.strip() for path in os.environ.get('DATABASE_REPLICAS', '').split(',') if path.strip()]
+for number, path in enumerate(DATABASE_REPLICAS, 1):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{path}?mode=ro',
+        'OPTIONS': {'init_command': '; '.join(SQLITE_READ_PRAGMAS), 'timeout': 20} if SQLITE_PROFILE == 'concurrent' else {},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Order sharding (orders.sharding): ORDER_SHARDS lists SQLite files for
+# extra order shards. With any set, each user's orders live on the primary
+# or one of them, by a stable hash of the user id. Append new shards at the
+# end and run `reshard_orders`.
+ORDER_SHARDS = [path.strip() for path in os.environ.get('ORDER_SHARDS', '').split(',') if path.strip()]
+for number, path in enumerate(ORDER_SHARDS, 1):
+    DATABASES[f'orders_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': SQLITE_PROFILES[SQLITE_PROFILE],
     }
+
+ORDER_SHARDING = {
+    'SHARDS': ['default'] + [f'orders_{number}' for number in range(1, len(ORDER_SHARDS) + 1)] if ORDER_SHARDS else [],
+    'BATCH_SIZE': 500,
+}
+
+DATABASE_ROUTERS = ['orders.sharding.ShardRouter', 'core.replicas.ReplicaRouter']
+
+REPLICA_ROUTING = {
+    'REPLICAS': [f'replica_{number}' for number in range(1, len(DATABASE_REPLICAS) + 1)],
+    'PIN_SECONDS': int(os.environ.get('REPLICA_PIN_SECONDS', 5)),
+    'HEALTH_CHECK_INTERVAL': 30,
 }
 
 # DATABASES = {
@@ -96,6 +173,20 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# Local memory is per process. Point CACHE_BACKEND/CACHE_LOCATION at a
+# shared store (Redis, Memcached) when running several workers so that
+# rate limits and cached pages are shared between them.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'core.cache.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+# Redis and Memcached pass OPTIONS to their client, which rejects MAX_ENTRIES
+if 'LocMemCache' in CACHES['default']['BACKEND']:
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -139,13 +230,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 12,
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -160,6 +255,195 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Verified tokens and their users cached by the authentication class
+# (accounts.authentication); users are dropped from the cache when saved
+AUTH_CACHE = {
+    'MAX_TOKENS': 10000,
+    'USER_TIMEOUT': 60,
+}
+
+# Email
+# The console backend prints messages to stdout; set EMAIL_BACKEND to
+# 'django.core.mail.backends.filebased.EmailBackend' to write them to
+# EMAIL_FILE_PATH instead, or to the SMTP backend in production.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@ecommerce.local')
+
+MAIL_DISPATCHER = {
+    'BATCH_SIZE': 50,
+}
+
+# Background jobs (core.jobs), processed by `manage.py run_worker`
+JOB_QUEUE = {
+    'CONCURRENCY': 4,
+    'BATCH_SIZE': 10,
+    'POOL': 'thread',
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BACKOFF': 30,
+    'SCHEDULE': {
+        'core.tasks.update_product_ratings': 60 * 60,
+        'core.tasks.cleanup_old_data': 60 * 60 * 24,
+        'core.tasks.flush_helpful_votes': 60,
+        'core.tasks.reconcile_helpful_counts': 60 * 60 * 24,
+    },
+}
+
+# Helpful vote counters (reviews.helpful). Votes on hot reviews are
+# buffered in the cache and flushed every minute by the job worker, so
+# write-behind needs a cache the web and worker processes share.
+HELPFUL_VOTES = {
+    'WRITE_BEHIND': 'LocMemCache' not in CACHES['default']['BACKEND'],
+    'HOT_THRESHOLD': 20,
+    'HOT_WINDOW': 60,
+}
+
+# Closed orders older than this move to the orders archive tables
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+
+# Data retention (core.retention), applied daily by core.tasks.cleanup_old_data
+DATA_RETENTION = {
+    'BATCH_SIZE': 500,
+    'BATCH_PAUSE': 0.05,
+    'ARCHIVE_DIR': BASE_DIR / 'archive',
+    'POLICIES': [
+        {
+            'name': 'stale_pending_orders',
+            'model': 'orders.Order',
+            'field': 'created_at',
+            'days': 7,
+            'filters': {'status': 'pending', 'payment_status__in': ['pending', 'failed']},
+            'action': 'delete',
+            'databases': 'orders.sharding.shard_databases',
+        },
+        {
+            'name': 'closed_orders',
+            'model': 'orders.Order',
+            'field': 'created_at',
+            'days': ORDER_ARCHIVE_AFTER_DAYS,
+            'filters': {'status__in': ['delivered', 'cancelled', 'refunded']},
+            'action': 'archive',
+            'archiver': 'orders.archive.archive_to_tables',
+            'databases': 'orders.sharding.shard_databases',
+        },
+        {
+            'name': 'order_status_history',
+            'model': 'orders.OrderStatusHistory',
+            'field': 'created_at',
+            'days': 365,
+            'action': 'archive',
+            'databases': 'orders.sharding.shard_databases',
+        },
+        {
+            'name': 'expired_sessions',
+            'model': 'sessions.Session',
+            'field': 'expire_date',
+            'action': 'delete',
+        },
+        {
+            'name': 'expired_jwt_tokens',
+            'model': 'token_blacklist.OutstandingToken',
+            'field': 'expires_at',
+            'action': 'delete',
+        },
+        {
+            'name': 'finished_jobs',
+            'model': 'core.Job',
+            'field': 'finished_at',
+            'days': 14,
+            'filters': {'status': 'succeeded'},
+            'action': 'delete',
+        },
+    ],
+}
+
+# Rate limiting (core.ratelimit), keyed by user id or client IP
+RATE_LIMIT = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    # Reverse proxies in front of the app that append to X-Forwarded-For;
+    # with none, anonymous clients are identified by REMOTE_ADDR
+    'TRUSTED_PROXIES': int(os.environ.get('TRUSTED_PROXIES', 0)),
+    'ANONYMOUS': '100/m',
+    'AUTHENTICATED': '300/m',
+    'ROUTES': {
+        'login': '10/m',
+        'register': '5/m',
+        'password_reset': '5/m',
+        'create_order': '30/m',
+        # One batch runs up to BATCH_REQUESTS['MAX_REQUESTS'] requests
+        'batch': '30/m',
+    },
+    'EXEMPT': ['health_check', 'readiness', 'metrics'],
+}
+
+# Batched GET requests (core.batch) at /api/batch/
+BATCH_REQUESTS = {
+    'MAX_REQUESTS': 20,
+    'MAX_WORKERS': 4,
+}
+
+# Per-request instrumentation (core.instrumentation): DB, cache and render
+# timings reported in a Server-Timing header and a structured log line
+REQUEST_INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 1.0 if DEBUG else 0.05)),
+    'SERVER_TIMING': True,
+    'LOG': True,
+}
+
+# Prometheus metrics (core.metrics) served at /api/core/metrics/. With
+# several worker processes, point METRICS_DIR at a directory they share.
+# Query and cache counts come from the requests sampled by
+# REQUEST_INSTRUMENTATION unless COLLECT_ALL is set.
+METRICS = {
+    'ENABLED': True,
+    'DIR': os.environ.get('METRICS_DIR') or None,
+    'FLUSH_INTERVAL': 5.0,
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+    'COLLECT_ALL': False,
+}
+
+# Slow query log (core.slowqueries): statements over THRESHOLD_MS with
+# their call site, served at /api/core/slow-queries/ and by `slow_queries`
+SLOW_QUERIES = {
+    'ENABLED': True,
+    'THRESHOLD_MS': int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)),
+    'TOP_N': 50,
+    'EXPLAIN': DEBUG,
+    'DIR': os.environ.get('SLOW_QUERY_DIR') or os.environ.get('METRICS_DIR') or None,
+}
+
+# N+1 query detection (core.nplusone); the middleware only runs with DEBUG
+NPLUSONE = {
+    'THRESHOLD': 3,
+    'RAISE': False,
+    'IGNORE': [],
+}
+
+# On-demand request profiling (core.profiling): admins send X-Profile
+# or ?_profile=1 to an /api/ route; see /api/core/profiles/
+PROFILING = {
+    'ENABLED': True,
+    'DIR': os.environ.get('PROFILING_DIR') or BASE_DIR / 'profiles',
+    'MAX_PROFILES': 100,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Test runs only report errors, not a log line per request
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('CORE_LOG_LEVEL', 'ERROR' if sys.argv[1:2] == ['test'] else 'INFO'),
+        },
+    },
+}
+
 # Cloudinary Configuration
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.environ.get('dxwa67zrc'),
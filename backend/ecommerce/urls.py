@@ -2,15 +2,18 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import batch
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/products/', include('products.urls')),
+    path('api/async/products/', include('products.async_urls')),
     path('api/orders/', include('orders.urls')),
     path('api/auth/', include('accounts.urls')),
     # path('api/cart/', include('cart.urls')),
-    # path('api/reviews/', include('reviews.urls')),
-    # path('api/core/', include('core.urls')),
+    path('api/reviews/', include('reviews.urls')),
+    path('api/core/', include('core.urls')),
+    path('api/batch/', batch, name='batch'),
 ]
 
 # Serve media files in development
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -12,6 +12,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['order_number', 'user__email', 'user__username']
     readonly_fields = ['order_number', 'created_at', 'updated_at']
+    list_select_related = ['user']
     inlines = [OrderItemInline]
     
     fieldsets = (
@@ -19,7 +20,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('order_number', 'user', 'total_amount', 'status')
         }),
         ('Contact Information', {
-            'fields': ('phone', 'email')
+            'fields': ('shipping_phone', 'shipping_email')
         }),
         ('Addresses', {
             'fields': ('shipping_address', 'billing_address')
@@ -32,3 +33,27 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product', 'product_name', 'product_sku', 'quantity', 'price']
+    fields = readonly_fields
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(OrderAdmin):
+    """
+    Read-only view of orders moved to the archive tables
+    """
+    list_filter = ['status', 'payment_status']
+    inlines = [ArchivedOrderItemInline]
+    
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
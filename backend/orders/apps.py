@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_migrate, pre_delete
+        from .sharding import delete_user_orders, prepare_shards
+
+        pre_delete.connect(delete_user_orders, sender=get_user_model(), dispatch_uid='orders.delete_user_orders')
+        post_migrate.connect(prepare_shards, sender=self, dispatch_uid='orders.prepare_shards')
@@ -0,0 +1,92 @@
+import logging
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core.retention import RetentionEngine, RetentionPolicy
+from .models import (
+    Order, OrderItem, OrderStatusHistory,
+    ArchivedOrder, ArchivedOrderItem, ArchivedOrderStatusHistory,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ['delivered', 'cancelled', 'refunded']
+
+# (live model, archive model, column holding the order id)
+ARCHIVE_TABLES = [
+    (Order, ArchivedOrder, 'id'),
+    (OrderItem, ArchivedOrderItem, 'order_id'),
+    (OrderStatusHistory, ArchivedOrderStatusHistory, 'order_id'),
+]
+
+
+def _copy_rows(source, target, key_column, order_ids, using):
+    """
+    INSERT ... SELECT the given orders' rows into the archive table.
+
+    Copying in SQL keeps every column, including created_at/updated_at,
+    byte for byte and avoids loading the rows into Python.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in source._meta.concrete_fields)
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(target._meta.db_table)} ({columns}) '
+            f'SELECT {columns} FROM {quote(source._meta.db_table)} '
+            f'WHERE {quote(key_column)} IN ({placeholders})',
+            order_ids,
+        )
+        return cursor.rowcount
+
+
+def move_orders_to_archive(order_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Move one batch of orders with their items and status history
+    from the live tables into the archive tables of the same database
+    (the orders' shard).
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+
+    with transaction.atomic(using=using):
+        for source, target, key_column in ARCHIVE_TABLES:
+            _copy_rows(source, target, key_column, order_ids, using)
+        # Children first so the order delete has nothing left to cascade
+        for source, target, key_column in reversed(ARCHIVE_TABLES):
+            source._base_manager.filter(**{f'{key_column}__in': order_ids})._raw_delete(using)
+    return len(order_ids)
+
+
+def archive_to_tables(policy, queryset):
+    """
+    Retention archiver that moves orders into the archive tables
+    """
+    return move_orders_to_archive(queryset.values_list('pk', flat=True), using=queryset.db)
+
+
+def archive_orders(days=None, batch_size=None, dry_run=False):
+    """
+    Archive closed orders older than ``days`` (ORDER_ARCHIVE_AFTER_DAYS by default)
+    """
+    policy = RetentionPolicy(
+        name='order_archive',
+        model='orders.Order',
+        field='created_at',
+        days=days if days is not None else getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 180),
+        filters={'status__in': ARCHIVABLE_STATUSES},
+        action='archive',
+        archiver='orders.archive.archive_to_tables',
+        databases='orders.sharding.shard_databases',
+    )
+    return RetentionEngine([policy], batch_size=batch_size, dry_run=dry_run).apply(policy)
+
+
+def include_archived(request):
+    """
+    Whether the caller asked for archived orders (``?include_archived=true``)
+    """
+    return request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move closed orders older than the archive age into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive age in days (default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Orders moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would move')
+
+    def handle(self, *args, **options):
+        stats = archive_orders(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{stats['rows']} orders would be archived")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {stats['archived']} orders in {stats['batches']} batches "
+                f"({stats['rows_per_second']} orders/s)"
+            ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from orders.sharding import ReshardError, get_sharding_settings, reshard
+
+
+class Command(BaseCommand):
+    help = "Move every user's orders to the shard they hash to (ORDER_SHARDING), e.g. after adding a shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Users whose orders move per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would move')
+
+    def handle(self, *args, **options):
+        shards = get_sharding_settings()['SHARDS']
+        if not shards:
+            raise CommandError('Order sharding is off: set ORDER_SHARDS or ORDER_SHARDING["SHARDS"]')
+        self.stdout.write(f"Shards: {', '.join(shards)}")
+
+        try:
+            moved = reshard(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except ReshardError as exc:
+            raise CommandError(f'Resharding stopped: {exc}')
+        verb = 'would move' if options['dry_run'] else 'moved'
+        for (source, target), count in sorted(moved.items()):
+            self.stdout.write(f'{source} -> {target}: {count} orders {verb}')
+        total = sum(moved.values())
+        if options['dry_run']:
+            self.stdout.write(f'{total} orders would move')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Moved {total} orders' if total else 'Every order is on its shard'))
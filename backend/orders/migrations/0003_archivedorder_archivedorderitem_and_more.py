@@ -0,0 +1,98 @@
+# Generated by Django 5.2.3 on 2026-10-19 04:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_orderstatushistory_remove_order_email_and_more'),
+        ('products', '0003_product_rating_average_product_rating_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order_number', models.CharField(editable=False, max_length=20, unique=True)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('shipping_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], default='pending', max_length=20)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], default='pending', max_length=20)),
+                ('payment_method', models.CharField(blank=True, max_length=50)),
+                ('payment_id', models.CharField(blank=True, max_length=100)),
+                ('shipping_first_name', models.CharField(max_length=50)),
+                ('shipping_last_name', models.CharField(max_length=50)),
+                ('shipping_email', models.EmailField(max_length=254)),
+                ('shipping_phone', models.CharField(max_length=15)),
+                ('shipping_address', models.TextField()),
+                ('shipping_city', models.CharField(max_length=100)),
+                ('shipping_state', models.CharField(max_length=100)),
+                ('shipping_postal_code', models.CharField(max_length=10)),
+                ('shipping_country', models.CharField(default='Bangladesh', max_length=100)),
+                ('billing_same_as_shipping', models.BooleanField(default=True)),
+                ('billing_first_name', models.CharField(blank=True, max_length=50)),
+                ('billing_last_name', models.CharField(blank=True, max_length=50)),
+                ('billing_email', models.EmailField(blank=True, max_length=254)),
+                ('billing_phone', models.CharField(blank=True, max_length=15)),
+                ('billing_address', models.TextField(blank=True)),
+                ('billing_city', models.CharField(blank=True, max_length=100)),
+                ('billing_state', models.CharField(blank=True, max_length=100)),
+                ('billing_postal_code', models.CharField(blank=True, max_length=10)),
+                ('billing_country', models.CharField(blank=True, max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('tracking_number', models.CharField(blank=True, max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product_name', models.CharField(max_length=200)),
+                ('product_sku', models.CharField(max_length=100)),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('comment', models.TextField(blank=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='orders.archivedorder')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Order Status Histories',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'created_at'], name='orders_arch_user_id_101d40_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedorderitem',
+            unique_together={('order', 'product')},
+        ),
+    ]
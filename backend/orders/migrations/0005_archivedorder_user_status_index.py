@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_shard_foreign_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'status'], name='orders_arch_user_id_eb23c6_idx'),
+        ),
+    ]
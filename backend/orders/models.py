@@ -7,7 +7,10 @@ from core.utils import generate_order_number
 
 User = get_user_model()
 
-class Order(TimeStampedModel):
+class OrderBase(TimeStampedModel):
+    """
+    Fields shared by live orders and their archived copies
+    """
     ORDER_STATUS = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
@@ -25,7 +28,6 @@ class Order(TimeStampedModel):
         ('refunded', 'Refunded'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     order_number = models.CharField(max_length=20, unique=True, editable=False)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
@@ -63,6 +65,28 @@ class Order(TimeStampedModel):
     notes = models.TextField(blank=True)
     tracking_number = models.CharField(max_length=100, blank=True)
     
+    class Meta:
+        abstract = True
+    
+    def __str__(self):
+        return f"Order {self.order_number}"
+    
+    @property
+    def subtotal(self):
+        return sum(item.total_price for item in self.items.all())
+    
+    @property
+    def grand_total(self):
+        return self.subtotal + self.tax_amount + self.shipping_amount - self.discount_amount
+
+# Orders may live on a shard (orders.sharding) while users and products stay
+# on the primary, so foreign keys to them carry no database constraint.
+
+class Order(OrderBase):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders', db_constraint=False)
+    
+    is_archived = False
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -75,25 +99,26 @@ class Order(TimeStampedModel):
         if not self.order_number:
             self.order_number = generate_order_number()
         super().save(*args, **kwargs)
+
+class OrderItemBase(TimeStampedModel):
+    product_name = models.CharField(max_length=200)  # Store product name at time of order
+    product_sku = models.CharField(max_length=100)   # Store SKU at time of order
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     
-    def __str__(self):
-        return f"Order {self.order_number}"
+    class Meta:
+        abstract = True
     
     @property
-    def subtotal(self):
-        return sum(item.total_price for item in self.items.all())
+    def total_price(self):
+        return self.price * self.quantity
     
-    @property
-    def grand_total(self):
-        return self.subtotal + self.tax_amount + self.shipping_amount - self.discount_amount
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name}"
 
-class OrderItem(TimeStampedModel):
+class OrderItem(OrderItemBase):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    product_name = models.CharField(max_length=200)  # Store product name at time of order
-    product_sku = models.CharField(max_length=100)   # Store SKU at time of order
-    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
-    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
     
     class Meta:
         unique_together = ['order', 'product']
@@ -104,23 +129,53 @@ class OrderItem(TimeStampedModel):
         if not self.product_sku:
             self.product_sku = self.product.sku
         super().save(*args, **kwargs)
+
+class OrderStatusHistoryBase(TimeStampedModel):
+    status = models.CharField(max_length=20, choices=OrderBase.ORDER_STATUS)
+    comment = models.TextField(blank=True)
     
-    @property
-    def total_price(self):
-        return self.price * self.quantity
+    class Meta:
+        abstract = True
     
     def __str__(self):
-        return f"{self.quantity} x {self.product_name}"
+        return f"{self.order.order_number} - {self.get_status_display()}"
 
-class OrderStatusHistory(TimeStampedModel):
+class OrderStatusHistory(OrderStatusHistoryBase):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
-    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS)
-    comment = models.TextField(blank=True)
-    updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Order Status Histories'
+
+# Archive tables: same columns as the live tables, filled by orders.archive
+# with closed orders past ORDER_ARCHIVE_AFTER_DAYS so the hot tables and
+# their indexes stay small.
+
+class ArchivedOrder(OrderBase):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders', db_constraint=False)
     
-    def __str__(self):
-        return f"{self.order.order_number} - {self.get_status_display()}"
+    is_archived = True
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            # Verified purchase checks (reviews.purchases)
+            models.Index(fields=['user', 'status']),
+        ]
+
+class ArchivedOrderItem(OrderItemBase):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    
+    class Meta:
+        unique_together = ['order', 'product']
+
+class ArchivedOrderStatusHistory(OrderStatusHistoryBase):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='status_history')
+    updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Archived Order Status Histories'
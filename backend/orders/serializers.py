@@ -1,5 +1,10 @@
 from rest_framework import serializers
-from .models import Order, OrderItem
+from core.mixins import InstrumentedSerializerMixin
+from django.db import router
+from core.writes import serialized_write
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from .sharding import shard_for_user
+from products.models import Product
 from products.serializers import ProductSerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -9,46 +14,74 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
+    is_archived = serializers.ReadOnlyField()
     
     class Meta:
         model = Order
         fields = [
             'id', 'order_number', 'total_amount', 'status', 'shipping_address',
-            'billing_address', 'phone', 'email', 'payment_method', 'payment_status',
-            'items', 'created_at', 'updated_at'
+            'billing_address', 'shipping_phone', 'shipping_email', 'payment_method', 'payment_status',
+            'items', 'is_archived', 'created_at', 'updated_at'
         ]
         read_only_fields = ['order_number', 'created_at', 'updated_at']
 
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+class ArchivedOrderSerializer(OrderSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+class CreateOrderItemSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.filter(is_active=True))
+    quantity = serializers.IntegerField(min_value=1)
+
 class CreateOrderSerializer(serializers.ModelSerializer):
-    items = serializers.ListField(write_only=True)
+    items = CreateOrderItemSerializer(many=True, write_only=True)
     
     class Meta:
         model = Order
         fields = [
-            'shipping_address', 'billing_address', 'phone', 'email',
-            'payment_method', 'items'
+            'id', 'order_number', 'total_amount', 'status',
+            'shipping_first_name', 'shipping_last_name', 'shipping_email', 'shipping_phone',
+            'shipping_address', 'shipping_city', 'shipping_state', 'shipping_postal_code',
+            'shipping_country', 'billing_address', 'payment_method', 'notes', 'items'
         ]
+        read_only_fields = ['order_number', 'total_amount', 'status']
+    
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError('An order needs at least one item.')
+        product_ids = [item['product'].pk for item in items]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError('Each product can only be ordered once per order.')
+        return items
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        validated_data['user'] = self.context['request'].user
-        
-        # Generate order number
-        import uuid
-        validated_data['order_number'] = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        
-        # Calculate total
-        total = 0
-        for item_data in items_data:
-            total += item_data['price'] * item_data['quantity']
-        validated_data['total_amount'] = total
-        
-        order = Order.objects.create(**validated_data)
-        
-        # Create order items
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        user = self.context['request'].user
+        # Prices come from the catalog, not the client
+        validated_data['total_amount'] = sum(item['product'].price * item['quantity'] for item in items_data)
         
+        # The order and its items go to the user's shard together, one
+        # writer at a time
+        using = shard_for_user(user.pk) or router.db_for_write(Order)
+        with serialized_write(using):
+            order = Order.objects.db_manager(using).create(user=user, **validated_data)
+            OrderItem.objects.db_manager(using).bulk_create([
+                OrderItem(
+                    order=order,
+                    product=item['product'],
+                    product_name=item['product'].name,
+                    product_sku=item['product'].sku,
+                    quantity=item['quantity'],
+                    price=item['product'].price,
+                )
+                for item in items_data
+            ])
         return order
@@ -0,0 +1,328 @@
+"""
+Horizontal sharding of orders by user (DATABASE_ROUTERS).
+
+With ORDER_SHARDING['SHARDS'] set, every model of the orders app lives
+on one of the shard aliases, picked by a stable hash of the user id, so
+all of a user's orders, items, status history and archived orders share
+a database. Users, products and everything else stay on the primary; the
+foreign keys pointing there have no database constraint.
+
+Code that knows the user routes explicitly with user_orders() or
+shard_for_user(); the router follows instances, so ``user.orders``,
+prefetches and saves of loaded orders land on the right shard. Queries
+that span users go through scatter() and run once per shard.
+
+Shards hand out ids from disjoint ranges (prepare_shard(), run after
+every migrate), so rows keep their ids when reshard() moves them. Rows
+created before a shard got its range may share ids with another shard;
+reshard() stops before moving such a row onto one of them.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.dispatch import receiver
+
+from core.sampledata import preserve_timestamps
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SHARDS': [],             # database aliases holding orders, in a fixed order
+    'ID_SPAN': 10 ** 12,      # ids of shard n start at n * ID_SPAN
+    'BATCH_SIZE': 500,        # orders moved per batch when resharding
+}
+
+APP_LABEL = 'orders'
+
+_config = None
+
+
+def get_sharding_settings():
+    """
+    ORDER_SHARDING settings merged over the defaults, computed once and
+    reset on setting changes (the router reads them for every query)
+    """
+    global _config
+    if _config is None:
+        config = DEFAULTS.copy()
+        config.update(getattr(settings, 'ORDER_SHARDING', {}))
+        config['SHARDS'] = tuple(config['SHARDS'])
+        _config = config
+    return _config
+
+
+@receiver(setting_changed)
+def _reset_config(setting, **kwargs):
+    global _config
+    if setting in ('ORDER_SHARDING', 'DATABASES'):
+        _config = None
+
+
+def is_sharded(model):
+    return model._meta.app_label == APP_LABEL
+
+
+def sharded_models():
+    return list(apps.get_app_config(APP_LABEL).get_models())
+
+
+def jump_hash(key, buckets):
+    """
+    Jump consistent hash (Lamping & Veach): growing from n to n + 1
+    buckets moves only 1/(n + 1) of the keys, all to the new bucket
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for_user(user_id, shards=None):
+    """
+    The alias holding ``user_id``'s orders, or None when sharding is off.
+    Python's hash() differs between processes, so the key is a digest.
+    """
+    shards = get_sharding_settings()['SHARDS'] if shards is None else shards
+    if not shards:
+        return None
+    key = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'big')
+    return shards[jump_hash(key, len(shards))]
+
+
+def shard_databases():
+    """
+    Every database holding orders
+    """
+    return list(get_sharding_settings()['SHARDS']) or [DEFAULT_DB_ALIAS]
+
+
+def user_orders(user, model=None):
+    """
+    ``model`` rows (Order by default) of ``user``, on the user's shard
+    """
+    model = model or apps.get_model(APP_LABEL, 'Order')
+    return model._default_manager.db_manager(shard_for_user(user.pk)).filter(user=user)
+
+
+def scatter(query, shards=None):
+    """
+    Run ``query(alias)`` on every shard concurrently and return the
+    results in shard order
+    """
+    shards = shards or shard_databases()
+    if len(shards) == 1:
+        return [query(shards[0])]
+
+    def run(alias):
+        # Worker threads open their own connections; close them after use
+        try:
+            return query(alias)
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='shard') as executor:
+        return list(executor.map(run, shards))
+
+
+class ShardRouter:
+    """
+    Send queries on orders models to the shard of the instance or user
+    they are about; related rows of other apps to the primary
+    """
+    def _shard(self, hints):
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if isinstance(instance, get_user_model()):
+            return shard_for_user(instance.pk)
+        if is_sharded(type(instance)):
+            if instance._state.db:
+                return instance._state.db
+            if getattr(instance, 'user_id', None) is not None:
+                return shard_for_user(instance.user_id)
+        return None
+
+    def _route(self, model, hints):
+        shards = get_sharding_settings()['SHARDS']
+        if not shards:
+            return None
+        if is_sharded(model):
+            return self._shard(hints)
+        # Products and users of orders loaded from a shard
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in shards and instance._state.db != DEFAULT_DB_ALIAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if get_sharding_settings()['SHARDS'] and (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+                return obj1._state.db == obj2._state.db
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        shards = get_sharding_settings()['SHARDS']
+        if db != DEFAULT_DB_ALIAS and db in shards:
+            return app_label == APP_LABEL
+        return None
+
+
+class ReshardError(Exception):
+    pass
+
+
+def prepare_shard(alias):
+    """
+    Start the id sequences of ``alias`` at its range, ``index * ID_SPAN``,
+    unless they are past it already
+    """
+    config = get_sharding_settings()
+    floor = config['SHARDS'].index(alias) * config['ID_SPAN']
+    if not floor:
+        return
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    tables = set(connection.introspection.table_names())
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for model in sharded_models():
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            if connection.vendor == 'sqlite':
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s AND seq < %s', [table, floor])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                    [table, floor, table],
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f'GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {quote(table)})))',
+                    [table, floor],
+                )
+            else:
+                raise NotImplementedError(f'Cannot set id ranges on {connection.vendor}')
+
+
+def prepare_shards(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate: give a shard its id range once its tables exist
+    """
+    if using in get_sharding_settings()['SHARDS']:
+        prepare_shard(using)
+
+
+def _copy(model, rows, owner, target):
+    """
+    Insert ``rows`` on ``target`` with their ids. Rows already there with
+    the same ``owner`` are copies from an interrupted move and are
+    skipped; a different row with the same id stops the move.
+    """
+    existing = dict(model._base_manager.using(target).filter(pk__in=[row.pk for row in rows]).values_list('pk', owner))
+    clashes = sorted(row.pk for row in rows if row.pk in existing and existing[row.pk] != getattr(row, owner))
+    if clashes:
+        raise ReshardError(
+            f'{model._meta.label} ids {clashes[:10]} are taken on {target}; '
+            f'run prepare_shard() on every shard before adding rows'
+        )
+    model._base_manager.using(target).bulk_create([row for row in rows if row.pk not in existing])
+
+
+def _move(order_model, user_ids, source, target):
+    """
+    Copy the orders of ``user_ids`` with their child rows from ``source``
+    to ``target``, then delete them from ``source``. Rows keep their ids;
+    copies already on ``target`` are skipped, so an interrupted move can
+    be run again. Nothing is deleted unless every row is on ``target``.
+    """
+    children = [
+        field.related_model for field in order_model._meta.related_objects
+        if is_sharded(field.related_model)
+    ]
+    orders = list(order_model._base_manager.using(source).filter(user_id__in=user_ids))
+    if not orders:
+        return 0
+    order_ids = [order.pk for order in orders]
+
+    with preserve_timestamps(order_model, *children), transaction.atomic(using=target):
+        _copy(order_model, orders, 'user_id', target)
+        for child in children:
+            _copy(child, list(child._base_manager.using(source).filter(order_id__in=order_ids)), 'order_id', target)
+    with transaction.atomic(using=source):
+        for child in children:
+            child._base_manager.using(source).filter(order_id__in=order_ids)._raw_delete(source)
+        return order_model._base_manager.using(source).filter(pk__in=order_ids)._raw_delete(source)
+
+
+def misplaced_users(alias):
+    """
+    Ids of users with orders on ``alias`` that belong on another shard,
+    by target shard
+    """
+    Order = apps.get_model(APP_LABEL, 'Order')
+    ArchivedOrder = apps.get_model(APP_LABEL, 'ArchivedOrder')
+    user_ids = set()
+    for model in (Order, ArchivedOrder):
+        user_ids.update(model._base_manager.using(alias).values_list('user_id', flat=True).distinct())
+    moves = {}
+    for user_id in sorted(user_ids):
+        target = shard_for_user(user_id)
+        if target != alias:
+            moves.setdefault(target, []).append(user_id)
+    return moves
+
+
+def reshard(batch_size=None, dry_run=False):
+    """
+    Move every user's orders to the shard they hash to, e.g. after adding
+    a shard; returns {(source, target): orders moved}
+    """
+    config = get_sharding_settings()
+    if not config['SHARDS']:
+        raise ValueError('ORDER_SHARDING has no shards')
+    batch_size = batch_size or config['BATCH_SIZE']
+    for alias in config['SHARDS']:
+        prepare_shard(alias)
+
+    Order = apps.get_model(APP_LABEL, 'Order')
+    ArchivedOrder = apps.get_model(APP_LABEL, 'ArchivedOrder')
+    moved = {}
+    for source in shard_databases():
+        for target, user_ids in misplaced_users(source).items():
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                if dry_run:
+                    count = Order._base_manager.using(source).filter(user_id__in=batch).count()
+                else:
+                    count = _move(Order, batch, source, target) + _move(ArchivedOrder, batch, source, target)
+                moved[(source, target)] = moved.get((source, target), 0) + count
+            logger.info(f'Resharding: {moved[(source, target)]} orders from {source} to {target}')
+    return moved
+
+
+def delete_user_orders(sender, instance, using, **kwargs):
+    """
+    Deleting a user cascades to its orders on the primary only; remove
+    the ones on its shard as well
+    """
+    shard = shard_for_user(instance.pk)
+    if shard is None or shard == using:
+        return
+    for model in (apps.get_model(APP_LABEL, 'Order'), apps.get_model(APP_LABEL, 'ArchivedOrder')):
+        model._base_manager.using(shard).filter(user_id=instance.pk).delete()
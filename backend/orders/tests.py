@@ -1,3 +1,281 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.testing import PerformanceTestCase, seed_dataset
+from products.models import Category, Product
+from reviews.models import Review
+from reviews.purchases import backfill_verified_purchases
+
+from .archive import archive_orders
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .sharding import prepare_shard, shard_for_user, sharded_models
+
+User = get_user_model()
+
+
+class OrderEndpointBudgetTests(PerformanceTestCase):
+    def setUp(self):
+        self.order = self.customer.orders.order_by('id').first()
+
+    def test_order_list(self):
+        self.assertBudget('/api/orders/', queries=6, ms=300, user=self.customer)
+
+    def test_order_list_with_archive(self):
+        self.assertBudget('/api/orders/?include_archived=true', queries=7, ms=300, user=self.customer)
+
+    def test_order_detail(self):
+        self.assertBudget(f'/api/orders/{self.order.pk}/', queries=5, ms=150, user=self.customer)
+
+    def test_order_invoice(self):
+        self.assertBudget(f'/api/orders/{self.order.pk}/invoice/', queries=5, ms=150, user=self.customer)
+
+    def test_other_users_order_is_not_found(self):
+        self.assertBudget(f'/api/orders/{self.order.pk}/', queries=1, ms=50, user=self.admin, status=404)
+
+
+class OrderArchiveTests(PerformanceTestCase):
+    def setUp(self):
+        Order.objects.filter(user=self.customer).update(created_at=timezone.now() - timedelta(days=400))
+        orders = self.customer.orders.order_by('id')
+        self.old = list(orders.filter(status='delivered'))
+        self.kept = list(orders.filter(status='processing'))
+
+    def test_closed_old_orders_move_to_the_archive(self):
+        items = {order.pk: order.items.count() for order in self.old}
+        stats = archive_orders(days=30)
+        self.assertGreaterEqual(stats['archived'], len(self.old))
+
+        self.assertEqual(set(self.customer.orders.values_list('id', flat=True)), {order.pk for order in self.kept})
+        for order in self.old:
+            archived = ArchivedOrder.objects.get(pk=order.pk)
+            self.assertEqual((archived.order_number, archived.created_at), (order.order_number, order.created_at))
+            self.assertEqual(ArchivedOrderItem.objects.filter(order=archived).count(), items[order.pk])
+        self.assertFalse(OrderItem.objects.filter(order_id__in=items).exists())
+
+    def test_archived_orders_are_served_on_request(self):
+        archive_orders(days=30)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/orders/').data['count'], len(self.kept))
+        listed = self.client.get('/api/orders/?include_archived=true').data
+        self.assertEqual(listed['count'], len(self.old) + len(self.kept))
+
+        order = self.old[0]
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}/').status_code, 404)
+        response = self.client.get(f'/api/orders/{order.pk}/?include_archived=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order_number'], order.order_number)
+
+
+# Two order shards next to the default database, registered before the
+# test runner sets up the databases so it creates and migrates them
+SHARDS = ('orders_a', 'orders_b')
+for alias in SHARDS:
+    connections.settings[alias] = dict(
+        connections.settings['default'],
+        TEST=dict(
+            connections.settings['default']['TEST'],
+            NAME=os.path.join(tempfile.gettempdir(), f'test_{alias}_{os.getpid()}.sqlite3'),
+        ),
+    )
+
+SHARDING = {'SHARDS': ['default', *SHARDS], 'BATCH_SIZE': 3}
+
+
+class ShardHashTests(SimpleTestCase):
+    def test_users_hash_to_a_stable_shard(self):
+        shards = ['default', *SHARDS]
+        placement = [shard_for_user(user_id, shards) for user_id in range(300)]
+        self.assertEqual(placement, [shard_for_user(user_id, shards) for user_id in range(300)])
+        self.assertEqual(set(placement), set(shards))
+        self.assertIsNone(shard_for_user(1, []))
+
+    def test_adding_a_shard_only_moves_users_to_it(self):
+        before = {user_id: shard_for_user(user_id, ['default', 'orders_a']) for user_id in range(1000)}
+        after = {user_id: shard_for_user(user_id, ['default', 'orders_a', 'orders_b']) for user_id in range(1000)}
+        moved = [user_id for user_id in before if before[user_id] != after[user_id]]
+        self.assertEqual({after[user_id] for user_id in moved}, {'orders_b'})
+        self.assertLess(len(moved), 450)
+
+
+@override_settings(RATE_LIMIT={'ENABLED': False}, ORDER_SHARDING=SHARDING)
+class OrderShardingTests(TransactionTestCase):
+    databases = {'default', *SHARDS}
+
+    def create_users(self, count=6):
+        return [
+            # Clients authenticate with tokens; no password to hash
+            User.objects.create(username=f'shard-user-{n}', email=f'shard-user-{n}@example.com')
+            for n in range(count)
+        ]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def place_order(self, user, products):
+        return self.client_for(user).post('/api/orders/create/', {
+            'shipping_first_name': 'Shard', 'shipping_last_name': 'Test', 'shipping_email': user.email,
+            'shipping_phone': '0123456789', 'shipping_address': '1 Test Street', 'shipping_city': 'Dhaka',
+            'shipping_state': 'Dhaka', 'shipping_postal_code': '1000',
+            'items': [{'product': product.pk, 'quantity': 2} for product in products],
+        }, format='json')
+
+    def catalog(self):
+        category = Category.objects.create(name='Sharding', slug='sharding')
+        return [
+            Product.objects.create(
+                name=f'Sharded {n}', slug=f'sharded-{n}', description='-', category=category,
+                price=Decimal('10.00') * (n + 1), stock_quantity=10, sku=f'SHARD-{n}',
+            )
+            for n in range(2)
+        ]
+
+    def restart_ids(self, alias, seq):
+        # Sequences as a shard that never got its id range would have them
+        with connections[alias].cursor() as cursor:
+            for model in sharded_models():
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [model._meta.db_table])
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [model._meta.db_table, seq])
+
+    def orders_by_shard(self):
+        return {alias: set(Order.objects.using(alias).values_list('user_id', flat=True)) for alias in SHARDING['SHARDS']}
+
+    def test_orders_are_created_and_read_on_the_users_shard(self):
+        for alias in SHARDING['SHARDS']:
+            prepare_shard(alias)
+        products = self.catalog()
+        users = self.create_users()
+        for user in users:
+            response = self.place_order(user, products)
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(response.data['total_amount'], '60.00')
+
+        placement = self.orders_by_shard()
+        for user in users:
+            shard = shard_for_user(user.pk)
+            self.assertIn(user.pk, placement[shard])
+            self.assertEqual(OrderItem.objects.using(shard).filter(order__user_id=user.pk).count(), 2)
+        self.assertGreater(sum(1 for user_ids in placement.values() if user_ids), 1)
+        # Shards hand out ids from their own range
+        order_ids = [order_id for alias in SHARDING['SHARDS'] for order_id in Order.objects.using(alias).values_list('id', flat=True)]
+        self.assertEqual(len(order_ids), len(set(order_ids)))
+
+        for user in users:
+            client = self.client_for(user)
+            orders = client.get('/api/orders/').data['results']
+            self.assertEqual(len(orders), 1)
+            self.assertEqual([item['product']['name'] for item in orders[0]['items']], ['Sharded 0', 'Sharded 1'])
+            self.assertEqual(client.get(f"/api/orders/{orders[0]['id']}/").status_code, 200)
+            self.assertEqual(client.get(f"/api/orders/{orders[0]['id']}/invoice/").status_code, 200)
+            self.assertEqual(user.orders.count(), 1)
+        other_order = Order.objects.using(shard_for_user(users[0].pk)).get(user=users[0])
+        self.assertEqual(self.client_for(users[1]).get(f'/api/orders/{other_order.pk}/').status_code, 404)
+
+        admin = User.objects.create_superuser(username='shard-admin', email='shard-admin@example.com', password='pass')
+        self.assertEqual(self.client_for(admin).get('/api/core/stats/').data['total_orders'], len(users))
+
+    def test_reshard_moves_orders_to_their_shard(self):
+        with override_settings(ORDER_SHARDING={'SHARDS': []}):
+            data = seed_dataset(categories=1, products_per_category=4, customers=8, reviews_per_product=0,
+                                orders_per_customer=2, items_per_order=2)
+            customer = data['customer']
+            before = self.client_for(customer).get('/api/orders/').data
+        self.assertEqual(before['count'], 2)
+        order_ids = set(Order.objects.values_list('id', flat=True))
+        item_count = OrderItem.objects.count()
+
+        misplaced = Order.objects.exclude(user_id__in=[
+            user_id for user_id in Order.objects.values_list('user_id', flat=True) if shard_for_user(user_id) == 'default'
+        ]).count()
+        self.assertGreater(misplaced, 0)
+        output = io.StringIO()
+        call_command('reshard_orders', stdout=output)
+        self.assertIn(f'Moved {misplaced} orders', output.getvalue())
+
+        placement = self.orders_by_shard()
+        for alias, user_ids in placement.items():
+            self.assertTrue(all(shard_for_user(user_id) == alias for user_id in user_ids))
+        self.assertEqual(
+            {order_id for alias in SHARDING['SHARDS'] for order_id in Order.objects.using(alias).values_list('id', flat=True)},
+            order_ids,
+        )
+        self.assertEqual(sum(OrderItem.objects.using(alias).count() for alias in SHARDING['SHARDS']), item_count)
+        self.assertEqual(self.client_for(customer).get('/api/orders/').data, before)
+
+        output = io.StringIO()
+        call_command('reshard_orders', stdout=output)
+        self.assertIn('Every order is on its shard', output.getvalue())
+
+    def test_migrate_gives_shards_their_id_range(self):
+        self.restart_ids('orders_a', 0)
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='orders_a')
+        products = self.catalog()
+        user = next(user for user in self.create_users(12) if shard_for_user(user.pk) == 'orders_a')
+        self.assertEqual(self.place_order(user, products).status_code, 201)
+        self.assertGreaterEqual(Order.objects.using('orders_a').get(user=user).pk, 10 ** 12)
+
+    def test_reshard_stops_on_clashing_ids(self):
+        two_shards = ['default', 'orders_a']
+        users = self.create_users(40)
+        movers = [
+            next(user for user in users if shard_for_user(user.pk, two_shards) == alias and shard_for_user(user.pk) == 'orders_b')
+            for alias in two_shards
+        ]
+        products = self.catalog()
+        with override_settings(ORDER_SHARDING=dict(SHARDING, SHARDS=two_shards)):
+            for alias in two_shards:
+                self.restart_ids(alias, 1000)
+            for user in movers:
+                self.assertEqual(self.place_order(user, products).status_code, 201)
+        orders = {alias: list(Order.objects.using(alias).values_list('id', 'user_id')) for alias in two_shards}
+        self.assertEqual(orders['default'][0][0], orders['orders_a'][0][0])
+
+        with self.assertRaisesMessage(CommandError, 'are taken on orders_b'):
+            call_command('reshard_orders', stdout=io.StringIO())
+        # The clashing order stays where it was; nothing is lost
+        remaining = {alias: list(Order.objects.using(alias).values_list('id', 'user_id')) for alias in SHARDING['SHARDS']}
+        self.assertEqual(sorted(row for rows in remaining.values() for row in rows),
+                         sorted(row for rows in orders.values() for row in rows))
+        self.assertEqual(sum(OrderItem.objects.using(alias).count() for alias in SHARDING['SHARDS']), 4)
+
+    def test_verified_purchases_are_checked_on_the_users_shard(self):
+        products = self.catalog()
+        users = [user for user in self.create_users(12) if shard_for_user(user.pk) != 'default'][:2]
+        for user in users:
+            self.assertEqual(self.place_order(user, products[:1]).status_code, 201)
+        Order.objects.using(shard_for_user(users[0].pk)).filter(user=users[0]).update(status='delivered')
+
+        for user in users:
+            response = self.client_for(user).post(f'/api/reviews/product/{products[0].slug}/create/',
+                                                  {'rating': 4, 'title': 'Good', 'content': 'Good'}, format='json')
+            self.assertEqual(response.status_code, 201)
+        verified = lambda: dict(Review.objects.values_list('user_id', 'is_verified_purchase'))
+        self.assertEqual(verified(), {users[0].pk: True, users[1].pk: False})
+
+        Order.objects.using(shard_for_user(users[1].pk)).filter(user=users[1]).update(status='delivered')
+        Review.objects.filter(user=users[0]).update(is_verified_purchase=False)
+        self.assertEqual(backfill_verified_purchases(batch_size=1), {'verified': 2, 'unverified': 0})
+        self.assertEqual(verified(), {users[0].pk: True, users[1].pk: True})
+
+    def test_deleting_a_user_deletes_their_sharded_orders(self):
+        products = self.catalog()
+        user = next(user for user in self.create_users(12) if shard_for_user(user.pk) != 'default')
+        self.assertEqual(self.place_order(user, products).status_code, 201)
+        shard = shard_for_user(user.pk)
+
+        user.delete()
+        self.assertFalse(Order.objects.using(shard).exists())
+        self.assertFalse(OrderItem.objects.using(shard).exists())
@@ -1,23 +1,87 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
-from .models import Order
-from .serializers import OrderSerializer, CreateOrderSerializer
+from django.db.models import BooleanField, Count, Prefetch, Q, Value
+from django.http import Http404
+from .archive import include_archived
+from .models import ArchivedOrder
+from .serializers import OrderSerializer, ArchivedOrderSerializer, CreateOrderSerializer
+from .sharding import user_orders
+from products.models import Category
+
+ORDER_PREFETCH = [
+    # Active product counts for CategorySerializer, instead of a query per item
+    Prefetch('items__product__category', queryset=Category.objects.annotate(
+        active_product_count=Count('products', filter=Q(products__is_active=True)),
+    )),
+    'items__product__images',
+]
+
+def get_user_order(request, pk):
+    """
+    Fetch one of the user's orders from their shard, falling back to the
+    archive when asked
+    """
+    order = user_orders(request.user).filter(pk=pk).prefetch_related(*ORDER_PREFETCH).first()
+    if order is None and include_archived(request):
+        order = user_orders(request.user, ArchivedOrder).filter(pk=pk).prefetch_related(*ORDER_PREFETCH).first()
+    if order is None:
+        raise Http404('No Order matches the given query.')
+    return order
+
+def serialize_order(order, **kwargs):
+    serializer_class = ArchivedOrderSerializer if order.is_archived else OrderSerializer
+    return serializer_class(order, **kwargs).data
 
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return user_orders(self.request.user).prefetch_related(*ORDER_PREFETCH)
+
+    def list(self, request, *args, **kwargs):
+        if not include_archived(request):
+            return super().list(request, *args, **kwargs)
+
+        # Page over (id, created_at) keys from both tables, then load only
+        # the orders on the requested page from whichever table holds them.
+        hot = user_orders(request.user).annotate(
+            archived=Value(False, output_field=BooleanField())
+        ).order_by().values_list('id', 'created_at', 'archived')
+        cold = user_orders(request.user, ArchivedOrder).annotate(
+            archived=Value(True, output_field=BooleanField())
+        ).order_by().values_list('id', 'created_at', 'archived')
+        keys = hot.union(cold, all=True).order_by('-created_at', '-id')
+
+        page = self.paginate_queryset(keys)
+        rows = page if page is not None else list(keys)
+        hot_ids = [pk for pk, _, archived in rows if not archived]
+        cold_ids = [pk for pk, _, archived in rows if archived]
+        orders = {
+            **{(o.pk, False): o for o in self.get_queryset().filter(pk__in=hot_ids)},
+            **{(o.pk, True): o for o in user_orders(request.user, ArchivedOrder).filter(pk__in=cold_ids).prefetch_related(*ORDER_PREFETCH)},
+        }
+        context = self.get_serializer_context()
+        data = [
+            serialize_order(orders[(pk, bool(archived))], context=context)
+            for pk, _, archived in rows
+            if (pk, bool(archived)) in orders
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
 
 class OrderDetailView(generics.RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return user_orders(self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        order = get_user_order(request, kwargs['pk'])
+        return Response(serialize_order(order, context=self.get_serializer_context()))
 
 class CreateOrderView(generics.CreateAPIView):
     serializer_class = CreateOrderSerializer
@@ -26,8 +90,7 @@ class CreateOrderView(generics.CreateAPIView):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def order_invoice(request, pk):
-    order = get_object_or_404(Order, pk=pk, user=request.user)
+    order = get_user_order(request, pk)
     # Generate PDF invoice logic here
     # For now, return order data
-    serializer = OrderSerializer(order)
-    return Response(serializer.data)
+    return Response(serialize_order(order, context={'request': request}))
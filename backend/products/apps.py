@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .caching import drop_cached_product
+        from .models import Product
+
+        # The async catalog caches product sections for CACHE_TIMEOUT
+        post_save.connect(drop_cached_product, sender=Product, dispatch_uid='products.drop_cached_product')
+        post_delete.connect(drop_cached_product, sender=Product, dispatch_uid='products.drop_cached_product')
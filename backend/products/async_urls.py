@@ -0,0 +1,15 @@
+from django.urls import path
+from . import async_views
+
+# Async catalog reads, served at /api/async/products/ with the same paths
+# and payloads as the sync endpoints in urls.py
+app_name = 'products_async'
+
+urlpatterns = [
+    path('', async_views.product_list, name='product_list'),
+    path('featured/', async_views.featured_products, name='featured_products'),
+    path('search-suggestions/', async_views.product_search_suggestions, name='product_search_suggestions'),
+    path('<slug:slug>/', async_views.product_detail, name='product_detail'),
+    path('<slug:slug>/related/', async_views.related_products, name='related_products'),
+    path('<slug:slug>/quick-view/', async_views.product_quick_view, name='product_quick_view'),
+]
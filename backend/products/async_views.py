@@ -0,0 +1,349 @@
+"""
+Async versions of the hot catalog read endpoints, for the ASGI application.
+
+They return the same payloads as their sync counterparts in views.py but
+use the async ORM and cache APIs, so a worker keeps serving other
+requests while one waits on the database or the cache. Serialization
+works on prefetched rows and stored aggregates and does no I/O of its own.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from accounts.authentication import CachedJWTAuthentication
+from reviews.models import Review, ReviewHelpful
+from reviews.serializers import ReviewSerializer
+from reviews.views import ReviewPagination
+
+from .caching import CACHE_PREFIX, hashed_key
+from .filters import ProductFilter
+from .models import Category, Product
+from .serializers import ProductImageSerializer, ProductListSerializer, ProductSerializer
+from .views import CACHE_TIMEOUT, SUGGESTION_QUERY_MAX_LENGTH, ProductListView, ProductPagination
+
+# Review sections change with every new review, so they expire sooner
+REVIEWS_CACHE_TIMEOUT = 60
+PAGE_SECTIONS = ('product', 'related', 'reviews', 'rating_breakdown')
+# The query parameters the product list reads; the rest don't change it
+LIST_PARAMS = frozenset([
+    *ProductFilter.base_filters, SearchFilter.search_param, OrderingFilter.ordering_param,
+    ProductPagination.page_query_param, ProductPagination.page_size_query_param,
+])
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def _json(data, status=200):
+    # DRF's encoder, so decimals and dates match the sync endpoints
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _not_found(message='Product not found'):
+    return _json({'error': message}, status=404)
+
+
+async def _cached(key, timeout, build):
+    """
+    The payload cached under ``key``, built and stored on a miss.
+    ``build`` returns None for responses that must not be cached.
+    """
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        if data is not None:
+            await cache.aset(key, data, timeout)
+    return data
+
+
+def _list_query(request):
+    """
+    The list's query string with only the parameters it reads, sorted, so
+    unknown parameters and their order don't add cache entries
+    """
+    return urlencode(sorted(
+        (name, values) for name, values in request.GET.lists() if name in LIST_PARAMS
+    ), doseq=True)
+
+
+def _filtered_products(request):
+    """
+    ProductListView's queryset with its filter, search and ordering
+    backends applied. Filter validation may query (category choices), so
+    this runs in a thread.
+    """
+    view = ProductListView(request=Request(request), args=(), kwargs={}, format_kwarg=None)
+    return view.filter_queryset(view.get_queryset())
+
+
+async def _paginate(request, queryset, query):
+    """
+    ProductPagination's page, count and links, with async queries. The
+    links carry ``query`` rather than the request's own query string.
+    """
+    pagination = ProductPagination
+    try:
+        page_size = min(int(request.GET[pagination.page_size_query_param]), pagination.max_page_size)
+        if page_size <= 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        page_size = pagination.page_size
+
+    count = await queryset.acount()
+    pages = max((count + page_size - 1) // page_size, 1)
+    page = request.GET.get(pagination.page_query_param, 1)
+    try:
+        page = pages if page in pagination.last_page_strings else int(page)
+    except ValueError:
+        page = 0
+    if not 1 <= page <= pages:
+        return None
+
+    offset = (page - 1) * page_size
+    results = await _alist(queryset[offset:offset + page_size])
+    url = request.build_absolute_uri(f'{request.path}?{query}' if query else request.path)
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, pagination.page_query_param)
+    else:
+        previous_url = replace_query_param(url, pagination.page_query_param, page - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, pagination.page_query_param, page + 1) if page < pages else None,
+        'previous': previous_url,
+        'results': results,
+    }
+
+
+@require_GET
+async def product_list(request):
+    """
+    List active products with ProductListView's filters, search, ordering
+    and pagination
+    """
+    query = _list_query(request)
+
+    async def build():
+        try:
+            queryset = await sync_to_async(_filtered_products)(request)
+        except ValidationError as exc:
+            return {'status': 400, 'data': exc.detail}
+        page = await _paginate(request, queryset, query)
+        if page is None:
+            return {'status': 404, 'data': {'detail': 'Invalid page.'}}
+        page['results'] = ProductListSerializer(page['results'], many=True, context={'request': request}).data
+        return {'status': 200, 'data': page}
+
+    result = await _cached(hashed_key('list', query), CACHE_TIMEOUT, build)
+    return _json(result['data'], status=result['status'])
+
+
+async def _detail_data(request, slug):
+    """
+    The cached ProductSerializer payload of an active product, or None
+    """
+    async def build():
+        try:
+            product = await Product.objects.filter(is_active=True).select_related('category').prefetch_related(
+                'images'
+            ).aget(slug=slug)
+        except Product.DoesNotExist:
+            return None
+        product.category.active_product_count = await Product.objects.filter(
+            category_id=product.category_id, is_active=True,
+        ).acount()
+        return ProductSerializer(product, context={'request': request}).data
+
+    return await _cached(f'{CACHE_PREFIX}:detail:{slug}', CACHE_TIMEOUT, build)
+
+
+async def _related_data(request, product_id, category_id):
+    related = await _alist(
+        Product.objects.filter(category_id=category_id, is_active=True)
+        .exclude(id=product_id).select_related('category').prefetch_related('images')[:6]
+    )
+    return {
+        'count': len(related),
+        'results': ProductListSerializer(related, many=True, context={'request': request}).data,
+    }
+
+
+@require_GET
+async def product_detail(request, slug):
+    """
+    Retrieve a single active product by slug
+    """
+    data = await _detail_data(request, slug)
+    if data is None:
+        return _json({'detail': 'No Product matches the given query.'}, status=404)
+    return _json(data)
+
+
+@require_GET
+async def featured_products(request):
+    """
+    Get featured products
+    """
+    async def build():
+        products = await _alist(
+            Product.objects.filter(is_featured=True, is_active=True)
+            .select_related('category').prefetch_related('images')[:8]
+        )
+        return {
+            'count': len(products),
+            'results': ProductListSerializer(products, many=True, context={'request': request}).data,
+        }
+
+    return _json(await _cached(f'{CACHE_PREFIX}:featured', CACHE_TIMEOUT, build))
+
+
+@require_GET
+async def related_products(request, slug):
+    """
+    Get products related to the given product (same category)
+    """
+    try:
+        product = await Product.objects.only('id', 'category_id').aget(slug=slug, is_active=True)
+    except Product.DoesNotExist:
+        return _not_found()
+    return _json(await _related_data(request, product.id, product.category_id))
+
+
+@require_GET
+async def product_quick_view(request, slug):
+    """
+    Get basic product info for quick view modal
+    """
+    try:
+        product = await Product.objects.select_related('category').prefetch_related('images').aget(
+            slug=slug, is_active=True,
+        )
+    except Product.DoesNotExist:
+        return _not_found()
+    return _json({
+        'id': product.id,
+        'name': product.name,
+        'slug': product.slug,
+        'short_description': product.short_description,
+        'price': product.price,
+        'compare_price': product.compare_price,
+        'stock_quantity': product.stock_quantity,
+        'images': ProductImageSerializer(product.images.all()[:3], many=True, context={'request': request}).data,
+        'category': product.category.name,
+        'average_rating': product.average_rating,
+        'review_count': product.review_count,
+        'is_in_stock': product.is_in_stock,
+        'discount_percentage': product.discount_percentage,
+    })
+
+
+@require_GET
+async def product_search_suggestions(request):
+    """
+    Get search suggestions based on query
+    """
+    query = request.GET.get('q', '').strip()[:SUGGESTION_QUERY_MAX_LENGTH]
+    if len(query) < 2:
+        return _json({'suggestions': []})
+
+    async def build():
+        products = await _alist(Product.objects.filter(
+            Q(name__icontains=query) | Q(category__name__icontains=query),
+            is_active=True,
+        ).values('name', 'slug')[:10])
+        categories = await _alist(
+            Category.objects.filter(name__icontains=query, is_active=True).values('name', 'slug')[:5]
+        )
+        return {'suggestions': {'products': products, 'categories': categories}}
+
+    return _json(await _cached(hashed_key('suggestions', query.lower()), CACHE_TIMEOUT, build))
+
+
+async def _reviews_data(request, product_id, slug, rating_breakdown):
+    """
+    The first page of ProductReviewsView, with the same links
+    """
+    paginator = ReviewPagination()
+    queryset = Review.objects.filter(product_id=product_id).select_related('user__userprofile').prefetch_related('images')
+    url = request.build_absolute_uri(reverse('product_reviews', kwargs={'product_slug': slug}))
+    reviews = paginator.finish_page(await _alist(paginator.page_queryset(queryset, url)))
+    return {
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': ReviewSerializer(reviews, many=True, context={'request': request}).data,
+        'rating_breakdown': rating_breakdown,
+    }
+
+
+@require_GET
+async def product_page(request, slug):
+    """
+    Everything a product page shows in one request: the product detail,
+    related products, the first page of reviews and the rating breakdown.
+
+    The product is resolved once (from the cached detail payload, which
+    carries the stored rating breakdown) and the other sections are
+    fetched concurrently, each cached on its own.
+    ``?sections=product,reviews`` limits the response to some sections.
+    """
+    requested = [name for name in request.GET.get('sections', '').split(',') if name in PAGE_SECTIONS]
+    requested = requested or list(PAGE_SECTIONS)
+
+    try:
+        authenticated = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken) as exc:
+        return _json(exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}, status=401)
+    user = authenticated[0] if authenticated else None
+    # Like DRF, so serializers see the token's user instead of the session's
+    request.user = user or AnonymousUser()
+
+    product = await _detail_data(request, slug)
+    if product is None:
+        return _json({'detail': 'No Product matches the given query.'}, status=404)
+    product_id, category_id = product['id'], product['category']['id']
+
+    builders = {
+        'related': lambda: _cached(
+            f'{CACHE_PREFIX}:related:{product_id}', CACHE_TIMEOUT,
+            lambda: _related_data(request, product_id, category_id),
+        ),
+        'reviews': lambda: _cached(
+            f'{CACHE_PREFIX}:reviews:{product_id}', REVIEWS_CACHE_TIMEOUT,
+            lambda: _reviews_data(request, product_id, slug, product['rating_breakdown']),
+        ),
+    }
+    names = [name for name in requested if name in builders]
+    results = await asyncio.gather(*(builders[name]() for name in names))
+
+    data = {'product': product} if 'product' in requested else {}
+    data.update(zip(names, results))
+    if 'rating_breakdown' in requested:
+        data['rating_breakdown'] = product['rating_breakdown']
+    if 'reviews' in data:
+        # The cached page is shared by all users; can_edit and is_helpful
+        # are per user
+        reviews = data['reviews']['results']
+        helpful = set()
+        if user is not None and reviews:
+            helpful = set(await _alist(ReviewHelpful.objects.filter(
+                user=user, review_id__in=[review['id'] for review in reviews],
+            ).values_list('review_id', flat=True)))
+        for review in reviews:
+            review['can_edit'] = user is not None and review['user']['id'] == user.id
+            review['is_helpful'] = review['id'] in helpful
+    return _json(data)
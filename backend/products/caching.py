@@ -0,0 +1,39 @@
+"""
+Cache keys of the async catalog (async_views.py) that are dropped when a
+product or its reviews change.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+CACHE_PREFIX = 'async_catalog'
+
+
+def hashed_key(section, value):
+    """
+    The cache key of a section built from request input: a digest of
+    ``value``, so keys stay short and hold no spaces or control
+    characters (memcached rejects both)
+    """
+    return f'{CACHE_PREFIX}:{section}:{hashlib.blake2b(value.encode(), digest_size=16).hexdigest()}'
+
+
+def invalidate_product(product_id, slug):
+    """
+    Drop the cached sections that show a product. List pages can't be
+    found by product and expire on their own.
+    """
+    cache.delete_many([
+        f'{CACHE_PREFIX}:detail:{slug}',
+        f'{CACHE_PREFIX}:related:{product_id}',
+        f'{CACHE_PREFIX}:reviews:{product_id}',
+        f'{CACHE_PREFIX}:featured',
+    ])
+
+
+def drop_cached_product(sender, instance, raw=False, **kwargs):
+    """
+    post_save/post_delete: the product's cached sections are stale
+    """
+    if not raw:
+        invalidate_product(instance.pk, instance.slug)
@@ -14,10 +14,7 @@ class ProductFilter(django_filters.FilterSet):
     
     def filter_by_rating(self, queryset, name, value):
         # Filter products with average rating >= value
-        from django.db.models import Avg
-        return queryset.annotate(
-            avg_rating=Avg('reviews__rating')
-        ).filter(avg_rating__gte=value)
+        return queryset.filter(rating_average__gte=value)
     
     def filter_in_stock(self, queryset, name, value):
         if value:
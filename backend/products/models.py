@@ -42,6 +42,15 @@ class Product(TimeStampedModel):
     meta_title = models.CharField(max_length=60, blank=True)
     meta_description = models.CharField(max_length=160, blank=True)
     
+    # Denormalized review aggregates, maintained by reviews.ratings
+    rating_average = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_count_1 = models.PositiveIntegerField(default=0)
+    rating_count_2 = models.PositiveIntegerField(default=0)
+    rating_count_3 = models.PositiveIntegerField(default=0)
+    rating_count_4 = models.PositiveIntegerField(default=0)
+    rating_count_5 = models.PositiveIntegerField(default=0)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -55,14 +64,18 @@ class Product(TimeStampedModel):
     
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return reviews.aggregate(models.Avg('rating'))['rating__avg']
-        return 0
+        # The stored aggregate, no query
+        return self.rating_average
     
     @property
     def review_count(self):
-        return self.reviews.count()
+        return self.rating_count
+    
+    @property
+    def rating_breakdown(self):
+        # From the stored star counts, no query
+        distribution = {str(stars): getattr(self, f'rating_count_{stars}') for stars in range(5, 0, -1)}
+        return {'average': self.rating_average, 'count': self.rating_count, 'distribution': distribution}
     
     @property
     def primary_image(self):
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core.mixins import InstrumentedSerializerMixin
 from .models import Product, Category, ProductImage
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -6,7 +7,7 @@ class ProductImageSerializer(serializers.ModelSerializer):
         model = ProductImage
         fields = ['id', 'image', 'alt_text', 'is_primary', 'order']
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     product_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -14,9 +15,12 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'description', 'image', 'product_count']
     
     def get_product_count(self, obj):
+        # Views may set active_product_count instead of querying per category
+        if hasattr(obj, 'active_product_count'):
+            return obj.active_product_count
         return obj.products.filter(is_active=True).count()
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Lightweight serializer for product lists"""
     category = serializers.StringRelatedField()
     primary_image = serializers.SerializerMethodField()
@@ -30,17 +34,19 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
+        # Iterate the prefetched images instead of querying per product
+        primary_image = next((image for image in obj.images.all() if image.is_primary), None)
         if primary_image:
             return self.context['request'].build_absolute_uri(primary_image.image.url)
         return None
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Detailed serializer for product detail"""
     images = ProductImageSerializer(many=True, read_only=True)
     category = CategorySerializer(read_only=True)
     average_rating = serializers.ReadOnlyField()
     review_count = serializers.ReadOnlyField()
+    rating_breakdown = serializers.ReadOnlyField()
     is_in_stock = serializers.ReadOnlyField()
     discount_percentage = serializers.ReadOnlyField()
     
@@ -50,11 +56,11 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'description', 'short_description',
             'category', 'price', 'compare_price', 'stock_quantity',
             'sku', 'weight', 'dimensions', 'images', 'average_rating',
-            'review_count', 'is_featured', 'is_in_stock', 'discount_percentage',
-            'meta_title', 'meta_description', 'created_at'
+            'review_count', 'rating_breakdown', 'is_featured', 'is_in_stock',
+            'discount_percentage', 'meta_title', 'meta_description', 'created_at'
         ]
 
-class AdminProductSerializer(serializers.ModelSerializer):
+class AdminProductSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer for admin product management"""
     images = ProductImageSerializer(many=True, required=False)
 
@@ -1,3 +1,198 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from core.testing import PerformanceTestCase
+from reviews.models import Review
+
+from .models import Product
+
+User = get_user_model()
+
+
+class ProductEndpointBudgetTests(PerformanceTestCase):
+    """
+    Query and latency budgets for the catalog endpoints; lower a budget
+    when an optimization lands, never raise it to make a change pass.
+    """
+    def test_product_list(self):
+        self.assertBudget('/api/products/', queries=3, ms=150)
+
+    def test_product_list_filtered(self):
+        self.assertBudget(
+            f'/api/products/?category={self.category.pk}&min_price=12&in_stock=true&ordering=-price',
+            queries=4, ms=150,
+        )
+
+    def test_product_search(self):
+        self.assertBudget('/api/products/?search=Product', queries=3, ms=150)
+
+    def test_product_detail(self):
+        self.assertBudget(f'/api/products/{self.product.slug}/', queries=6, ms=100)
+
+    def test_product_quick_view(self):
+        self.assertBudget(f'/api/products/{self.product.slug}/quick-view/', queries=5, ms=100)
+
+    def test_related_products(self):
+        self.assertBudget(f'/api/products/{self.product.slug}/related/', queries=4, ms=100)
+
+    def test_featured_products(self):
+        self.assertBudget('/api/products/featured/', queries=2, ms=100)
+
+    def test_category_list(self):
+        self.assertBudget('/api/products/categories/', queries=8, ms=100)
+
+    def test_category_products(self):
+        self.assertBudget(f'/api/products/categories/{self.category.slug}/', queries=4, ms=150)
+
+    def test_filters_data(self):
+        self.assertBudget('/api/products/filters/', queries=7, ms=100)
+
+    def test_search_suggestions(self):
+        self.assertBudget('/api/products/search-suggestions/?q=Product', queries=2, ms=50)
+
+    def test_sitemap(self):
+        self.assertBudget('/api/products/sitemap/', queries=1, ms=100)
+
+    def test_admin_product_list(self):
+        self.assertBudget('/api/products/admin/products/', queries=3, ms=200, user=self.admin)
+
+    def test_admin_product_detail(self):
+        self.assertBudget(f'/api/products/admin/products/{self.product.slug}/', queries=2, ms=100, user=self.admin)
+
+    def test_admin_dashboard_stats(self):
+        self.assertBudget('/api/products/admin/dashboard/stats/', queries=6, ms=50, user=self.admin)
+
+    def test_admin_endpoints_reject_customers(self):
+        self.assertBudget('/api/products/admin/products/', queries=0, ms=50, user=self.customer, status=403)
+
+
+class AsyncCatalogBudgetTests(PerformanceTestCase):
+    """
+    The async catalog reads return the sync payloads within their own budgets
+    """
+    def assertSamePayload(self, path, queries, ms, status=200):
+        response = self.assertBudget(f'/api/async/products/{path}', queries=queries, ms=ms, status=status)
+        expected = self.assertBudget(f'/api/products/{path}', queries=100, ms=1000, status=status)
+        data = response.json()
+        for link in ('next', 'previous'):
+            if isinstance(data, dict) and data.get(link):
+                data[link] = data[link].replace('/api/async/products/', '/api/products/')
+        self.assertEqual(data, expected.json())
+
+    def test_product_list(self):
+        self.assertSamePayload('?page=2&page_size=5&ordering=price', queries=3, ms=150)
+
+    def test_product_list_invalid_filter(self):
+        self.assertSamePayload('?category=0', queries=1, ms=100, status=400)
+
+    def test_product_detail(self):
+        self.assertSamePayload(f'{self.product.slug}/', queries=3, ms=100)
+
+    def test_product_detail_not_found(self):
+        self.assertSamePayload('missing/', queries=1, ms=50, status=404)
+
+    def test_product_quick_view(self):
+        self.assertSamePayload(f'{self.product.slug}/quick-view/', queries=2, ms=100)
+
+    def test_related_products(self):
+        self.assertSamePayload(f'{self.product.slug}/related/', queries=3, ms=100)
+
+    def test_featured_products(self):
+        self.assertSamePayload('featured/', queries=2, ms=100)
+
+    def test_search_suggestions(self):
+        self.assertSamePayload('search-suggestions/?q=Product', queries=2, ms=50)
+
+
+class AsyncCatalogCacheTests(PerformanceTestCase):
+    """
+    The async catalog's cache keys and their invalidation
+    """
+    def test_list_key_ignores_unknown_params(self):
+        first = self.client.get('/api/async/products/?page_size=5&ordering=price&utm_source=mail').json()
+        self.assertNotIn('utm_source', first['next'])
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/async/products/?utm_campaign=x&ordering=price&page_size=5').json()
+        self.assertEqual(second, first)
+
+    def test_keys_from_request_input_are_short_and_printable(self):
+        cache = caches['default']
+        cache.clear()
+        long_query = 'shirt \t' * 200
+        self.client.get('/api/async/products/search-suggestions/', {'q': long_query})
+        self.client.get('/api/async/products/', {'search': long_query})
+        keys = list(cache._cache)
+        self.assertEqual(len(keys), 2)
+        for key in keys:
+            self.assertLessEqual(len(key), 250)
+            self.assertRegex(key, r'^[!-~]+$')
+
+    def test_product_save_refreshes_cached_sections(self):
+        url = f'/api/async/products/{self.product.slug}/'
+        self.client.get(url)
+        featured = Product.objects.get(pk=self.client.get('/api/async/products/featured/').json()['results'][0]['id'])
+
+        self.product.name = 'Renamed product'
+        self.product.save()
+        self.assertEqual(self.client.get(url).json()['name'], 'Renamed product')
+        featured.name = 'Renamed featured product'
+        featured.save()
+        self.assertEqual(self.client.get('/api/async/products/featured/').json()['results'][0]['name'],
+                         'Renamed featured product')
+
+        self.product.is_active = False
+        self.product.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ProductPageTests(PerformanceTestCase):
+    """
+    The composite product page returns what the separate endpoints return
+    """
+    def test_product_page(self):
+        url = f'/api/products/{self.product.slug}/page/'
+        page = self.assertBudget(url, queries=7, ms=200).json()
+
+        self.assertEqual(page['product'], self.client.get(f'/api/products/{self.product.slug}/').json())
+        self.assertEqual(page['related'], self.client.get(f'/api/products/{self.product.slug}/related/').json())
+        self.assertEqual(page['reviews'], self.client.get(f'/api/reviews/product/{self.product.slug}/').json())
+        breakdown = page['rating_breakdown']
+        self.assertEqual(breakdown['count'], page['product']['review_count'])
+        self.assertEqual(sum(breakdown['distribution'].values()), breakdown['count'])
+
+        # Every section is cached: a warm page costs no queries
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_reviews_can_edit_is_per_user(self):
+        author = self.product.reviews.select_related('user').first().user
+        url = f'/api/products/{self.product.slug}/page/?sections=reviews'
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(author).access_token}')
+        reviews = self.client.get(url).json()['reviews']['results']
+        self.assertEqual([review['can_edit'] for review in reviews],
+                         [review['user']['id'] == author.id for review in reviews])
+        self.assertTrue(any(review['can_edit'] for review in reviews))
+
+        self.client.credentials()
+        data = self.client.get(url).json()
+        self.assertEqual(list(data), ['reviews'])
+        self.assertFalse(any(review['can_edit'] for review in data['reviews']['results']))
+
+    def test_review_changes_refresh_the_page(self):
+        url = f'/api/products/{self.product.slug}/page/'
+        before = self.client.get(url).json()
+        user = User.objects.exclude(reviews__product=self.product).first()
+
+        review = Review.objects.create(user=user, product=self.product, rating=1, title='Broke', content='Broke')
+        page = self.client.get(url).json()
+        self.assertEqual(page['rating_breakdown']['count'], before['rating_breakdown']['count'] + 1)
+        self.assertEqual(page['product']['review_count'], page['rating_breakdown']['count'])
+        self.assertEqual(page['reviews']['rating_breakdown'], page['rating_breakdown'])
+        self.assertEqual(page['reviews']['results'][0]['id'], review.id)
+
+        review.delete()
+        self.assertEqual(self.client.get(url).json()['rating_breakdown'], before['rating_breakdown'])
+
+    def test_unknown_product(self):
+        self.assertBudget('/api/products/missing/page/', queries=1, ms=50, status=404)
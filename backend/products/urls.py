@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 # API URLs
 urlpatterns = [
@@ -19,6 +19,7 @@ urlpatterns = [
     path('<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('<slug:slug>/related/', views.related_products, name='related_products'),
     path('<slug:slug>/quick-view/', views.product_quick_view, name='product_quick_view'),
+    path('<slug:slug>/page/', async_views.product_page, name='product_page'),
     
     # Admin URLs (Protected)
     path('admin/products/', views.AdminProductListView.as_view(), name='admin_product_list'),
@@ -1,5 +1,5 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Avg, Count, Min, Max
+from django.db.models import Q, Count, Min, Max
 from django.core.cache import cache
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
@@ -16,9 +16,11 @@ from .serializers import (
 )
 from .filters import ProductFilter
 from core.permissions import IsAdminOrReadOnly
+from core.tasks import process_product_image
 
 # Cache timeout (in seconds)
 CACHE_TIMEOUT = 60 * 15  # 15 minutes
+SUGGESTION_QUERY_MAX_LENGTH = 100
 
 class ProductPagination(PageNumberPagination):
     page_size = 12
@@ -39,17 +41,6 @@ class ProductListView(generics.ListAPIView):
     ordering = ['-created_at']
     pagination_class = ProductPagination
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Add annotations for better performance
-        queryset = queryset.annotate(
-            avg_rating=Avg('reviews__rating'),
-            review_count=Count('reviews', distinct=True)
-        )
-        
-        return queryset
-    
     @method_decorator(cache_page(CACHE_TIMEOUT))
     @method_decorator(vary_on_headers('Authorization'))
     def dispatch(self, request, *args, **kwargs):
@@ -110,10 +101,7 @@ class CategoryProductsView(generics.ListAPIView):
         return Product.objects.filter(
             category=category, 
             is_active=True
-        ).select_related('category').prefetch_related('images').annotate(
-            avg_rating=Avg('reviews__rating'),
-            review_count=Count('reviews', distinct=True)
-        )
+        ).select_related('category').prefetch_related('images')
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
@@ -125,10 +113,7 @@ def featured_products(request):
     products = Product.objects.filter(
         is_featured=True, 
         is_active=True
-    ).select_related('category').prefetch_related('images').annotate(
-        avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews', distinct=True)
-    )[:8]
+    ).select_related('category').prefetch_related('images')[:8]
     
     serializer = ProductListSerializer(products, many=True, context={'request': request})
     return Response({
@@ -164,7 +149,7 @@ def product_search_suggestions(request):
     """
     Get search suggestions based on query
     """
-    query = request.GET.get('q', '').strip()
+    query = request.GET.get('q', '').strip()[:SUGGESTION_QUERY_MAX_LENGTH]
     if len(query) < 2:
         return Response({'suggestions': []})
     
@@ -368,6 +353,8 @@ def upload_product_images(request, product_id):
             is_primary=(i == 0 and not product.images.filter(is_primary=True).exists())
         )
         created_images.append(product_image)
+        # Compression happens on a worker so uploads return immediately
+        process_product_image.delay(product_image.id)
     
     serializer = ProductImageSerializer(created_images, many=True, context={'request': request})
     return Response({
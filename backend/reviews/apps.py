@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reviews'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_init, post_save
+        from .models import Review
+        from .ratings import count_deleted_review, count_saved_review, remember_counted_rating
+
+        # Keep the products' star counts in step with reviews
+        post_init.connect(remember_counted_rating, sender=Review, dispatch_uid='reviews.remember_counted_rating')
+        post_save.connect(count_saved_review, sender=Review, dispatch_uid='reviews.count_saved_review')
+        post_delete.connect(count_deleted_review, sender=Review, dispatch_uid='reviews.count_deleted_review')
@@ -0,0 +1,210 @@
+"""
+Helpful vote counters.
+
+ReviewHelpful rows are the votes; Review.helpful_count is a counter kept
+next to them for display. Votes change it with atomic increments, never
+by rewriting the review. A review receiving more than HOT_THRESHOLD
+votes per HOT_WINDOW has its increments buffered in the cache instead,
+and flush_helpful_votes() applies them in batches. The buffer needs a
+cache shared by the web and worker processes; whatever is lost from it
+(evictions, restarts) is repaired by reconcile_helpful_counts().
+
+The buffer is split into epochs. flush_helpful_votes() starts a new one
+and applies the epochs closed by the previous run, so votes that read
+the old epoch number just before it closed have a whole flush interval
+to land.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from core.writes import serialized_write
+from .models import Review, ReviewHelpful
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WRITE_BEHIND': True,
+    'HOT_THRESHOLD': 20,              # votes per HOT_WINDOW that make a review hot
+    'HOT_WINDOW': 60,                 # seconds
+    'CACHE': 'default',
+    'KEY_PREFIX': 'helpful',
+    'BUFFER_TIMEOUT': 60 * 60 * 24,   # buffered deltas older than this are dropped
+    'BATCH_SIZE': 1000,
+    'FLUSH_LOCK_TIMEOUT': 60 * 10,    # seconds a flush that died keeps others out
+}
+
+
+def get_helpful_settings():
+    """
+    HELPFUL_VOTES settings merged over the defaults
+    """
+    config = DEFAULTS.copy()
+    config.update(getattr(settings, 'HELPFUL_VOTES', {}))
+    return config
+
+
+def _increment(review_ids, delta):
+    # Drifted counters must not go below zero
+    return Review.objects.filter(pk__in=review_ids).update(helpful_count=Greatest(F('helpful_count') + delta, 0))
+
+
+class VoteBuffer:
+    """
+    Per-epoch counter deltas in the cache. Each epoch keeps a delta per
+    review and a numbered list of the reviews it touched, appended with
+    incr() so concurrent writers never overwrite each other.
+    """
+    def __init__(self, config=None):
+        self.config = config or get_helpful_settings()
+        self.cache = caches[self.config['CACHE']]
+
+    def key(self, *parts):
+        return ':'.join([self.config['KEY_PREFIX'], *map(str, parts)])
+
+    def _counter(self, name, timeout=None):
+        key = self.key(name)
+        self.cache.add(key, 0, timeout=timeout)
+        return key
+
+    def epoch(self):
+        return self.cache.get(self._counter('epoch'), 0)
+
+    def is_hot(self, review_id, now=None):
+        window = self.config['HOT_WINDOW']
+        now = time.time() if now is None else now
+        key = self._counter(f'rate:{review_id}:{int(now // window)}', timeout=window * 2)
+        try:
+            return self.cache.incr(key) > self.config['HOT_THRESHOLD']
+        except ValueError:
+            return False
+
+    def add(self, review_id, delta):
+        epoch, timeout = self.epoch(), self.config['BUFFER_TIMEOUT']
+        delta_key = self.key('delta', epoch, review_id)
+        if self.cache.add(delta_key, delta, timeout=timeout):
+            slot = self.cache.incr(self._counter(f'slots:{epoch}', timeout=timeout))
+            self.cache.set(self.key('slot', epoch, slot), review_id, timeout=timeout)
+        else:
+            try:
+                self.cache.incr(delta_key, delta)
+            except ValueError:
+                # Expired between add() and incr()
+                self.add(review_id, delta)
+
+    def open_epochs(self):
+        flushed = self.cache.get(self.key('flushed'), -1)
+        return range(flushed + 1, self.epoch() + 1)
+
+    def pending(self, review_id):
+        """
+        Buffered change to ``review_id``'s counter, not yet in the database
+        """
+        keys = [self.key('delta', epoch, review_id) for epoch in self.open_epochs()]
+        return sum(self.cache.get_many(keys).values())
+
+    def _apply(self, epoch):
+        batch_size = self.config['BATCH_SIZE']
+        slots = self.cache.get(self.key('slots', epoch), 0)
+        applied = 0
+        for start in range(1, slots + 1, batch_size):
+            slot_keys = [self.key('slot', epoch, n) for n in range(start, min(start + batch_size, slots + 1))]
+            review_ids = list(self.cache.get_many(slot_keys).values())
+            delta_keys = {self.key('delta', epoch, review_id): review_id for review_id in review_ids}
+            by_delta = {}
+            for key, delta in self.cache.get_many(list(delta_keys)).items():
+                if delta:
+                    by_delta.setdefault(delta, []).append(delta_keys[key])
+            # One UPDATE per distinct delta, mostly +1 and -1
+            with serialized_write():
+                for delta, ids in by_delta.items():
+                    _increment(ids, delta)
+            self.cache.delete_many(slot_keys + list(delta_keys))
+            applied += sum(len(ids) for ids in by_delta.values())
+        self.cache.delete(self.key('slots', epoch))
+        return applied
+
+    def flush(self, everything=False):
+        """
+        Close the current epoch and apply the closed ones; ``everything``
+        applies the one just closed too (a vote racing the flush may then
+        be missed until the next reconciliation). Returns the number of
+        counters changed.
+
+        One flush runs at a time, so no epoch is applied twice: while
+        another holds the lock this returns 0 and leaves the buffer to it.
+        """
+        lock = self.key('flush-lock')
+        if not self.cache.add(lock, 1, timeout=self.config['FLUSH_LOCK_TIMEOUT']):
+            logger.info('Helpful vote flush skipped: another flush is running')
+            return 0
+        try:
+            closing = self.epoch()
+            self.cache.incr(self._counter('epoch'))
+            flushed = self.cache.get(self.key('flushed'), -1)
+            last = closing if everything else closing - 1
+            applied = 0
+            for epoch in range(flushed + 1, last + 1):
+                applied += self._apply(epoch)
+                self.cache.set(self.key('flushed'), epoch, timeout=None)
+            return applied
+        finally:
+            self.cache.delete(lock)
+
+
+def record_vote(review_id, delta):
+    """
+    Add ``delta`` (1 or -1) to the review's helpful counter and return the
+    counter as voters should see it, buffered changes included
+    """
+    config = get_helpful_settings()
+    buffer = VoteBuffer(config)
+    if config['WRITE_BEHIND'] and buffer.is_hot(review_id):
+        buffer.add(review_id, delta)
+    else:
+        _increment([review_id], delta)
+    stored = next(iter(Review.objects.filter(pk=review_id).order_by().values_list('helpful_count', flat=True)), 0)
+    return max(stored + (buffer.pending(review_id) if config['WRITE_BEHIND'] else 0), 0)
+
+
+def flush_helpful_votes(everything=False):
+    applied = VoteBuffer().flush(everything=everything)
+    if applied:
+        logger.info(f'Flushed buffered helpful votes of {applied} reviews')
+    return applied
+
+
+def reconcile_helpful_counts(batch_size=None):
+    """
+    Recount helpful votes from ReviewHelpful and fix the counters that
+    drifted, leaving alone those with changes still in the buffer.
+    Returns the number of counters fixed.
+    """
+    config = get_helpful_settings()
+    batch_size = batch_size or config['BATCH_SIZE']
+    buffer = VoteBuffer(config)
+    if config['WRITE_BEHIND']:
+        buffer.flush(everything=True)
+
+    votes = (
+        ReviewHelpful.objects.filter(review=OuterRef('pk')).order_by()
+        .values('review').annotate(count=Count('id')).values('count')
+    )
+    drifted = list(
+        Review.objects.annotate(votes=Coalesce(Subquery(votes), 0))
+        .exclude(helpful_count=F('votes')).values_list('pk', 'votes')
+    )
+    fixed = []
+    for review_id, count in drifted:
+        if config['WRITE_BEHIND'] and buffer.pending(review_id):
+            continue
+        fixed.append(Review(pk=review_id, helpful_count=count))
+    with serialized_write():
+        Review.objects.bulk_update(fixed, ['helpful_count'], batch_size=batch_size)
+    if fixed:
+        logger.warning(f'Fixed the helpful counters of {len(fixed)} reviews')
+    return len(fixed)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-19 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_rating_average_product_rating_count'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['updated_at'], name='reviews_rev_updated_3ebe01_idx'),
+        ),
+    ]
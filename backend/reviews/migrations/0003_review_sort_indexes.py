@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_rating_average_product_rating_count'),
+        ('reviews', '0002_review_reviews_rev_updated_3ebe01_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-created_at', '-id'], name='reviews_rev_product_38ece6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-rating', '-id'], name='reviews_rev_product_33aecf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'rating', '-id'], name='reviews_rev_product_92bc74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-helpful_count', '-id'], name='reviews_rev_product_5ea96a_idx'),
+        ),
+    ]
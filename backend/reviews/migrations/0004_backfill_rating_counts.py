@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Avg, Count, Q
+
+
+def backfill_rating_counts(apps, schema_editor):
+    """
+    Fill the new star counts (and refresh the totals) from reviews, so the
+    review signals start from correct numbers
+    """
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('reviews', 'Review')
+    db = schema_editor.connection.alias
+    aggregates = (
+        Review.objects.using(db).order_by('product_id').values_list('product_id')
+        .annotate(average=Avg('rating'), count=Count('id'),
+                  **{f'rating_count_{stars}': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)})
+    )
+    updates = [
+        Product(id=row[0], rating_average=round(row[1], 2), rating_count=row[2],
+                **{f'rating_count_{stars}': row[2 + stars] for stars in range(1, 6)})
+        for row in aggregates
+    ]
+    Product.objects.using(db).bulk_update(
+        updates, ['rating_average', 'rating_count', *(f'rating_count_{stars}' for stars in range(1, 6))],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_rating_counts'),
+        ('reviews', '0003_review_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_counts, migrations.RunPython.noop),
+    ]
@@ -19,6 +19,14 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'product')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at']),
+            # One per sort of ProductReviewsView
+            models.Index(fields=['product', '-created_at', '-id']),
+            models.Index(fields=['product', '-rating', '-id']),
+            models.Index(fields=['product', 'rating', '-id']),
+            models.Index(fields=['product', '-helpful_count', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating}/5)"
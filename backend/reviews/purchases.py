@@ -0,0 +1,108 @@
+"""
+Verified purchases: a review is verified when its author has a delivered
+order, live or archived, containing the product.
+
+Orders live on the author's shard (orders.sharding), so the check runs
+there, through the (user, status) index of the orders and the unique
+(order, product) index of their items.
+"""
+import logging
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef
+
+from core.writes import serialized_write
+from orders.models import ArchivedOrderItem, OrderItem
+from orders.sharding import shard_databases, shard_for_user
+from .models import Review
+
+logger = logging.getLogger(__name__)
+
+PURCHASED_STATUS = 'delivered'
+ITEM_MODELS = (OrderItem, ArchivedOrderItem)
+
+
+def _delivered_items(model, using=None):
+    return model._base_manager.db_manager(using).filter(order__status=PURCHASED_STATUS)
+
+
+def has_purchased(user_id, product_id):
+    """
+    Whether the user received the product; one indexed lookup, two when
+    the order may have been archived
+    """
+    shard = shard_for_user(user_id)
+    return any(
+        _delivered_items(model, shard).filter(order__user_id=user_id, product_id=product_id).exists()
+        for model in ITEM_MODELS
+    )
+
+
+def _set_verified(review_ids, verified):
+    if not review_ids:
+        return 0
+    with serialized_write():
+        return Review.objects.filter(pk__in=review_ids).update(is_verified_purchase=verified)
+
+
+def _backfill_joined():
+    # Orders share the reviews' database: two UPDATEs joining them
+    purchased = Exists(
+        _delivered_items(OrderItem).filter(order__user_id=OuterRef('user_id'), product_id=OuterRef('product_id'))
+    ) | Exists(
+        _delivered_items(ArchivedOrderItem).filter(order__user_id=OuterRef('user_id'), product_id=OuterRef('product_id'))
+    )
+    with serialized_write():
+        verified = Review.objects.filter(purchased, is_verified_purchase=False).update(is_verified_purchase=True)
+        unverified = Review.objects.filter(~purchased, is_verified_purchase=True).update(is_verified_purchase=False)
+    return verified, unverified
+
+
+def _backfill_batch(reviews):
+    """
+    One query per shard and item table for a batch of (id, user_id,
+    product_id, verified) rows; returns the ids to verify and unverify
+    """
+    by_shard = {}
+    for review in reviews:
+        by_shard.setdefault(shard_for_user(review[1]), []).append(review)
+
+    purchased = set()
+    for shard, rows in by_shard.items():
+        user_ids = {row[1] for row in rows}
+        product_ids = {row[2] for row in rows}
+        for model in ITEM_MODELS:
+            purchased.update(
+                _delivered_items(model, shard)
+                .filter(order__user_id__in=user_ids, product_id__in=product_ids)
+                .values_list('order__user_id', 'product_id').distinct()
+            )
+
+    verify = [row[0] for row in reviews if (row[1], row[2]) in purchased and not row[3]]
+    unverify = [row[0] for row in reviews if (row[1], row[2]) not in purchased and row[3]]
+    return verify, unverify
+
+
+def backfill_verified_purchases(batch_size=1000):
+    """
+    Recompute is_verified_purchase for every review; returns the number
+    of reviews verified and unverified
+    """
+    if shard_databases() == [DEFAULT_DB_ALIAS]:
+        verified, unverified = _backfill_joined()
+    else:
+        # Orders are spread over other databases: join in batches of reviews
+        verified = unverified = 0
+        reviews = Review.objects.order_by('pk').values_list('pk', 'user_id', 'product_id', 'is_verified_purchase')
+        last = 0
+        while True:
+            batch = list(reviews.filter(pk__gt=last)[:batch_size])
+            if not batch:
+                break
+            last = batch[-1][0]
+            verify, unverify = _backfill_batch(batch)
+            verified += _set_verified(verify, True)
+            unverified += _set_verified(unverify, False)
+
+    logger.info(f'Verified purchases backfilled: {verified} verified, {unverified} unverified')
+    return {'verified': verified, 'unverified': unverified}
@@ -0,0 +1,213 @@
+import logging
+import time
+
+from django.db.models import Avg, Count, Exists, F, FloatField, OuterRef, Q
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from core.models import Watermark
+from products.caching import invalidate_product
+from products.models import Product
+from .models import Review
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'product_ratings'
+
+STARS = range(1, 6)
+BUCKETS = [f'rating_count_{stars}' for stars in STARS]
+FIELDS = ['rating_average', 'rating_count', *BUCKETS]
+
+
+def _rating_aggregates(product_ids=None):
+    """
+    One grouped aggregate over reviews, ordered by product id
+    """
+    queryset = Review.objects.all()
+    if product_ids is not None:
+        queryset = queryset.filter(product_id__in=product_ids)
+    buckets = {bucket: Count('id', filter=Q(rating=stars)) for stars, bucket in zip(STARS, BUCKETS)}
+    return (
+        queryset.order_by('product_id')
+        .values_list('product_id')
+        .annotate(average=Avg('rating'), count=Count('id'), **buckets)
+    )
+
+
+def _changed(product, average, count, buckets):
+    return product[2] != count or abs(product[1] - average) > 0.005 or tuple(product[3:]) != buckets
+
+
+def _flush(updates, chunk_size):
+    if updates:
+        Product.objects.bulk_update(updates, FIELDS, batch_size=chunk_size)
+    return len(updates)
+
+
+def _merge(products, aggregates, chunk_size):
+    """
+    Merge-join product rows with review aggregates (both ordered by id)
+    and write back only the rows whose stored values differ.
+    """
+    aggregates = iter(aggregates)
+    current = next(aggregates, None)
+    updates = []
+    scanned = changed = 0
+
+    for product in products:
+        scanned += 1
+        product_id = product[0]
+        while current is not None and current[0] < product_id:
+            current = next(aggregates, None)
+
+        if current is not None and current[0] == product_id:
+            average, count, buckets = round(current[1], 2), current[2], tuple(current[3:])
+        else:
+            average, count, buckets = 0, 0, (0,) * len(BUCKETS)
+
+        if _changed(product, average, count, buckets):
+            updates.append(Product(
+                id=product_id, rating_average=average, rating_count=count, **dict(zip(BUCKETS, buckets)),
+            ))
+            if len(updates) >= chunk_size:
+                changed += _flush(updates, chunk_size)
+                updates = []
+
+    changed += _flush(updates, chunk_size)
+    return scanned, changed
+
+
+def rebuild_product_ratings(incremental=True, chunk_size=1000):
+    """
+    Recompute Product.rating_average, rating_count and the star counts
+    from reviews, repairing whatever the review signals missed (bulk
+    writes, raw SQL, fixtures).
+
+    Full mode scans every product once against a single grouped aggregate.
+    Incremental mode only touches products with reviews created or edited
+    since the previous run's watermark, plus products still counting
+    reviews when none are left (their last review was deleted). Other
+    deletions are picked up by the next full rebuild. Returns a dict with
+    timings and the number of rows changed.
+    """
+    started = time.perf_counter()
+    run_started_at = timezone.now()
+    watermark = Watermark.get_value(WATERMARK_NAME) if incremental else None
+    mode = 'incremental' if watermark is not None else 'full'
+
+    products = Product.objects.order_by('id').values_list('id', *FIELDS)
+
+    if mode == 'full':
+        scanned, changed = _merge(
+            products.iterator(chunk_size=chunk_size),
+            _rating_aggregates().iterator(chunk_size=chunk_size),
+            chunk_size,
+        )
+    else:
+        product_ids = set(
+            Review.objects.filter(updated_at__gt=watermark)
+            .order_by()
+            .values_list('product_id', flat=True)
+            .distinct()
+        )
+        product_ids.update(
+            Product.objects.filter(rating_count__gt=0)
+            .exclude(Exists(Review.objects.filter(product=OuterRef('pk'))))
+            .values_list('id', flat=True)
+        )
+        product_ids = sorted(product_ids)
+        scanned = changed = 0
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            chunk_scanned, chunk_changed = _merge(
+                products.filter(id__in=chunk),
+                _rating_aggregates(chunk),
+                chunk_size,
+            )
+            scanned += chunk_scanned
+            changed += chunk_changed
+
+    Watermark.set_value(WATERMARK_NAME, run_started_at)
+
+    stats = {
+        'mode': mode,
+        'products_scanned': scanned,
+        'rows_changed': changed,
+        'seconds': round(time.perf_counter() - started, 3),
+        'watermark': run_started_at.isoformat(),
+    }
+    logger.info(f'Product ratings updated: {stats}')
+    return stats
+
+
+def adjust_product_ratings(product_id, deltas):
+    """
+    Apply ``deltas`` ({stars: change in count}) to a product's star counts
+    in one UPDATE. rating_count and rating_average are derived from the new
+    counts in the same statement, so concurrent changes don't overwrite
+    each other.
+    """
+    counts = {stars: F(f'rating_count_{stars}') + deltas.get(stars, 0) for stars in STARS}
+    count = sum(counts.values())
+    total = sum(stars * counts[stars] for stars in STARS)
+    Product.objects.filter(pk=product_id).update(
+        **{f'rating_count_{stars}': counts[stars] for stars, delta in deltas.items() if delta},
+        rating_count=count,
+        rating_average=Coalesce(Round(Cast(total, FloatField()) / NullIf(count, 0), 2), 0.0),
+    )
+
+
+def recount_product_ratings(product_id):
+    _merge(
+        Product.objects.filter(pk=product_id).values_list('id', *FIELDS),
+        _rating_aggregates([product_id]),
+        chunk_size=1,
+    )
+
+
+def _counted(review):
+    # Deferred fields are missing from __dict__; don't load them
+    return review.__dict__.get('product_id'), review.__dict__.get('rating')
+
+
+def remember_counted_rating(sender, instance, **kwargs):
+    """
+    post_init: the product and rating the stored counts include
+    """
+    instance._counted_rating = _counted(instance)
+
+
+def count_saved_review(sender, instance, created, raw=False, **kwargs):
+    """
+    post_save: move the review's vote between star counts
+    """
+    if raw:
+        return
+    # The product page caches the review list and the star counts
+    invalidate_product(instance.product_id, instance.product.slug)
+    old = (None, None) if created else instance._counted_rating
+    new = instance._counted_rating = _counted(instance)
+    if old == new:
+        return
+    if None in old and not created:
+        # Loaded without its rating: what was counted is unknown
+        for product_id in {old[0], new[0]} - {None}:
+            recount_product_ratings(product_id)
+    elif old[0] == new[0]:
+        adjust_product_ratings(new[0], {old[1]: -1, new[1]: 1})
+    else:
+        if old[0] is not None:
+            adjust_product_ratings(old[0], {old[1]: -1})
+        adjust_product_ratings(new[0], {new[1]: 1})
+
+
+def count_deleted_review(sender, instance, **kwargs):
+    """
+    post_delete: take the review's vote out of its star count
+    """
+    invalidate_product(instance.product_id, instance.product.slug)
+    product_id, rating = instance._counted_rating
+    if product_id is None or rating is None:
+        recount_product_ratings(product_id or instance.product_id)
+    else:
+        adjust_product_ratings(product_id, {rating: -1})
@@ -1,30 +1,50 @@
 from rest_framework import serializers
-from .models import Review, ReviewImage
-from apps.accounts.serializers import UserSerializer
+from core.mixins import InstrumentedSerializerMixin
+from .models import Review, ReviewHelpful, ReviewImage
+from .purchases import has_purchased
+from accounts.serializers import UserSerializer
 
 class ReviewImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReviewImage
         fields = ['id', 'image', 'created_at']
 
-class ReviewSerializer(serializers.ModelSerializer):
+def helpful_review_ids(user, reviews):
+    """
+    Ids of the ``reviews`` that ``user`` marked helpful, in one query
+    """
+    if not user.is_authenticated or not reviews:
+        return set()
+    return set(ReviewHelpful.objects.filter(
+        user=user, review_id__in=[review.pk for review in reviews],
+    ).values_list('review_id', flat=True))
+
+class ReviewSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    """
+    Expects ``user__userprofile`` selected and ``images`` prefetched, and
+    the page's helpful_review_ids() as ``helpful_review_ids`` in the context
+    """
     user = UserSerializer(read_only=True)
     images = ReviewImageSerializer(many=True, read_only=True)
     can_edit = serializers.SerializerMethodField()
+    is_helpful = serializers.SerializerMethodField()
     
     class Meta:
         model = Review
         fields = [
             'id', 'user', 'rating', 'title', 'content', 'is_verified_purchase',
-            'helpful_count', 'images', 'can_edit', 'created_at', 'updated_at'
+            'helpful_count', 'is_helpful', 'images', 'can_edit', 'created_at', 'updated_at'
         ]
         read_only_fields = ['user', 'helpful_count', 'is_verified_purchase']
     
     def get_can_edit(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.user == request.user
+            return obj.user_id == request.user.id
         return False
+    
+    def get_is_helpful(self, obj):
+        return obj.pk in self.context.get('helpful_review_ids', ())
 
 class CreateReviewSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,4 +54,5 @@ class CreateReviewSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         validated_data['product_id'] = self.context['product_id']
+        validated_data['is_verified_purchase'] = has_purchased(validated_data['user'].id, validated_data['product_id'])
         return super().create(validated_data)
@@ -1,3 +1,268 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.testing import PerformanceTestCase
+from products.models import Product
+from orders.models import Order, OrderItem
+from reviews.purchases import backfill_verified_purchases
+from reviews.helpful import VoteBuffer, flush_helpful_votes, reconcile_helpful_counts
+from reviews.models import Review, ReviewHelpful
+from reviews.ratings import rebuild_product_ratings
+from reviews.views import ReviewPagination
+
+
+class ReviewEndpointBudgetTests(PerformanceTestCase):
+    def test_product_reviews(self):
+        self.assertBudget(f'/api/reviews/product/{self.product.slug}/', queries=3, ms=150)
+
+    def test_product_reviews_authenticated(self):
+        self.assertBudget(f'/api/reviews/product/{self.product.slug}/', queries=4, ms=150, user=self.customer)
+
+
+@mock.patch.object(ReviewPagination, 'page_size', 2)
+class ProductReviewsPaginationTests(PerformanceTestCase):
+    def setUp(self):
+        self.url = f'/api/reviews/product/{self.product.slug}/'
+        # Ties on rating and helpful_count, so pages must break them by id
+        reviews = list(Review.objects.filter(product=self.product).order_by('pk'))
+        for review, (rating, helpful) in zip(reviews, [(5, 2), (3, 0), (5, 2), (1, 7), (3, 0)]):
+            Review.objects.filter(pk=review.pk).update(rating=rating, helpful_count=helpful)
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data)
+            ids.extend(review['id'] for review in data['results'])
+            url = data['next']
+        return ids, pages
+
+    def test_sorts_page_through_every_review_once(self):
+        reviews = Review.objects.filter(product=self.product)
+        for sort, ordering in ReviewPagination.orderings.items():
+            with self.subTest(sort=sort):
+                ids, pages = self.walk(f'{self.url}?sort={sort}')
+                self.assertEqual(ids, list(reviews.order_by(*ordering).values_list('pk', flat=True)))
+                self.assertEqual(len(pages), 3)
+                self.assertIsNone(pages[0]['previous'])
+
+                # And back again from the last page
+                back, url = [], pages[-1]['previous']
+                while url:
+                    data = self.client.get(url).json()
+                    back[:0] = [review['id'] for review in data['results']]
+                    url = data['previous']
+                self.assertEqual(back, ids[:-1])
+
+    def test_unknown_sort_falls_back_to_recent(self):
+        ids, _ = self.walk(f'{self.url}?sort=random')
+        self.assertEqual(ids, self.walk(self.url)[0])
+
+    def test_invalid_cursor(self):
+        self.assertBudget(f'{self.url}?cursor=nope', queries=1, ms=50, status=404)
+        self.assertBudget(f'{self.url}?cursor=WyJ4Il0=', queries=1, ms=50, status=404)
+
+    def test_is_helpful_is_per_user(self):
+        review = Review.objects.filter(product=self.product).order_by('-created_at', '-id').first()
+        ReviewHelpful.objects.create(user=self.customer, review=review)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.customer).access_token}')
+        results = self.client.get(self.url).json()['results']
+        self.assertEqual([result['is_helpful'] for result in results], [True, False])
+        self.assertEqual([result['can_edit'] for result in results],
+                         [result['user']['id'] == self.customer.id for result in results])
+
+        self.client.credentials()
+        self.assertFalse(any(result['is_helpful'] for result in self.client.get(self.url).json()['results']))
+
+
+class RatingCountsTests(PerformanceTestCase):
+    def expected(self, product):
+        ratings = list(Review.objects.filter(product=product).values_list('rating', flat=True))
+        return {
+            'average': round(sum(ratings) / len(ratings), 2) if ratings else 0,
+            'count': len(ratings),
+            'distribution': {str(stars): ratings.count(stars) for stars in range(5, 0, -1)},
+        }
+
+    def assertCounts(self, product):
+        self.assertEqual(Product.objects.get(pk=product.pk).rating_breakdown, self.expected(product))
+
+    def test_counts_follow_review_changes(self):
+        self.assertCounts(self.product)
+        reviewer = get_user_model().objects.exclude(reviews__product=self.product).filter(is_staff=False).first()
+        self.client.force_authenticate(reviewer)
+        response = self.client.post(f'/api/reviews/product/{self.product.slug}/create/',
+                                    {'rating': 1, 'title': 'Bad', 'content': 'Broke'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertCounts(self.product)
+
+        review = Review.objects.get(user=reviewer, product=self.product)
+        review.rating = 4
+        review.save()
+        self.assertCounts(self.product)
+        review.title = 'Fine after all'
+        with self.assertNumQueries(1):
+            review.save()
+
+        # Loaded without its rating, the product is counted again
+        review = Review.objects.only('id', 'product_id').get(pk=review.pk)
+        review.rating = 2
+        review.save()
+        self.assertCounts(self.product)
+
+        other = Product.objects.exclude(reviews__user=reviewer).exclude(pk=self.product.pk).first()
+        review.product = other
+        review.save()
+        self.assertCounts(self.product)
+        self.assertCounts(other)
+
+        review.delete()
+        self.assertCounts(other)
+        Review.objects.filter(product=self.product).delete()
+        self.assertCounts(self.product)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).rating_breakdown['average'], 0)
+
+    def test_rebuild_repairs_counts(self):
+        Review.objects.filter(product=self.product).update(rating=5)
+        Product.objects.filter(pk=self.product.pk).update(rating_count_1=9)
+        stats = rebuild_product_ratings(incremental=False)
+        self.assertEqual(stats['rows_changed'], 1)
+        self.assertCounts(self.product)
+
+    def test_incremental_rebuild(self):
+        rebuild_product_ratings(incremental=False)
+        # Changes the signals never saw: a bulk edit and a product whose
+        # reviews are all gone
+        edited = Review.objects.filter(product=self.product).first()
+        Review.objects.filter(pk=edited.pk).update(rating=1, updated_at=timezone.now())
+        emptied = Product.objects.exclude(pk=self.product.pk).filter(reviews__isnull=False).first()
+        reviews = Review.objects.filter(product=emptied)
+        reviews._raw_delete(reviews.db)
+        self.assertGreater(Product.objects.get(pk=emptied.pk).rating_count, 0)
+
+        stats = rebuild_product_ratings(incremental=True)
+        self.assertEqual((stats['mode'], stats['products_scanned'], stats['rows_changed']), ('incremental', 2, 2))
+        self.assertCounts(self.product)
+        self.assertCounts(emptied)
+
+    def test_served_with_product_and_reviews(self):
+        breakdown = self.expected(self.product)
+        detail = self.assertBudget(f'/api/products/{self.product.slug}/', queries=6, ms=100).json()
+        self.assertEqual(detail['rating_breakdown'], breakdown)
+        reviews = self.client.get(f'/api/reviews/product/{self.product.slug}/').json()
+        self.assertEqual(reviews['rating_breakdown'], breakdown)
+
+
+@override_settings(HELPFUL_VOTES={'WRITE_BEHIND': True, 'HOT_THRESHOLD': 3})
+class HelpfulVoteTests(PerformanceTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.review = Review.objects.filter(product=self.product).first()
+        self.voters = list(get_user_model().objects.exclude(pk=self.review.user_id).order_by('pk')[:6])
+
+    def vote(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.post(f'/api/reviews/{self.review.pk}/helpful/')
+        self.client.force_authenticate(None)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def stored(self):
+        return Review.objects.get(pk=self.review.pk).helpful_count
+
+    def test_votes_increment_without_saving_the_review(self):
+        updated_at = self.review.updated_at
+        self.assertEqual(self.vote(self.voters[0]), {'is_helpful': True, 'helpful_count': 1})
+        self.assertEqual(self.vote(self.voters[1])['helpful_count'], 2)
+        self.assertEqual(self.vote(self.voters[0]), {'is_helpful': False, 'helpful_count': 1})
+        self.assertEqual(self.stored(), 1)
+        self.assertEqual(Review.objects.get(pk=self.review.pk).updated_at, updated_at)
+
+    def test_hot_reviews_are_buffered_until_flushed(self):
+        counts = [self.vote(user)['helpful_count'] for user in self.voters]
+        self.assertEqual(counts, [1, 2, 3, 4, 5, 6])
+        # The first three votes were written, the rest buffered
+        self.assertEqual(self.stored(), 3)
+        self.assertEqual(VoteBuffer().pending(self.review.pk), 3)
+
+        # The epoch closed by a flush is applied by the next one
+        self.assertEqual(flush_helpful_votes(), 0)
+        self.assertEqual(self.vote(self.voters[0])['helpful_count'], 5)
+        self.assertEqual(flush_helpful_votes(), 1)
+        self.assertEqual(self.stored(), 6)
+        self.assertEqual(flush_helpful_votes(), 1)
+        self.assertEqual(self.stored(), 5)
+        self.assertEqual(VoteBuffer().pending(self.review.pk), 0)
+
+    def test_flushes_do_not_overlap(self):
+        for user in self.voters:
+            self.vote(user)
+        buffer = VoteBuffer()
+        # A flush in progress elsewhere holds the lock
+        buffer.cache.add(buffer.key('flush-lock'), 1)
+        with self.assertLogs('reviews.helpful', 'INFO'):
+            self.assertEqual(flush_helpful_votes(everything=True), 0)
+        self.assertEqual((self.stored(), buffer.pending(self.review.pk)), (3, 3))
+
+        buffer.cache.delete(buffer.key('flush-lock'))
+        self.assertEqual(flush_helpful_votes(everything=True), 1)
+        self.assertEqual((self.stored(), buffer.pending(self.review.pk)), (6, 0))
+
+    def test_reconcile_fixes_drift(self):
+        for user in self.voters[:4]:
+            self.vote(user)
+        Review.objects.filter(product=self.product).update(helpful_count=9)
+
+        with self.assertLogs('reviews.helpful', 'WARNING'):
+            self.assertEqual(reconcile_helpful_counts(), Review.objects.filter(product=self.product).count())
+        self.assertEqual(self.stored(), 4)
+        self.assertEqual(Review.objects.filter(product=self.product).exclude(pk=self.review.pk)
+                         .filter(helpful_count__gt=0).count(), 0)
+        self.assertEqual(reconcile_helpful_counts(), 0)
+
+    def test_vote_budget(self):
+        self.assertBudget(f'/api/reviews/{self.review.pk}/helpful/', queries=9, ms=100,
+                          user=self.voters[0], method='post')
+
+
+class VerifiedPurchaseTests(PerformanceTestCase):
+    def purchased(self):
+        return set(OrderItem.objects.filter(order__status='delivered').values_list('order__user_id', 'product_id'))
+
+    def test_reviews_of_delivered_products_are_verified(self):
+        user, product = next(
+            (user_id, product_id) for user_id, product_id in self.purchased()
+            if not Review.objects.filter(user_id=user_id, product_id=product_id).exists()
+        )
+        self.client.force_authenticate(get_user_model().objects.get(pk=user))
+        slug = Product.objects.get(pk=product).slug
+        response = self.client.post(f'/api/reviews/product/{slug}/create/',
+                                    {'rating': 5, 'title': 'Arrived', 'content': 'Works'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Review.objects.get(user_id=user, product_id=product).is_verified_purchase)
+
+        # Orders that were not delivered don't count
+        Order.objects.filter(user_id=user, items__product_id=product).update(status='processing')
+        Review.objects.filter(user_id=user, product_id=product).delete()
+        self.client.post(f'/api/reviews/product/{slug}/create/',
+                         {'rating': 5, 'title': 'Arrived', 'content': 'Works'}, format='json')
+        self.assertFalse(Review.objects.get(user_id=user, product_id=product).is_verified_purchase)
+
+    def test_backfill_is_set_based(self):
+        Review.objects.filter(pk=Review.objects.order_by('pk').first().pk).update(is_verified_purchase=True)
+        purchased = self.purchased()
+        expected = {pk for pk, user_id, product_id in Review.objects.values_list('pk', 'user_id', 'product_id')
+                    if (user_id, product_id) in purchased}
+
+        self.assertTrue(expected)
+        # Two UPDATEs inside the write block's savepoint, whatever the number of reviews
+        with self.assertNumQueries(4):
+            backfill_verified_purchases()
+        self.assertEqual(set(Review.objects.filter(is_verified_purchase=True).values_list('pk', flat=True)), expected)
+        self.assertEqual(backfill_verified_purchases(), {'verified': 0, 'unverified': 0})
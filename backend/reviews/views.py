@@ -2,18 +2,48 @@ from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from apps.products.models import Product
+from core.pagination import KeysetPagination
+from core.writes import serialized_write
+from products.models import Product
+from .helpful import record_vote
 from .models import Review, ReviewHelpful
-from .serializers import ReviewSerializer, CreateReviewSerializer
+from .serializers import ReviewSerializer, CreateReviewSerializer, helpful_review_ids
+
+class ReviewPagination(KeysetPagination):
+    orderings = {
+        'recent': ('-created_at', '-id'),
+        'highest': ('-rating', '-id'),
+        'lowest': ('rating', '-id'),
+        'helpful': ('-helpful_count', '-id'),
+    }
+    default_ordering = 'recent'
 
 class ProductReviewsView(generics.ListAPIView):
+    """
+    Reviews of a product, ``?sort=`` recent, highest, lowest or helpful,
+    paged with a cursor, and the product's rating breakdown
+    """
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ReviewPagination
     
     def get_queryset(self):
         product_slug = self.kwargs['product_slug']
-        product = get_object_or_404(Product, slug=product_slug)
-        return Review.objects.filter(product=product)
+        self.product = get_object_or_404(Product, slug=product_slug)
+        return Review.objects.filter(product=self.product).select_related('user__userprofile').prefetch_related('images')
+    
+    def list(self, request, *args, **kwargs):
+        reviews = self.paginate_queryset(self.get_queryset())
+        self.helpful_review_ids = helpful_review_ids(request.user, reviews)
+        serializer = self.get_serializer(reviews, many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['rating_breakdown'] = self.product.rating_breakdown
+        return response
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['helpful_review_ids'] = getattr(self, 'helpful_review_ids', set())
+        return context
 
 class CreateReviewView(generics.CreateAPIView):
     serializer_class = CreateReviewSerializer
@@ -29,18 +59,13 @@ class CreateReviewView(generics.CreateAPIView):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_helpful(request, review_id):
-    review = get_object_or_404(Review, id=review_id)
-    helpful, created = ReviewHelpful.objects.get_or_create(
-        user=request.user, review=review
-    )
-    
-    if not created:
-        helpful.delete()
-        review.helpful_count -= 1
-        is_helpful = False
-    else:
-        review.helpful_count += 1
-        is_helpful = True
-    
-    review.save()
-    return Response({'is_helpful': is_helpful, 'helpful_count': review.helpful_count})
+    review = get_object_or_404(Review.objects.only('id'), id=review_id)
+    with serialized_write():
+        helpful, created = ReviewHelpful.objects.get_or_create(
+            user=request.user, review=review
+        )
+        if not created:
+            helpful.delete()
+    # The counter is changed atomically, not by saving the review
+    helpful_count = record_vote(review.id, 1 if created else -1)
+    return Response({'is_helpful': created, 'helpful_count': helpful_count})